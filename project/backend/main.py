@@ -1,17 +1,22 @@
-from fastapi import FastAPI, HTTPException, Query, File, UploadFile
+from fastapi import FastAPI, HTTPException, Query, File, UploadFile, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import json
 import os
+import secrets
 from dotenv import load_dotenv
 import uvicorn
-from models.weather import WeatherData
+from models.weather import WeatherData, FarmWeather
 from models.voice import VoiceRequest
 from services.crop_service import get_crops, get_crop_recommendations, router as crop_router
 from services.weather_service import get_weather
 from services.voice_service import process_voice_input
-from services.disease_service import detect_disease, get_detection_history
+from services.disease_service import detect_disease, detect_diseases_batch, get_detection_history, inference_pool, image_store, disease_models
+from services.ml_crop_service import crop_models, predict_bulk_crop_probabilities, iter_bulk_crop_recommendations
+from services.image_store import DetectionStaticFiles
 import logging
 
 # Set up logging
@@ -23,6 +28,15 @@ load_dotenv()
 
 app = FastAPI()
 
+# Maximum number of images accepted by the batch disease detection endpoint
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "200"))
+# Maximum number of farms accepted by the bulk crop recommendation endpoint
+MAX_BULK_RECOMMENDATIONS = int(os.getenv("MAX_BULK_RECOMMENDATIONS", "10000"))
+# Farms serialized per chunk of the NDJSON response
+BULK_STREAM_CHUNK_SIZE = 256
+# Token required by the model reload endpoint (X-Admin-Token header); unset disables the endpoint
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
 # CORS middleware with more specific configuration
 app.add_middleware(
     CORSMiddleware,
@@ -34,11 +48,31 @@ app.add_middleware(
     max_age=3600,
 )
 
-# Ensure the detections directory exists
-os.makedirs("data/detections", exist_ok=True)
+# Mount detection images; uploads live in a sharded tree and older flat files are still served
+image_store.add_legacy_dir("data/detections")
+app.mount("/detections", DetectionStaticFiles(image_store), name="detections")
+
+@app.on_event("startup")
+async def start_inference_pool():
+    # Start inference workers so the disease model is preloaded before the first upload
+    try:
+        await run_in_threadpool(inference_pool.start)
+    except Exception as e:
+        logger.error(f"Error starting inference pool: {e}")
 
-# Mount static files for detection images
-app.mount("/detections", StaticFiles(directory="data/detections"), name="detections")
+@app.on_event("startup")
+def start_model_watchers():
+    # Reload the disease and crop models in the background when their files change
+    disease_models.start_watching()
+    crop_models.start_watching()
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    disease_models.stop_watching()
+    crop_models.stop_watching()
+    inference_pool.shutdown()
+    # Write out any uploads still waiting in the image queue
+    image_store.shutdown()
 
 # Create API router with prefix
 from fastapi import APIRouter
@@ -79,10 +113,15 @@ async def voice_endpoint(request: VoiceRequest):
         raise HTTPException(status_code=500, detail="Failed to process voice input")
 
 @api_router.get("/detection-history")
-async def detection_history_endpoint():
+async def detection_history_endpoint(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of records to return"),
+    cursor: Optional[str] = Query(None, description="Cursor returned by the previous page")
+):
     try:
-        history = await get_detection_history()
+        history = await get_detection_history(limit, cursor)
         return history
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in detection history endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch detection history")
@@ -112,6 +151,66 @@ async def disease_detection_endpoint(file: UploadFile = File(..., description="I
         logger.error(f"Error in disease detection endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process image: {str(e)}")
 
+@api_router.post("/detect-disease/batch")
+async def disease_detection_batch_endpoint(files: List[UploadFile] = File(..., description="Image files to analyze")):
+    try:
+        logger.info(f"Received batch of {len(files)} files")
+        
+        if len(files) > MAX_BATCH_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} images can be analyzed per batch")
+        
+        for file in files:
+            if not file.content_type or not file.content_type.startswith('image/'):
+                raise HTTPException(status_code=400, detail=f"File {file.filename} must be an image")
+        
+        # Read all file contents
+        images_data = [await file.read() for file in files]
+        for file, image_data in zip(files, images_data):
+            if not image_data:
+                raise HTTPException(status_code=400, detail=f"No image data received for {file.filename}")
+        
+        logger.info(f"Processing batch of {len(images_data)} images")
+        results = await detect_diseases_batch(images_data)
+        logger.info(f"Batch disease detection returned {len(results)} results")
+        return results
+        
+    except HTTPException as he:
+        logger.error(f"HTTP error in batch disease detection: {he.detail}")
+        raise he
+    except Exception as e:
+        logger.error(f"Error in batch disease detection endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to process images: {str(e)}")
+
+@api_router.get("/models")
+async def models_endpoint():
+    return {
+        "disease": disease_models.version,
+        "crop": crop_models.version
+    }
+
+@api_router.post("/admin/reload-models")
+async def reload_models_endpoint(
+    model: str = Query("all", pattern="^(all|disease|crop)$", description="Model to reload"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    # Fail closed: without a configured token nobody may reload models
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model reloads are disabled; set MODEL_ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    managers = {"disease": disease_models, "crop": crop_models}
+    selected = managers if model == "all" else {model: managers[model]}
+    results = {}
+    for name, manager in selected.items():
+        try:
+            # Load off the event loop; requests keep being served by the current version meanwhile
+            version, swapped = await run_in_threadpool(manager.reload)
+            results[name] = {"version": version, "reloaded": swapped}
+        except Exception as e:
+            logger.error(f"Error reloading {name} model: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to reload {name} model: {str(e)}")
+    return results
+
 @api_router.post("/ml-crop-recommendations")
 async def ml_crop_recommendations_endpoint(weather_data: WeatherData):
     try:
@@ -123,6 +222,30 @@ async def ml_crop_recommendations_endpoint(weather_data: WeatherData):
         logger.error(f"Error in ML crop recommendations endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get ML crop recommendations")
 
+@api_router.post("/ml-crop-recommendations/bulk")
+async def bulk_crop_recommendations_endpoint(farms: List[FarmWeather]):
+    if len(farms) > MAX_BULK_RECOMMENDATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_RECOMMENDATIONS} farms can be processed per request")
+    try:
+        # One model call for every farm, off the event loop
+        probabilities, crop_names, model_version = await run_in_threadpool(predict_bulk_crop_probabilities, farms)
+    except Exception as e:
+        logger.error(f"Error in bulk crop recommendations endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get bulk crop recommendations")
+    
+    def ndjson_lines():
+        # One JSON object per farm and line, written in chunks as they are built
+        lines = []
+        for result in iter_bulk_crop_recommendations(farms, probabilities, crop_names, model_version):
+            lines.append(json.dumps(result))
+            if len(lines) >= BULK_STREAM_CHUNK_SIZE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 # Include the API router
 app.include_router(api_router)
 app.include_router(crop_router)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class WeatherData(BaseModel):
@@ -8,4 +9,11 @@ class WeatherData(BaseModel):
     description: str
     city: str
     country: str
-    timestamp: str 
\ No newline at end of file
+    timestamp: str 
+
+class FarmWeather(BaseModel):
+    """Location and weather of one farm in a bulk recommendation request"""
+    lat: float
+    lon: float
+    weather: WeatherData
+    id: Optional[str] = None
@@ -1,7 +1,8 @@
 import os
+import argparse
 import logging
 import shutil
-import random
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from PIL import Image
 from pathlib import Path
@@ -32,34 +33,100 @@ DISEASE_CLASSES = [
     "Apple_Scab"
 ]
 
-def create_synthetic_dataset():
-    """Create a small synthetic dataset for testing."""
+# Images per class in each split
+SPLIT_SIZES = {"train": 20, "val": 5, "test": 5}
+IMAGE_SIZE = 224
+NUM_PATTERNS = 20
+# Images generated per worker job
+CHUNK_SIZE = 16
+
+def base_color_for(class_name):
+    """Base RGB color of a class's synthetic images"""
+    if "Healthy" in class_name:
+        return [0, 200, 0]  # Green for healthy
+    elif "Early_blight" in class_name:
+        return [200, 150, 0]  # Yellow-brown for early blight
+    elif "Late_blight" in class_name:
+        return [150, 50, 50]  # Dark brown for late blight
+    elif "Black_rot" in class_name:
+        return [50, 50, 50]  # Dark for black rot
+    elif "Scab" in class_name:
+        return [150, 100, 50]  # Brown for scab
+    else:
+        return [100, 100, 100]  # Gray for other
+
+def draw_image(rng, base_color, img_size=IMAGE_SIZE, num_patterns=NUM_PATTERNS):
+    """
+    Draw one image: the base color with num_patterns randomly placed, randomly tinted rectangles,
+    later rectangles on top. All random parameters come from a few array draws; each rectangle
+    is then a single slice fill.
+    """
+    # Rectangle extents scale with the image; 10-50 pixels at 224x224
+    min_extent = max(1, round(10 * img_size / 224))
+    max_extent = max(min_extent, round(50 * img_size / 224))
+    x, y = rng.integers(0, img_size - max_extent + 1, (2, num_patterns))
+    w, h = rng.integers(min_extent, max_extent + 1, (2, num_patterns))
+    base = np.array(base_color, dtype=np.int16)
+    colors = np.clip(base + rng.integers(-30, 31, (num_patterns, 3)), 0, 255).astype(np.uint8)
+
+    img_array = np.empty((img_size, img_size, 3), dtype=np.uint8)
+    img_array[:, :] = base
+    for x0, y0, x1, y1, color in zip(x, y, x + w, y + h, colors):
+        img_array[y0:y1, x0:x1] = color
+    return img_array
+
+def create_images_for_class(directory, class_name, num_images, start=0, img_size=IMAGE_SIZE, seed=None):
+    """
+    Create synthetic images start+1 .. start+num_images for a class.
+    With a seed (an int or a sequence of ints), the images are reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    base_color = base_color_for(class_name)
+    created = 0
+    for i in range(start, start + num_images):
+        try:
+            img = Image.fromarray(draw_image(rng, base_color, img_size))
+            img_path = os.path.join(directory, f"{class_name}_{i+1:03d}.png")
+            logger.debug(f"Saving image to: {img_path}")
+            img.save(img_path, compress_level=1)
+            created += 1
+        except Exception as e:
+            logger.error(f"Error creating image {i+1} for {class_name}: {e}")
+            logger.error(traceback.format_exc())
+    return created
+
+def create_synthetic_dataset(output_dir=SPLITS_DIR, classes=DISEASE_CLASSES, split_sizes=SPLIT_SIZES,
+                             img_size=IMAGE_SIZE, seed=None, num_workers=None):
+    """
+    Create a synthetic dataset of output_dir/<split>/<class>/*.png.
+    Classes and splits are generated in chunks across a process pool. With a seed, every
+    image depends only on the seed, its split, class and index, not on scheduling.
+    """
     try:
-        logger.info(f"Creating dataset directory at: {DATASET_DIR}")
-        os.makedirs(DATASET_DIR, exist_ok=True)
-        
-        logger.info(f"Creating splits directory at: {SPLITS_DIR}")
-        os.makedirs(SPLITS_DIR, exist_ok=True)
-        
-        logger.info("Creating synthetic dataset...")
+        logger.info(f"Creating dataset directory at: {output_dir}")
+        os.makedirs(output_dir, exist_ok=True)
         
-        # Create splits directories
-        for split in ['train', 'val', 'test']:
-            split_dir = os.path.join(SPLITS_DIR, split)
-            logger.info(f"Creating split directory: {split_dir}")
-            os.makedirs(split_dir, exist_ok=True)
-            
-            # Create class directories
-            for disease in DISEASE_CLASSES:
-                class_dir = os.path.join(split_dir, disease)
-                logger.info(f"Creating class directory: {class_dir}")
+        # One job per chunk of images of a class in a split
+        jobs = []
+        for split_index, (split, num_images) in enumerate(split_sizes.items()):
+            for class_index, disease in enumerate(classes):
+                class_dir = os.path.join(output_dir, split, disease)
                 os.makedirs(class_dir, exist_ok=True)
-                
-                # Create synthetic images
-                num_images = 20 if split == 'train' else 5
-                logger.info(f"Creating {num_images} images for {disease} in {split} split")
-                create_images_for_class(class_dir, disease, num_images)
+                for start in range(0, num_images, CHUNK_SIZE):
+                    job_seed = None if seed is None else [seed, split_index, class_index, start]
+                    jobs.append((class_dir, disease, min(CHUNK_SIZE, num_images - start), start, img_size, job_seed))
         
+        total = sum(job[2] for job in jobs)
+        num_workers = num_workers or os.cpu_count() or 1
+        logger.info(f"Creating {total} images for {len(classes)} classes with {num_workers} workers...")
+        if num_workers > 1:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                created = sum(executor.map(create_images_for_class, *zip(*jobs)))
+        else:
+            created = sum(create_images_for_class(*job) for job in jobs)
+        
+        if created < total:
+            logger.warning(f"Only {created} of {total} images were created")
         logger.info("Synthetic dataset created successfully!")
         return True
         
@@ -68,53 +135,27 @@ def create_synthetic_dataset():
         logger.error(traceback.format_exc())
         return False
 
-def create_images_for_class(directory, class_name, num_images):
-    """Create synthetic images for a class."""
-    for i in range(num_images):
-        try:
-            # Create a colored image with some patterns
-            img_size = 224
-            img_array = np.zeros((img_size, img_size, 3), dtype=np.uint8)
-            
-            # Use different base colors for different classes
-            if "Healthy" in class_name:
-                base_color = [0, 200, 0]  # Green for healthy
-            elif "Early_blight" in class_name:
-                base_color = [200, 150, 0]  # Yellow-brown for early blight
-            elif "Late_blight" in class_name:
-                base_color = [150, 50, 50]  # Dark brown for late blight
-            elif "Black_rot" in class_name:
-                base_color = [50, 50, 50]  # Dark for black rot
-            elif "Scab" in class_name:
-                base_color = [150, 100, 50]  # Brown for scab
-            else:
-                base_color = [100, 100, 100]  # Gray for other
-            
-            # Add base color
-            img_array[:, :] = base_color
-            
-            # Add some random patterns
-            for _ in range(20):
-                x = random.randint(0, img_size-50)
-                y = random.randint(0, img_size-50)
-                w = random.randint(10, 50)
-                h = random.randint(10, 50)
-                color_variation = [random.randint(-30, 30) for _ in range(3)]
-                pattern_color = [max(0, min(255, base_color[j] + color_variation[j])) for j in range(3)]
-                img_array[y:y+h, x:x+w] = pattern_color
-            
-            # Convert to PIL Image and save
-            img = Image.fromarray(img_array)
-            img_path = os.path.join(directory, f"{class_name}_{i+1:03d}.png")
-            logger.debug(f"Saving image to: {img_path}")
-            img.save(img_path)
-        except Exception as e:
-            logger.error(f"Error creating image {i+1} for {class_name}: {e}")
-            logger.error(traceback.format_exc())
-
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create a synthetic plant disease image dataset')
+    parser.add_argument('--output', default=SPLITS_DIR, help='Directory to create the splits in')
+    parser.add_argument('--classes', default=','.join(DISEASE_CLASSES), help='Comma-separated class names')
+    parser.add_argument('--train', type=int, default=SPLIT_SIZES['train'], help='Images per class in the train split')
+    parser.add_argument('--val', type=int, default=SPLIT_SIZES['val'], help='Images per class in the val split')
+    parser.add_argument('--test', type=int, default=SPLIT_SIZES['test'], help='Images per class in the test split')
+    parser.add_argument('--image-size', type=int, default=IMAGE_SIZE, help='Width and height of the images')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible images')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+    
     logger.info("Starting dataset preparation...")
-    if create_synthetic_dataset():
+    if create_synthetic_dataset(
+        args.output,
+        [name.strip() for name in args.classes.split(',') if name.strip()],
+        {"train": args.train, "val": args.val, "test": args.test},
+        args.image_size,
+        args.seed,
+        args.workers
+    ):
         logger.info("Dataset preparation completed successfully!")
     else:
-        logger.error("Dataset preparation failed!") 
\ No newline at end of file
+        logger.error("Dataset preparation failed!")
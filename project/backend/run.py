@@ -18,6 +18,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run the plant disease detection system')
     parser.add_argument('--train', action='store_true', help='Train the model using disease information files')
     parser.add_argument('--setup', action='store_true', help='Only set up the model without training')
+    parser.add_argument('--retrain', action='store_true', help='Set up the model even if it is up to date')
     args = parser.parse_args()
     
     try:
@@ -31,13 +32,13 @@ if __name__ == "__main__":
             # Only set up the model without training
             logger.info("Setting up disease detection model...")
             import setup_model
-            setup_model.setup_model()
+            setup_model.setup_model(force=args.retrain)
             logger.info("Model setup completed")
         else:
             # Default: set up the model and run the server
             logger.info("Setting up disease detection model...")
             import setup_model
-            setup_model.setup_model()
+            setup_model.setup_model(force=args.retrain)
             logger.info("Model setup completed")
         
             # Then run the server
@@ -0,0 +1,92 @@
+import copy
+import logging
+import os
+import torch
+import torch.nn as nn
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "optimized" serves a frozen, int8-quantized, channels-last TorchScript graph on CPU; "eager" the plain model
+CNN_INFERENCE_MODE = os.getenv("DISEASE_CNN_MODE", "optimized").lower()
+CNN_QUANTIZE = os.getenv("DISEASE_CNN_QUANTIZE", "1") not in ("0", "false", "False")
+CNN_CHANNELS_LAST = os.getenv("DISEASE_CNN_CHANNELS_LAST", "1") not in ("0", "false", "False")
+CNN_TORCHSCRIPT = os.getenv("DISEASE_CNN_TORCHSCRIPT", "1") not in ("0", "false", "False")
+# Intra-op threads per worker process; 0 keeps PyTorch's default (all cores)
+CNN_THREADS = int(os.getenv("DISEASE_CNN_THREADS", "0"))
+# Largest class-probability difference from the eager model accepted by the parity check
+CNN_PARITY_TOLERANCE = float(os.getenv("DISEASE_CNN_PARITY_TOLERANCE", "0.01"))
+PARITY_SAMPLES = 8
+
+class ChannelsLastInput(nn.Module):
+    """Converts the input batch to channels-last so it matches the converted weights."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+def configure_threads(num_threads=CNN_THREADS):
+    """Set intra-op threads for this process, so several workers do not oversubscribe the cores"""
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+        logger.info(f"Using {num_threads} intra-op threads for CNN inference")
+
+def optimize_for_cpu(model, input_size=(3, 224, 224), quantize=CNN_QUANTIZE,
+                     channels_last=CNN_CHANNELS_LAST, torchscript=CNN_TORCHSCRIPT):
+    """
+    Build a CPU inference copy of an eval-mode model:
+    Linear layers are dynamically quantized to int8 (the 128*28*28 -> 512 layer holds almost
+    all of the weights), convolutions run in channels-last layout, and the result is traced
+    and frozen so weights become constants and Python dispatch disappears.
+    """
+    optimized = copy.deepcopy(model).eval()
+    if quantize:
+        optimized = torch.ao.quantization.quantize_dynamic(optimized, {nn.Linear}, dtype=torch.qint8)
+    if channels_last:
+        optimized = ChannelsLastInput(optimized.to(memory_format=torch.channels_last)).eval()
+    if torchscript:
+        example = torch.zeros((1,) + tuple(input_size))
+        with torch.no_grad():
+            optimized = torch.jit.freeze(torch.jit.trace(optimized, example))
+    return optimized
+
+def parity_inputs(input_size=(3, 224, 224), n_samples=PARITY_SAMPLES, seed=0):
+    """Deterministic normalized-image-like inputs for the parity check"""
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn((n_samples,) + tuple(input_size), generator=generator)
+
+def check_parity(reference, optimized, inputs):
+    """Return (max class-probability difference, top-1 agreement) between two models"""
+    with torch.no_grad():
+        expected = torch.softmax(reference(inputs), dim=1)
+        actual = torch.softmax(optimized(inputs), dim=1)
+    difference = float((expected - actual).abs().max())
+    agreement = float((expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean())
+    return difference, agreement
+
+def prepare_inference_model(model, device, input_size=(3, 224, 224), mode=CNN_INFERENCE_MODE,
+                            tolerance=CNN_PARITY_TOLERANCE):
+    """
+    Return the model to serve: the CPU-optimized version when it matches the eager model
+    within tolerance with the same top-1 class, otherwise the eager model unchanged.
+    """
+    if mode != "optimized" or device.type != "cpu":
+        return model
+    try:
+        optimized = optimize_for_cpu(model, input_size)
+        difference, agreement = check_parity(model, optimized, parity_inputs(input_size))
+        if difference > tolerance or agreement < 1.0:
+            logger.warning(
+                f"Optimized CNN differs from the eager model (max probability difference {difference:.4f}, "
+                f"top-1 agreement {agreement:.0%}); serving the eager model"
+            )
+            return model
+        logger.info(f"Serving optimized CNN (max probability difference {difference:.2g} from eager)")
+        return optimized
+    except Exception as e:
+        logger.warning(f"Could not optimize CNN for CPU inference ({e}); serving the eager model")
+        return model
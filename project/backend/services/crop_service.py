@@ -1,5 +1,4 @@
 from typing import List
-import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
@@ -9,37 +8,16 @@ from fastapi import APIRouter
 from services.disease_info_service import DiseaseInfoService
 import logging
 from services.ml_crop_service import get_ml_crop_recommendations
+from services.knowledge_base import get_knowledge_base
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Get the current directory
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Construct path to crops.csv
-crops_file = os.path.join(os.path.dirname(current_dir), "data", "crops.csv")
-
-# Load crop data
+# Crop data from the compiled knowledge base
 try:
-    if not os.path.exists(crops_file):
-        raise FileNotFoundError(f"Crops data file not found at: {crops_file}")
-    
-    # Read CSV with more flexible parsing
-    crops_df = pd.read_csv(
-        crops_file,
-        skipinitialspace=True,  # Skip spaces after delimiter
-        skip_blank_lines=True,  # Skip empty lines
-        encoding='utf-8',       # Use UTF-8 encoding
-        on_bad_lines='skip'     # Skip problematic lines
-    )
-    
-    # Clean up the data
-    crops_df = crops_df.dropna(how='all')  # Remove completely empty rows
-    crops_df = crops_df.fillna('')         # Replace NaN with empty string
-    
-    logger.info(f"Successfully loaded crop data from: {crops_file}")
-    logger.info(f"Number of crops loaded: {len(crops_df)}")
-    
+    crops = get_knowledge_base()["crops"]
+    logger.info(f"Number of crops loaded: {len(crops)}")
 except Exception as e:
     logger.error(f"Error loading crop data: {str(e)}")
     raise Exception(f"Failed to load crop data: {str(e)}")
@@ -74,14 +52,14 @@ def get_optimal_crops(weather_data: WeatherData, lat: float, lon: float) -> List
     region = get_region_from_coordinates(lat, lon)
     
     # Filter crops by season and region
-    season_crops = crops_df[
-        (crops_df['growing_season'].isin([current_season, 'Year-round'])) &
-        (crops_df['region'].isin([region, 'All']))
+    season_crops = [
+        crop for crop in crops
+        if crop['growing_season'] in (current_season, 'Year-round') and crop['region'] in (region, 'All')
     ]
     
     # Score each crop based on current weather conditions
     crop_scores = []
-    for _, crop in season_crops.iterrows():
+    for crop in season_crops:
         try:
             # Temperature score (0-1)
             temp_score = 1 - min(
@@ -127,10 +105,10 @@ router = APIRouter(prefix="/api")
 async def get_crops() -> List[Crop]:
     """Get all crops"""
     try:
-        crops = []
-        for _, row in crops_df.iterrows():
+        crop_list = []
+        for index, row in enumerate(crops):
             crop = Crop(
-                id=str(row.name),
+                id=str(index),
                 name=str(row['name']),
                 description=str(row['description']),
                 season=str(row['growing_season']),
@@ -138,8 +116,8 @@ async def get_crops() -> List[Crop]:
                 water_requirement=str(row['water_requirement']),
                 temperature_range=f"{row['temperature_min']}-{row['temperature_max']}°C"
             )
-            crops.append(crop)
-        return crops
+            crop_list.append(crop)
+        return crop_list
     except Exception as e:
         logger.error(f"Error getting crops: {str(e)}")
         raise Exception("Failed to get crops")
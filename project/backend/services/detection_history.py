@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import traceback
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# History storage configuration
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data'))
+HISTORY_DB_PATH = os.getenv("DETECTION_HISTORY_DB", os.path.join(DATA_DIR, 'detection_history.sqlite3'))
+# Previous JSON history file, imported once into the database
+LEGACY_HISTORY_PATH = os.path.join(DATA_DIR, 'detection_history.json')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_detections_timestamp ON detections (timestamp, seq);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def encode_cursor(timestamp, seq):
+    """Build the opaque cursor pointing just after a record"""
+    return f"{timestamp}|{seq}"
+
+def decode_cursor(cursor):
+    """Split a cursor into (timestamp, seq), raising ValueError if it is malformed"""
+    try:
+        timestamp, seq = cursor.rsplit("|", 1)
+        return timestamp, int(seq)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+class DetectionHistoryStore:
+    """Append-only detection history in SQLite, indexed by id and timestamp."""
+
+    def __init__(self, db_path=HISTORY_DB_PATH, legacy_path=LEGACY_HISTORY_PATH):
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._import_legacy(conn)
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            # WAL lets several uvicorn workers append while others read
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _import_legacy(self, conn):
+        """Copy records from the old JSON history file the first time the store is opened"""
+        try:
+            with conn:
+                imported = conn.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone()
+                if imported or not self.legacy_path or not os.path.exists(self.legacy_path):
+                    return
+                with open(self.legacy_path, "r") as f:
+                    records = json.load(f)
+                self._insert(conn, records)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)", (str(len(records)),))
+            logger.info(f"Imported {len(records)} records from {self.legacy_path}")
+        except Exception as e:
+            logger.error(f"Error importing legacy detection history: {e}")
+            logger.error(traceback.format_exc())
+
+    @staticmethod
+    def _insert(conn, records):
+        conn.executemany(
+            "INSERT OR IGNORE INTO detections (id, timestamp, record) VALUES (?, ?, ?)",
+            [(str(record["id"]), str(record.get("timestamp", "")), json.dumps(record)) for record in records]
+        )
+
+    def append(self, records):
+        """Append detection results; records whose id is already stored are ignored"""
+        if not records:
+            return
+        conn = self._connect()
+        with conn:
+            self._insert(conn, records)
+
+    def get(self, detection_id):
+        """Return one record by id, or None"""
+        row = self._connect().execute("SELECT record FROM detections WHERE id = ?", (detection_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def page(self, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """Return newest-first records after cursor, plus the cursor for the next page"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conn = self._connect()
+        if cursor:
+            timestamp, seq = decode_cursor(cursor)
+            rows = conn.execute(
+                "SELECT seq, timestamp, record FROM detections "
+                "WHERE (timestamp, seq) < (?, ?) ORDER BY timestamp DESC, seq DESC LIMIT ?",
+                (timestamp, seq, limit + 1)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT seq, timestamp, record FROM detections ORDER BY timestamp DESC, seq DESC LIMIT ?",
+                (limit + 1,)
+            ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+        return {
+            "items": [json.loads(row[2]) for row in rows],
+            "next_cursor": next_cursor
+        }
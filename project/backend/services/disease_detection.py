@@ -1,16 +1,33 @@
 import torch
 from torchvision import transforms
-from PIL import Image
 import os
-from .model_training import PlantDiseaseCNN
+from .model_training import build_model, resize_size_for, DEFAULT_ARCH, DEFAULT_IMAGE_SIZE
 from .disease_info_service import DiseaseInfoService
+from .image_preprocessing import load_image
+from .model_artifacts import prefer_artifact, read_manifest, load_state_dict_artifact, attach_state_dict
+from .micro_batcher import MicroBatcher
+from .inference_pool import run_blocking
+from .cnn_optimization import configure_threads, prepare_inference_model
+
+# Architecture and input size of the served CNN when the model has no artifact recording them
+CNN_ARCH = os.getenv("DISEASE_CNN_ARCH", DEFAULT_ARCH)
+CNN_IMAGE_SIZE = int(os.getenv("DISEASE_CNN_IMAGE_SIZE", str(DEFAULT_IMAGE_SIZE)))
 
 class DiseaseDetectionService:
-    def __init__(self, model_path):
+    def __init__(self, model_path, arch=None, image_size=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        
+        # An artifact records the architecture it was trained with; otherwise use the arguments or config
+        artifact_dir = prefer_artifact(model_path)
+        metadata = read_manifest(artifact_dir).get("metadata", {}) if artifact_dir else {}
+        self.arch = metadata.get("arch") or arch or CNN_ARCH
+        self.image_size = int(metadata.get("image_size") or image_size or CNN_IMAGE_SIZE)
+        
+        # Preprocessing sizes: the shorter side is resized, then center-cropped to image_size
+        self.resize_size = resize_size_for(self.image_size)
         self.transform = transforms.Compose([
-            transforms.Resize(255),
-            transforms.CenterCrop(224),
+            transforms.Resize(self.resize_size),
+            transforms.CenterCrop(self.image_size),
             transforms.ToTensor(),
             transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         ])
@@ -20,13 +37,81 @@ class DiseaseDetectionService:
                                  if os.path.isdir(os.path.join(os.path.dirname(model_path), "dataset", d))])
         
         # Initialize and load model
-        self.model = PlantDiseaseCNN(num_classes=len(self.class_names))
-        self.model.load_state_dict(torch.load(model_path, map_location=self.device))
+        self.model = build_model(self.arch, len(self.class_names), self.image_size)
+        if artifact_dir:
+            # Map the weights read-only so worker processes share one physical copy
+            state_dict, _ = load_state_dict_artifact(artifact_dir)
+            attach_state_dict(self.model, state_dict)
+        else:
+            self.model.load_state_dict(torch.load(model_path, map_location=self.device))
         self.model.to(self.device)
         self.model.eval()
         
+        # On CPU, serve a quantized, channels-last, frozen graph when it matches the eager model
+        configure_threads()
+        self.model = prepare_inference_model(self.model, self.device, (3, self.image_size, self.image_size))
+        
         # Initialize disease info service
         self.disease_info_service = DiseaseInfoService()
+        
+        # Concurrent predict_async calls share one forward pass
+        self.batcher = MicroBatcher(self.predict_batch, name="CNN disease detection")
+
+    def _build_result(self, probabilities):
+        """Prediction result for one row of class probabilities"""
+        confidence, predicted = torch.max(probabilities, 0)
+        
+        # Get predicted disease name
+        disease_name = self.class_names[predicted.item()]
+        
+        # Get disease information and recommendations
+        disease_info = self.disease_info_service.get_disease_info(disease_name)
+        recommendations = self.disease_info_service.get_disease_recommendations(disease_name)
+        
+        return {
+            "prediction": {
+                "disease": disease_name,
+                "confidence": float(confidence.item()),
+                "all_probabilities": {
+                    self.class_names[i]: float(prob)
+                    for i, prob in enumerate(probabilities.tolist())
+                }
+            },
+            "disease_info": disease_info,
+            "recommendations": recommendations
+        }
+
+    def predict_batch(self, images):
+        """
+        Predict disease for several images with a single forward pass
+        Args:
+            images: Image file paths, file objects or raw bytes
+        Returns:
+            list: One prediction result per image, or an Exception for images that could not be processed
+        """
+        results = [None] * len(images)
+        tensors = []
+        loaded = []
+        for index, image in enumerate(images):
+            try:
+                # Load at the smallest scale that still covers the resize, then preprocess
+                tensors.append(self.transform(load_image(image, (self.resize_size, self.resize_size))))
+                loaded.append(index)
+            except Exception as e:
+                results[index] = Exception(f"Error during prediction: {str(e)}")
+        
+        if tensors:
+            try:
+                # Get predictions for the whole batch at once
+                with torch.no_grad():
+                    outputs = self.model(torch.stack(tensors).to(self.device))
+                    probabilities = torch.nn.functional.softmax(outputs, dim=1).cpu()
+                for row, index in enumerate(loaded):
+                    results[index] = self._build_result(probabilities[row])
+            except Exception as e:
+                for index in loaded:
+                    results[index] = Exception(f"Error during prediction: {str(e)}")
+        return results
 
     def predict(self, image_path):
         """
@@ -36,39 +121,22 @@ class DiseaseDetectionService:
         Returns:
             dict: Prediction results with class, confidence, and disease information
         """
-        try:
-            # Load and preprocess image
-            image = Image.open(image_path).convert('RGB')
-            image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            
-            # Get prediction
-            with torch.no_grad():
-                outputs = self.model(image_tensor)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                confidence, predicted = torch.max(probabilities, 1)
-            
-            # Get predicted disease name
-            disease_name = self.class_names[predicted.item()]
-            
-            # Get disease information and recommendations
-            disease_info = self.disease_info_service.get_disease_info(disease_name)
-            recommendations = self.disease_info_service.get_disease_recommendations(disease_name)
-            
-            return {
-                "prediction": {
-                    "disease": disease_name,
-                    "confidence": float(confidence.item()),
-                    "all_probabilities": {
-                        self.class_names[i]: float(prob.item())
-                        for i, prob in enumerate(probabilities[0])
-                    }
-                },
-                "disease_info": disease_info,
-                "recommendations": recommendations
-            }
-            
-        except Exception as e:
-            raise Exception(f"Error during prediction: {str(e)}")
+        [result] = self.predict_batch([image_path])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def predict_async(self, image):
+        """
+        Predict from an async handler; requests arriving together are batched into one forward pass
+        Args:
+            image: Image file path, file object or raw bytes
+        Returns:
+            dict: Prediction results with class, confidence, and disease information
+        """
+        if not self.batcher.enabled:
+            return await run_blocking(self.predict, image)
+        return await self.batcher.submit(image)
 
 # Example usage:
 if __name__ == "__main__":
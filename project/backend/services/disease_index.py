@@ -0,0 +1,72 @@
+import re
+import threading
+
+# Separators found in model class names ("Tomato___Early_blight", "Corn_(maize)") and CSV names ("Early Blight")
+_SEPARATORS = re.compile(r"[\s_\-(),]+")
+# Upper bound on memoized fuzzy lookups, so arbitrary query strings cannot grow memory without limit
+MAX_MEMOIZED_LOOKUPS = 4096
+
+def normalize_name(name):
+    """Canonical form of a disease name: lower case words separated by single spaces"""
+    return _SEPARATORS.sub(" ", str(name)).strip().lower()
+
+class DiseaseIndex:
+    """
+    Name lookup over a disease catalog, built once when the catalog is loaded.
+
+    lookup() tries, in order: the exact key, the normalized name or a registered alias, and
+    finally a substring match in either direction against the normalized catalog names
+    (first match in catalog order). Substring results are memoized per normalized query, so
+    every name after its first lookup, and every name passed to warm(), resolves with dict
+    lookups only.
+    """
+
+    def __init__(self, names, aliases=None):
+        self.names = list(names)
+        self._names = set(self.names)
+        self._normalized = [(normalize_name(name), name) for name in self.names]
+        self._exact = {}
+        for normalized, name in self._normalized:
+            self._exact.setdefault(normalized, name)
+        for alias, name in (aliases or {}).items():
+            self.add_alias(alias, name)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def add_alias(self, alias, name):
+        """Resolve alias to the catalog name name"""
+        self._exact[normalize_name(alias)] = name
+
+    def _scan(self, normalized):
+        for candidate, name in self._normalized:
+            if candidate and (normalized in candidate or candidate in normalized):
+                return name
+        return None
+
+    def lookup(self, name):
+        """Catalog name matching name, or None"""
+        if name is None:
+            return None
+        if name in self._names:
+            return name
+        normalized = normalize_name(name)
+        if not normalized:
+            return None
+        match = self._exact.get(normalized)
+        if match is not None:
+            return match
+        try:
+            return self._memo[normalized]
+        except KeyError:
+            pass
+        match = self._scan(normalized)
+        with self._lock:
+            if len(self._memo) >= MAX_MEMOIZED_LOOKUPS:
+                self._memo.clear()
+            self._memo[normalized] = match
+        return match
+
+    def warm(self, names):
+        """Precompute lookups for names that are known ahead of time, such as model classes"""
+        for name in names:
+            self.lookup(name)
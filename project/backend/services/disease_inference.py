@@ -0,0 +1,301 @@
+import logging
+import os
+import pickle
+import traceback
+import numpy as np
+from services.feature_extraction import extract_features_from_image, extract_features_from_images, FEATURE_IMAGE_SIZE
+from services.image_preprocessing import load_image
+from services.model_artifacts import prefer_artifact, load_pipeline_artifact, resolve_callable, model_file_version
+from services.forest_engine import select_engine, DISEASE_MODEL_ENGINE
+
+# The disease model and the decode, feature and predict stages that run in the inference pool.
+# Process workers import only this module, so they load the model without building the
+# API process's stores, caches and pools.
+
+# Set up logging with more detailed format
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Model configuration - Fix path to be absolute
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../models'))
+MODEL_PATH = os.path.join(MODEL_DIR, 'disease_model.pkl')
+
+# Ensure directories exist
+os.makedirs(MODEL_DIR, exist_ok=True)
+
+class PlantDiseaseModel:
+    def __init__(self):
+        self.model = None
+        self.feature_extractor = None
+        self.classes = []
+        self.version = None
+        logger.info("Initializing Plant Disease ML Model")
+        self.initialize_model()
+        # Serve from the compiled forest arrays when they reproduce the model's outputs
+        self.model = select_engine(self.model, DISEASE_MODEL_ENGINE, "disease model")
+    
+    def load_artifact(self, path):
+        """Load the model from a memory-mapped artifact directory."""
+        self.model = load_pipeline_artifact(path)
+        metadata = self.model.manifest["metadata"]
+        self.classes = metadata["classes"]
+        self.feature_extractor = resolve_callable(metadata.get("feature_extractor"))
+        self.version = self.model.version
+        logger.info(f"Loaded ML model artifact {self.version} with {len(self.classes)} disease classes")
+
+    def initialize_model(self):
+        """Initialize the model from the saved file or create a new one."""
+        try:
+            # Prefer the memory-mapped artifact, which loads without unpickling;
+            # the sklearn engine serves the pickled pipeline instead
+            artifact_dir = prefer_artifact(MODEL_PATH) if DISEASE_MODEL_ENGINE == "compiled" else None
+            if artifact_dir:
+                try:
+                    self.load_artifact(artifact_dir)
+                    return
+                except Exception as e:
+                    logger.warning(f"Could not load model artifact from {artifact_dir}: {e}")
+            
+            if os.path.exists(MODEL_PATH):
+                logger.info(f"Loading model from: {MODEL_PATH}")
+                with open(MODEL_PATH, 'rb') as f:
+                    model_data = pickle.load(f)
+                
+                # Get model components
+                self.model = model_data['model']
+                self.classes = model_data['classes']
+                self.feature_extractor = model_data.get('feature_extractor')
+                self.version = model_file_version(MODEL_PATH)
+                
+                logger.info(f"Loaded ML model {self.version} with {len(self.classes)} disease classes")
+            else:
+                logger.warning(f"Model file not found at: {MODEL_PATH}")
+                logger.info("Creating a new default model")
+                
+                # Import setup_model to create a new model
+                import sys
+                sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+                import setup_model
+                
+                # Create a new model
+                setup_model.setup_model()
+                
+                # Check if model was created successfully
+                if not os.path.exists(MODEL_PATH):
+                    raise FileNotFoundError(f"Model file was not created at {MODEL_PATH}")
+                
+                # Load the newly created model
+                with open(MODEL_PATH, 'rb') as f:
+                    model_data = pickle.load(f)
+                
+                # Get model components
+                self.model = model_data['model']
+                self.classes = model_data['classes']
+                self.feature_extractor = model_data.get('feature_extractor')
+                self.version = model_file_version(MODEL_PATH)
+                
+                logger.info(f"Created new ML model {self.version} with {len(self.classes)} disease classes")
+        except Exception as e:
+            logger.error(f"Error initializing model: {e}")
+            logger.error(traceback.format_exc())
+            
+            # Create a simple fallback model
+            try:
+                logger.info("Attempting to create a fallback model")
+                
+                # Import necessary modules for fallback model
+                from sklearn.ensemble import RandomForestClassifier
+                from sklearn.preprocessing import StandardScaler
+                from sklearn.pipeline import Pipeline
+                
+                # Create a simple model with default classes
+                default_classes = [
+                    "Tomato_Healthy",
+                    "Tomato_Early_blight",
+                    "Tomato_Late_blight",
+                    "Apple_Healthy",
+                    "Apple_Black_rot",
+                    "Apple_Scab"
+                ]
+                
+                # Create a simple feature extractor
+                def simple_feature_extractor(image):
+                    img_gray = image.convert('L').resize((50, 50))
+                    features = np.array(img_gray).flatten() / 255.0
+                    return features
+                
+                # Create a simple pipeline
+                pipeline = Pipeline([
+                    ('scaler', StandardScaler()),
+                    ('classifier', RandomForestClassifier(n_estimators=10, random_state=42))
+                ])
+                
+                # Train on dummy data
+                X = np.random.rand(60, 2500)  # 10 samples per class, 50x50 features
+                y = np.repeat(np.arange(6), 10)  # 6 classes, 10 samples each
+                pipeline.fit(X, y)
+                
+                self.model = pipeline
+                self.classes = default_classes
+                self.feature_extractor = simple_feature_extractor
+                self.version = "fallback"
+                
+                logger.info("Created fallback model with default classes")
+            except Exception as fallback_error:
+                logger.error(f"Failed to create fallback model: {fallback_error}")
+                logger.error(traceback.format_exc())
+                raise Exception(f"Failed to initialize model: {str(e)}")
+
+    def extract_features(self, image):
+        """Extract the feature vector for a single image"""
+        if self.feature_extractor:
+            return self.feature_extractor(image)
+        # Fallback feature extraction if not provided in the model
+        logger.warning("No feature extractor found, using default method")
+        # Convert image to grayscale and resize
+        img_gray = image.convert('L').resize((50, 50))
+        # Flatten and normalize
+        return np.array(img_gray).flatten() / 255.0
+
+    def format_prediction(self, probabilities):
+        """Turn one row of class probabilities into (disease_name, confidence, top_predictions)"""
+        # Probability columns follow the classifier's classes_, which leaves out classes it had no samples of
+        labels = getattr(self.model, "classes_", None)
+        if labels is None:
+            labels = np.arange(len(probabilities))
+        
+        # Get top prediction
+        predicted_idx = np.argmax(probabilities)
+        confidence = probabilities[predicted_idx]
+        disease_name = self.classes[labels[predicted_idx]]
+        
+        # Get top 3 predictions (or fewer if there are fewer classes)
+        top_k = min(3, len(probabilities))
+        top_indices = np.argsort(probabilities)[-top_k:][::-1]
+        top_predictions = [
+            {
+                "disease": self.classes[labels[idx]],
+                "confidence": probabilities[idx] * 100
+            }
+            for idx in top_indices
+        ]
+        
+        return disease_name, confidence * 100, top_predictions
+
+    def predict(self, image):
+        """Make a prediction using the ML model"""
+        try:
+            # Extract features and reshape for single sample prediction
+            features = self.extract_features(image).reshape(1, -1)
+            
+            # Get prediction probabilities
+            probabilities = self.model.predict_proba(features)[0]
+            
+            return self.format_prediction(probabilities)
+        except Exception as e:
+            logger.error(f"Error making prediction: {e}")
+            logger.error(traceback.format_exc())
+            raise Exception(f"Failed to make prediction: {str(e)}")
+
+    def predict_batch(self, images):
+        """Make predictions for many images with a single predict_proba call"""
+        try:
+            if not images:
+                return []
+            
+            # Build one feature matrix for the whole batch, vectorized for the standard extractor
+            if self.feature_extractor is extract_features_from_image:
+                features = extract_features_from_images(images)
+            else:
+                features = np.vstack([self.extract_features(image).reshape(1, -1) for image in images])
+            
+            # Get prediction probabilities for every row at once
+            probabilities = self.model.predict_proba(features)
+            
+            return [self.format_prediction(row) for row in probabilities]
+        except Exception as e:
+            logger.error(f"Error making batch prediction: {e}")
+            logger.error(traceback.format_exc())
+            raise Exception(f"Failed to make batch prediction: {str(e)}")
+
+def load_disease_model():
+    """Load the disease model from disk for a reload, refusing to swap in the fallback model"""
+    model = PlantDiseaseModel()
+    if model.version == "fallback":
+        raise Exception(f"Disease model could not be loaded from {MODEL_PATH}")
+    return model, model.version
+
+# Returns the model that analyze_image(s) predict with. The API process points it at its
+# ModelManager; process workers load their own copy of the model files when they start.
+_current_model = None
+
+def serve_model(get_model):
+    """Predict with get_model() in this process, e.g. lambda: disease_models.model"""
+    global _current_model
+    _current_model = get_model
+
+def current_model():
+    """The disease model this process predicts with, loading it in a process worker on first use"""
+    if _current_model is None:
+        model = PlantDiseaseModel()
+        serve_model(lambda: model)
+    return _current_model()
+
+def open_image(image_data):
+    """Decode uploaded image bytes into an RGB PIL image, at reduced resolution when possible."""
+    try:
+        image = load_image(image_data, FEATURE_IMAGE_SIZE)
+        logger.info(f"Image opened successfully: {image.size}, {image.mode}")
+        return image
+    except Exception as e:
+        logger.error(f"Error opening image: {e}")
+        logger.error(traceback.format_exc())
+        raise ValueError(f"Failed to open image: {str(e)}")
+
+def analyze_image(image_data):
+    """Decode, extract features and predict for one upload. Runs inside the inference pool.
+    
+    Returns (disease_name, confidence, top_predictions, model_version).
+    """
+    image = open_image(image_data)
+    model = current_model()
+    try:
+        disease_name, confidence_score, top_predictions = model.predict(image)
+        logger.info(f"Prediction: {disease_name}, Confidence: {confidence_score:.2f}%")
+        return disease_name, confidence_score, top_predictions, model.version
+    except Exception as e:
+        logger.error(f"Error making prediction: {e}")
+        logger.error(traceback.format_exc())
+        raise ValueError(f"Failed to analyze image: {str(e)}")
+
+def analyze_images(images_data):
+    """Decode and predict many uploads with one predict_proba call. Runs inside the inference pool.
+    
+    Returns one entry per input: a prediction tuple, or an {"error": ...} dict for images that fail to decode.
+    """
+    outputs = [None] * len(images_data)
+    decoded = []
+    for index, image_data in enumerate(images_data):
+        try:
+            decoded.append((index, open_image(image_data)))
+        except ValueError as ve:
+            outputs[index] = {"error": str(ve)}
+    
+    model = current_model()
+    try:
+        predictions = model.predict_batch([image for _, image in decoded])
+    except Exception as e:
+        logger.error(f"Error making batch prediction: {e}")
+        logger.error(traceback.format_exc())
+        raise ValueError(f"Failed to analyze images: {str(e)}")
+    
+    for (index, _), prediction in zip(decoded, predictions):
+        outputs[index] = (*prediction, model.version)
+    return outputs
+
+def init_inference_worker():
+    """Preload the disease model in an inference pool worker; thread workers share the API process's model."""
+    logger.info(f"Inference worker ready with {len(current_model().classes)} disease classes")
@@ -1,91 +1,48 @@
-import pandas as pd
-import os
 from typing import List, Dict
+from services.disease_index import DiseaseIndex
+from services.knowledge_base import get_knowledge_base
 
 class DiseaseInfoService:
     def __init__(self):
-        # Get the current directory
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        # Construct path to disease_info.csv
-        self.disease_file = os.path.join(os.path.dirname(current_dir), "data", "disease_info.csv")
-        self.supplement_file = os.path.join(os.path.dirname(current_dir), "data", "supplement_info.csv")
+        # Diseases with their supplements already joined, from the compiled knowledge base
+        self.diseases = get_knowledge_base()["diseases"]
         
-        # Load disease and supplement data
-        self.disease_df = self._load_disease_data()
-        self.supplement_df = self._load_supplement_data()
+        # Build the per-disease records and name index once instead of scanning per call
+        self._build_index()
 
-    def _load_disease_data(self) -> pd.DataFrame:
-        """Load disease information from CSV file"""
-        try:
-            if not os.path.exists(self.disease_file):
-                raise FileNotFoundError(f"Disease data file not found at: {self.disease_file}")
-            
-            df = pd.read_csv(
-                self.disease_file,
-                skipinitialspace=True,
-                skip_blank_lines=True,
-                encoding='utf-8',
-                on_bad_lines='skip'
-            )
-            
-            df = df.dropna(how='all')
-            df = df.fillna('')
-            print(f"Successfully loaded disease data from: {self.disease_file}")
-            return df
-            
-        except Exception as e:
-            print(f"Error loading disease data: {str(e)}")
-            raise Exception(f"Failed to load disease data: {str(e)}")
-
-    def _load_supplement_data(self) -> pd.DataFrame:
-        """Load supplement information from CSV file"""
-        try:
-            if not os.path.exists(self.supplement_file):
-                raise FileNotFoundError(f"Supplement data file not found at: {self.supplement_file}")
-            
-            df = pd.read_csv(
-                self.supplement_file,
-                skipinitialspace=True,
-                skip_blank_lines=True,
-                encoding='utf-8',
-                on_bad_lines='skip'
-            )
-            
-            df = df.dropna(how='all')
-            df = df.fillna('')
-            print(f"Successfully loaded supplement data from: {self.supplement_file}")
-            return df
-            
-        except Exception as e:
-            print(f"Error loading supplement data: {str(e)}")
-            raise Exception(f"Failed to load supplement data: {str(e)}")
+    def _build_index(self):
+        """Index disease records by name for O(1) lookup"""
+        self.records = {}
+        for disease in self.diseases:
+            self.records[disease['disease_name']] = {
+                "name": disease['disease_name'],
+                "description": disease['description'],
+                "symptoms": disease['symptoms'],
+                "causes": disease['causes'],
+                "prevention": disease['prevention'],
+                "treatment": disease['treatment'],
+                "supplements": disease['supplements']
+            }
+        self.index = DiseaseIndex(self.records)
 
     def get_disease_info(self, disease_name: str) -> Dict:
         """Get detailed information about a specific disease"""
         try:
-            disease_info = self.disease_df[self.disease_df['disease_name'].str.lower() == disease_name.lower()].iloc[0]
-            
-            # Get related supplements
-            supplements = self.supplement_df[
-                self.supplement_df['disease_name'].str.lower() == disease_name.lower()
-            ].to_dict('records')
-            
-            return {
-                "name": disease_info['disease_name'],
-                "description": disease_info['description'],
-                "symptoms": disease_info['symptoms'],
-                "causes": disease_info['causes'],
-                "prevention": disease_info['prevention'],
-                "treatment": disease_info['treatment'],
-                "supplements": supplements
-            }
+            name = self.index.lookup(disease_name)
+            if name is None:
+                raise KeyError(f"Unknown disease: {disease_name}")
+            record = self.records[name]
+            return dict(record, supplements=[dict(supplement) for supplement in record["supplements"]])
         except Exception as e:
             raise Exception(f"Error getting disease info: {str(e)}")
 
     def get_all_diseases(self) -> List[Dict]:
         """Get information about all diseases"""
         try:
-            return self.disease_df.to_dict('records')
+            return [
+                {key: value for key, value in disease.items() if key != 'supplements'}
+                for disease in self.diseases
+            ]
         except Exception as e:
             raise Exception(f"Error getting all diseases: {str(e)}")
 
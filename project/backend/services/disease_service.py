@@ -9,9 +9,21 @@ import json
 from datetime import datetime
 import uuid
 import logging
-import pandas as pd
 from typing import Dict, List, Optional
 import traceback
+from services.inference_pool import InferencePool, InferenceQueueFull, run_blocking
+from services.micro_batcher import MicroBatcher
+from services.image_preprocessing import PREPROCESSING_VERSION
+from services.model_artifacts import artifact_path
+from services.model_manager import ModelManager
+from services.disease_index import DiseaseIndex
+from services.knowledge_base import disease_info_entries
+from services.disease_inference import (
+    PlantDiseaseModel, load_disease_model, serve_model, analyze_image, analyze_images, init_inference_worker, MODEL_PATH
+)
+from services.result_cache import InferenceCache
+from services.detection_history import DetectionHistoryStore, DEFAULT_PAGE_SIZE
+from services.image_store import ImageStore, DETECTIONS_DIR
 
 # Set up logging with more detailed format
 logging.basicConfig(
@@ -22,204 +34,40 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# Load disease and supplement information
+# Disease and supplement information from the compiled knowledge base
 try:
-    disease_info_df = pd.read_csv(os.path.join(os.path.dirname(__file__), '../data/disease_info.csv'))
-    supplement_info_df = pd.read_csv(os.path.join(os.path.dirname(__file__), '../data/supplement_info.csv'))
-    
-    # Create disease info dictionary
-    DISEASE_INFO = {}
-    for _, row in disease_info_df.iterrows():
-        disease_name = row['disease_name']
-        supplements = supplement_info_df[supplement_info_df['disease_name'] == disease_name]
-        
-        DISEASE_INFO[disease_name] = {
-            'description': row['description'],
-            'symptoms': row['symptoms'],
-            'causes': row['causes'],
-            'prevention': row['prevention'],
-            'treatment': row['treatment'],
-            'supplements': [
-                {
-                    'name': sup['supplement_name'],
-                    'description': sup['description'],
-                    'application': sup['application_method'],
-                    'precautions': sup['precautions']
-                }
-                for _, sup in supplements.iterrows()
-            ]
-        }
-    logger.info(f"Successfully loaded disease info for {len(DISEASE_INFO)} diseases")
+    CATALOG_DISEASE_INFO = disease_info_entries()
+    logger.info(f"Successfully loaded disease info for {len(CATALOG_DISEASE_INFO)} diseases")
 except Exception as e:
     logger.error(f"Error loading disease info: {e}\n{traceback.format_exc()}")
-    DISEASE_INFO = {}
-
-# Model configuration - Fix path to be absolute
-MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../models'))
-MODEL_PATH = os.path.join(MODEL_DIR, 'disease_model.pkl')
-DETECTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/detections'))
-DETECTION_HISTORY_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/detection_history.json'))
-
-# Ensure directories exist
-os.makedirs(MODEL_DIR, exist_ok=True)
-os.makedirs(DETECTIONS_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(DETECTION_HISTORY_PATH), exist_ok=True)
-
-class PlantDiseaseModel:
-    def __init__(self):
-        self.model = None
-        self.feature_extractor = None
-        self.classes = []
-        logger.info("Initializing Plant Disease ML Model")
-        self.initialize_model()
-    
-    def initialize_model(self):
-        """Initialize the model from the saved file or create a new one."""
-        try:
-            if os.path.exists(MODEL_PATH):
-                logger.info(f"Loading model from: {MODEL_PATH}")
-                with open(MODEL_PATH, 'rb') as f:
-                    model_data = pickle.load(f)
-                
-                # Get model components
-                self.model = model_data['model']
-                self.classes = model_data['classes']
-                self.feature_extractor = model_data.get('feature_extractor')
-                
-                logger.info(f"Loaded ML model with {len(self.classes)} disease classes")
-            else:
-                logger.warning(f"Model file not found at: {MODEL_PATH}")
-                logger.info("Creating a new default model")
-                
-                # Import setup_model to create a new model
-                import sys
-                sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-                import setup_model
-                
-                # Create a new model
-                setup_model.setup_model()
-                
-                # Check if model was created successfully
-                if not os.path.exists(MODEL_PATH):
-                    raise FileNotFoundError(f"Model file was not created at {MODEL_PATH}")
-                
-                # Load the newly created model
-                with open(MODEL_PATH, 'rb') as f:
-                    model_data = pickle.load(f)
-                
-                # Get model components
-                self.model = model_data['model']
-                self.classes = model_data['classes']
-                self.feature_extractor = model_data.get('feature_extractor')
-                
-                logger.info(f"Created new ML model with {len(self.classes)} disease classes")
-        except Exception as e:
-            logger.error(f"Error initializing model: {e}")
-            logger.error(traceback.format_exc())
-            
-            # Create a simple fallback model
-            try:
-                logger.info("Attempting to create a fallback model")
-                
-                # Import necessary modules for fallback model
-                from sklearn.ensemble import RandomForestClassifier
-                from sklearn.preprocessing import StandardScaler
-                from sklearn.pipeline import Pipeline
-                
-                # Create a simple model with default classes
-                default_classes = [
-                    "Tomato_Healthy",
-                    "Tomato_Early_blight",
-                    "Tomato_Late_blight",
-                    "Apple_Healthy",
-                    "Apple_Black_rot",
-                    "Apple_Scab"
-                ]
-                
-                # Create a simple feature extractor
-                def simple_feature_extractor(image):
-                    img_gray = image.convert('L').resize((50, 50))
-                    features = np.array(img_gray).flatten() / 255.0
-                    return features
-                
-                # Create a simple pipeline
-                pipeline = Pipeline([
-                    ('scaler', StandardScaler()),
-                    ('classifier', RandomForestClassifier(n_estimators=10, random_state=42))
-                ])
-                
-                # Train on dummy data
-                X = np.random.rand(60, 2500)  # 10 samples per class, 50x50 features
-                y = np.repeat(np.arange(6), 10)  # 6 classes, 10 samples each
-                pipeline.fit(X, y)
-                
-                self.model = pipeline
-                self.classes = default_classes
-                self.feature_extractor = simple_feature_extractor
-                
-                logger.info("Created fallback model with default classes")
-            except Exception as fallback_error:
-                logger.error(f"Failed to create fallback model: {fallback_error}")
-                logger.error(traceback.format_exc())
-                raise Exception(f"Failed to initialize model: {str(e)}")
+    CATALOG_DISEASE_INFO = {}
 
-    def predict(self, image):
-        """Make a prediction using the ML model"""
-        try:
-            # Extract features from image
-            if self.feature_extractor:
-                features = self.feature_extractor(image)
-            else:
-                # Fallback feature extraction if not provided in the model
-                logger.warning("No feature extractor found, using default method")
-                # Convert image to grayscale and resize
-                img_gray = image.convert('L').resize((50, 50))
-                # Flatten and normalize
-                features = np.array(img_gray).flatten() / 255.0
-            
-            # Reshape for single sample prediction
-            features = features.reshape(1, -1)
-            
-            # Get prediction probabilities
-            probabilities = self.model.predict_proba(features)[0]
-            
-            # Get top prediction
-            predicted_idx = np.argmax(probabilities)
-            confidence = probabilities[predicted_idx]
-            disease_name = self.classes[predicted_idx]
-            
-            # Get top 3 predictions (or fewer if there are fewer classes)
-            top_k = min(3, len(self.classes))
-            top_indices = np.argsort(probabilities)[-top_k:][::-1]
-            top_predictions = [
-                {
-                    "disease": self.classes[idx],
-                    "confidence": probabilities[idx] * 100
-                }
-                for idx in top_indices
-            ]
-            
-            return disease_name, confidence * 100, top_predictions
-        except Exception as e:
-            logger.error(f"Error making prediction: {e}")
-            logger.error(traceback.format_exc())
-            raise Exception(f"Failed to make prediction: {str(e)}")
+def _recycle_inference_workers(model, version):
+    """Replace process workers so they load the new model; thread workers share this process's model"""
+    inference_pool.recycle()
 
-# Initialize model
+# Initialize model; the manager swaps in new versions when the model files change
 plant_disease_model = PlantDiseaseModel()
+disease_models = ModelManager(
+    "disease model",
+    load_disease_model,
+    watch_paths=[MODEL_PATH, artifact_path(MODEL_PATH)],
+    initial=(plant_disease_model, plant_disease_model.version),
+    on_swap=_recycle_inference_workers
+)
+# Thread and inline inference in this process predicts with the manager's current model
+serve_model(lambda: disease_models.model)
 
 def get_disease_info(disease_name):
     """Get information about a disease."""
     try:
-        if disease_name in DISEASE_INFO:
-            return DISEASE_INFO[disease_name]
+        # Exact, normalized and similar names all resolve through the precomputed index
+        key = disease_index.lookup(disease_name)
+        if key is not None:
+            if key != disease_name:
+                logger.info(f"Found similar disease: {key} for {disease_name}")
+            return DISEASE_INFO[key]
         else:
-            # Try to match with similar disease name
-            for key in DISEASE_INFO.keys():
-                if disease_name.lower() in key.lower() or key.lower() in disease_name.lower():
-                    logger.info(f"Found similar disease: {key} for {disease_name}")
-                    return DISEASE_INFO[key]
-            
             # If still not found, check if it's a healthy plant
             if "Healthy" in disease_name:
                 plant_name = disease_name.split("_")[0]
@@ -254,89 +102,128 @@ def get_disease_info(disease_name):
             "recommendations": "Please try again later."
         }
 
+FALLBACK_DISEASE_INFO = {
+    "description": "Information not available",
+    "symptoms": "Information not available",
+    "causes": "Information not available",
+    "prevention": "Information not available",
+    "treatment": "Information not available",
+    "recommendations": "Please consult with an agricultural expert."
+}
+
+# Uploaded images, written in the background into a sharded directory tree
+image_store = ImageStore(DETECTIONS_DIR)
+
+def save_detection_image(image_data):
+    """Queue uploaded image bytes for writing and return (image_id, image_filename)."""
+    image_id = str(uuid.uuid4())
+    try:
+        image_filename = image_store.save(image_id, image_data)
+    except Exception as e:
+        logger.error(f"Error queueing image for saving: {e}")
+        logger.error(traceback.format_exc())
+        # Continue with detection even if saving fails
+        image_filename = f"{image_id}.jpg"
+    return image_id, image_filename
+
+def build_detection_result(image_id, image_filename, disease_name, confidence_score, top_predictions, model_version=None):
+    """Combine a prediction with disease information into a detection result."""
+    # Get disease information
+    try:
+        disease_info = get_disease_info(disease_name)
+        logger.info("Disease information retrieved successfully")
+    except Exception as e:
+        logger.error(f"Error getting disease info: {e}")
+        logger.error(traceback.format_exc())
+        # Use fallback information
+        disease_info = FALLBACK_DISEASE_INFO
+    
+    return {
+        "id": image_id,
+        "timestamp": datetime.now().isoformat(),
+        "image_url": f"/detections/{image_filename}",
+        "disease_name": disease_name,
+        "confidence": confidence_score,
+        "description": disease_info.get("description", "Information not available"),
+        "symptoms": disease_info.get("symptoms", "Information not available"),
+        "causes": disease_info.get("causes", "Information not available"),
+        "treatment": disease_info.get("treatment", "Information not available"),
+        "prevention": disease_info.get("prevention", "Information not available"),
+        "supplements": disease_info.get("supplements", []),
+        "alternative_predictions": top_predictions[1:],
+        "model_version": model_version
+    }
+
+# Pool running the decode, feature and predict stages off the event loop
+inference_pool = InferencePool(initializer=init_inference_worker)
+
+# Concurrent single-image detections share one predict_proba call
+disease_batcher = MicroBatcher(analyze_images, runner=inference_pool.run, name="disease detection")
+
+# Append-only detection history
+history_store = DetectionHistoryStore()
+
+# Results of previous detections, keyed by upload content and model version
+result_cache = InferenceCache()
+
+def lookup_cached_results(images_data):
+    """Return (cache_key, cached_result_or_None) for each upload."""
+    lookups = []
+    model_version = disease_models.version
+    for image_data in images_data:
+        cache_key = result_cache.make_key(image_data, f"{model_version}:{PREPROCESSING_VERSION}")
+        lookups.append((cache_key, result_cache.get(cache_key)))
+    return lookups
+
+def cache_results(entries):
+    """Store (cache_key, result) pairs in the result cache."""
+    for cache_key, result in entries:
+        result_cache.put(cache_key, result)
+
 async def detect_disease(image_data):
     """Detect disease from image data."""
     try:
         logger.info("Starting disease detection")
         
-        # Save image to disk
-        try:
-            image_id = str(uuid.uuid4())
-            image_filename = f"{image_id}.jpg"
-            image_path = os.path.join(DETECTIONS_DIR, image_filename)
-            
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-            logger.info(f"Image saved to: {image_path}")
-        except Exception as e:
-            logger.error(f"Error saving image to disk: {e}")
-            logger.error(traceback.format_exc())
-            # Continue with detection even if saving fails
-        
-        # Open image
-        try:
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-            logger.info(f"Image opened successfully: {image.size}, {image.mode}")
-        except Exception as e:
-            logger.error(f"Error opening image: {e}")
-            logger.error(traceback.format_exc())
-            raise ValueError(f"Failed to open image: {str(e)}")
+        # A repeated upload returns the stored result without predicting or saving again
+        [(cache_key, cached_result)] = await run_blocking(lookup_cached_results, [image_data])
+        if cached_result is not None:
+            logger.info(f"Returning cached detection result {cached_result.get('id')}")
+            return cached_result
         
-        # Make prediction
-        try:
-            disease_name, confidence_score, top_predictions = plant_disease_model.predict(image)
-            logger.info(f"Prediction: {disease_name}, Confidence: {confidence_score:.2f}%")
-            logger.info("Prediction completed successfully")
-        except Exception as e:
-            logger.error(f"Error making prediction: {e}")
-            logger.error(traceback.format_exc())
-            raise ValueError(f"Failed to analyze image: {str(e)}")
+        # Decode, extract features and predict in the inference pool, batched with concurrent uploads
+        if disease_batcher.enabled:
+            output = await disease_batcher.submit(image_data)
+            if isinstance(output, dict):
+                raise ValueError(output["error"])
+        else:
+            output = await inference_pool.run(analyze_image, image_data)
+        disease_name, confidence_score, top_predictions, model_version = output
+        logger.info("Prediction completed successfully")
         
-        # Get disease information
-        try:
-            disease_info = get_disease_info(disease_name)
-            logger.info("Disease information retrieved successfully")
-        except Exception as e:
-            logger.error(f"Error getting disease info: {e}")
-            logger.error(traceback.format_exc())
-            # Use fallback information
-            disease_info = {
-                "description": "Information not available",
-                "symptoms": "Information not available",
-                "causes": "Information not available",
-                "prevention": "Information not available",
-                "treatment": "Information not available",
-                "recommendations": "Please consult with an agricultural expert."
-            }
+        # Save image to disk; a full write queue writes inline, so keep it off the event loop
+        image_id, image_filename = await run_blocking(save_detection_image, image_data)
         
         # Create result
-        result = {
-            "id": image_id,
-            "timestamp": datetime.now().isoformat(),
-            "image_url": f"/detections/{image_filename}",
-            "disease_name": disease_name,
-            "confidence": confidence_score,
-            "description": disease_info.get("description", "Information not available"),
-            "symptoms": disease_info.get("symptoms", "Information not available"),
-            "causes": disease_info.get("causes", "Information not available"),
-            "treatment": disease_info.get("treatment", "Information not available"),
-            "prevention": disease_info.get("prevention", "Information not available"),
-            "supplements": disease_info.get("supplements", []),
-            "alternative_predictions": top_predictions[1:]
-        }
+        result = build_detection_result(image_id, image_filename, disease_name, confidence_score, top_predictions, model_version)
         
         # Save to detection history
         try:
-            save_detection_history(result)
+            await run_blocking(save_detection_history, result)
             logger.info("Detection result saved to history")
         except Exception as e:
             logger.error(f"Error saving detection history: {e}")
             logger.error(traceback.format_exc())
             # Continue even if saving history fails
         
+        await run_blocking(cache_results, [(cache_key, result)])
+        
         logger.info("Disease detection completed successfully")
         return result
         
+    except InferenceQueueFull as qf:
+        logger.warning(f"Rejecting disease detection: {qf}")
+        raise HTTPException(status_code=503, detail="Disease detection is busy, please retry shortly")
     except ValueError as ve:
         # Known validation errors
         logger.error(f"Validation error in disease detection: {ve}")
@@ -347,40 +234,94 @@ async def detect_disease(image_data):
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-def save_detection_history(result):
-    """Save detection result to history."""
+def _save_batch_images(images_data, outputs):
+    """Queue the images whose predictions succeeded and return their (image_id, image_filename) pairs."""
+    return [
+        save_detection_image(image_data) if not isinstance(output, dict) else None
+        for image_data, output in zip(images_data, outputs)
+    ]
+
+async def detect_diseases_batch(images_data):
+    """Detect disease for many images with one feature matrix and one predict_proba call.
+    
+    Returns one entry per input, in order. Successful entries have the same shape as
+    detect_disease results; images that fail to decode get an {"error": ...} entry instead.
+    """
     try:
-        # Load existing history
-        history = []
-        if os.path.exists(DETECTION_HISTORY_PATH):
-            with open(DETECTION_HISTORY_PATH, "r") as f:
-                    history = json.load(f)
+        logger.info(f"Starting batch disease detection for {len(images_data)} images")
         
-        # Add new result
-        history.append(result)
+        # Repeated uploads are answered from the result cache
+        lookups = await run_blocking(lookup_cached_results, images_data)
+        misses = [index for index, (_, cached_result) in enumerate(lookups) if cached_result is None]
+        logger.info(f"{len(images_data) - len(misses)} of {len(images_data)} images found in the result cache")
         
-        # Save updated history
-        with open(DETECTION_HISTORY_PATH, "w") as f:
-            json.dump(history, f, indent=2)
+        # Decode, extract features and predict the remaining images in the inference pool
+        miss_data = [images_data[index] for index in misses]
+        outputs = await inference_pool.run(analyze_images, miss_data) if miss_data else []
         
+        # Save images to disk; a full write queue writes inline, so keep it off the event loop
+        saved = await run_blocking(_save_batch_images, miss_data, outputs)
+        
+        results = [cached_result for _, cached_result in lookups]
+        batch_results = []
+        new_entries = []
+        for index, output, names in zip(misses, outputs, saved):
+            if isinstance(output, dict):
+                results[index] = output
+                continue
+            disease_name, confidence_score, top_predictions, model_version = output
+            result = build_detection_result(names[0], names[1], disease_name, confidence_score, top_predictions, model_version)
+            results[index] = result
+            batch_results.append(result)
+            new_entries.append((lookups[index][0], result))
+        
+        # Save to detection history
+        try:
+            await run_blocking(save_detection_history_batch, batch_results)
+            logger.info(f"{len(batch_results)} detection results saved to history")
+        except Exception as e:
+            logger.error(f"Error saving detection history: {e}")
+            logger.error(traceback.format_exc())
+        
+        await run_blocking(cache_results, new_entries)
+        
+        logger.info("Batch disease detection completed successfully")
+        return results
+        
+    except InferenceQueueFull as qf:
+        logger.warning(f"Rejecting batch disease detection: {qf}")
+        raise HTTPException(status_code=503, detail="Disease detection is busy, please retry shortly")
+    except ValueError as ve:
+        logger.error(f"Validation error in batch disease detection: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error(f"Unexpected error in batch disease detection: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+def save_detection_history(result):
+    """Save detection result to history."""
+    save_detection_history_batch([result])
+
+def save_detection_history_batch(results):
+    """Append several detection results to the history store."""
+    try:
+        history_store.append(results)
         logger.info("Detection history saved successfully")
     except Exception as e:
         logger.error(f"Error saving detection history: {e}")
         logger.error(traceback.format_exc())
 
-async def get_detection_history():
-    """Get detection history."""
+async def get_detection_history(limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """Get one page of detection history, newest first."""
     try:
-        if os.path.exists(DETECTION_HISTORY_PATH):
-            with open(DETECTION_HISTORY_PATH, "r") as f:
-                history = json.load(f)
-            return history
-        else:
-            return []
+        return await run_blocking(history_store.page, limit, cursor)
+    except ValueError:
+        raise
     except Exception as e:
         logger.error(f"Error getting detection history: {e}")
         logger.error(traceback.format_exc())
-        return []
+        return {"items": [], "next_cursor": None}
 
 # Disease information
 DISEASE_INFO = {
@@ -420,4 +361,12 @@ DISEASE_INFO = {
         "prevention": "Rake and destroy fallen leaves where the fungus overwinters. Improve air circulation through proper pruning. Plant resistant varieties when establishing new orchards.",
         "recommendations": "Begin fungicide applications at bud break and continue through the growing season during wet periods. Avoid overhead irrigation. Thin fruit clusters to reduce humidity and allow better spray coverage."
     }
-} 
\ No newline at end of file
+} 
+
+# Catalog diseases fill in names that have no curated entry above
+for disease_name, info in CATALOG_DISEASE_INFO.items():
+    DISEASE_INFO.setdefault(disease_name, info)
+
+# Name index over DISEASE_INFO, with the model's class names resolved ahead of time
+disease_index = DiseaseIndex(DISEASE_INFO)
+disease_index.warm(disease_models.model.classes)
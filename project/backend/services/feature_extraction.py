@@ -0,0 +1,146 @@
+import numpy as np
+
+# Bump when the features computed for an image change, so cached features are recomputed
+FEATURE_EXTRACTOR_VERSION = "1"
+# Number of features produced for each image (only the first 39 are populated)
+NUM_FEATURES = 50
+# Size the image is resized to before features are computed
+FEATURE_IMAGE_SIZE = (50, 50)
+# Size of the downsampled grid used for the first 25 features
+GRID_SIZE = (5, 5)
+
+# PIL fixed-point precision used by its 8-bit resampling code
+_PRECISION_BITS = 32 - 8 - 2
+
+def _bicubic_filter(x):
+    """PIL's bicubic kernel (a = -0.5)"""
+    a = -0.5
+    x = abs(x)
+    if x < 1.0:
+        return ((a + 2.0) * x - (a + 3.0)) * x * x + 1
+    if x < 2.0:
+        return (((x - 5) * x + 8) * x - 4) * a
+    return 0.0
+
+def _resample_matrix(in_size, out_size):
+    """
+    Build the integer bicubic weights PIL uses to resize one axis from in_size to out_size.
+    Returns an (in_size, out_size) matrix of fixed-point coefficients stored as float64,
+    which keeps the integer sums exact while letting NumPy use BLAS.
+    """
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = 2.0 * filterscale
+    weights = np.zeros((out_size, in_size), dtype=np.int64)
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size)
+        k = [_bicubic_filter((x + xmin - center + 0.5) / filterscale) for x in range(xmax - xmin)]
+        total = sum(k)
+        for x, w in enumerate(k):
+            if total != 0.0:
+                w /= total
+            if w < 0:
+                weights[xx, xmin + x] = int(-0.5 + w * (1 << _PRECISION_BITS))
+            else:
+                weights[xx, xmin + x] = int(0.5 + w * (1 << _PRECISION_BITS))
+    return weights.T.astype(np.float64)
+
+def _clip8(values):
+    """Round fixed-point sums back to uint8 the way PIL does"""
+    values = np.floor((values + (1 << (_PRECISION_BITS - 1))) / (1 << _PRECISION_BITS))
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+_GRID_ROWS = _resample_matrix(FEATURE_IMAGE_SIZE[1], GRID_SIZE[1])
+_GRID_COLS = _resample_matrix(FEATURE_IMAGE_SIZE[0], GRID_SIZE[0])
+
+# PIL's fixed-point RGB -> L weights
+_GRAY_WEIGHTS = np.array([19595.0, 38470.0, 7471.0])
+
+def _to_gray(rgb):
+    """PIL's RGB -> L conversion on a (..., 3) uint8 array (float64 arithmetic is exact at this range)"""
+    gray = (rgb.reshape(-1, 3) @ _GRAY_WEIGHTS + 0x8000) / 65536
+    return np.floor(gray).astype(np.uint8).reshape(rgb.shape[:-1])
+
+# Modes whose 5x5 grid the vectorized path reproduces; PIL resizes others differently
+# (premultiplied alpha, nearest-neighbour for palettes), so their grid is taken from PIL
+_BATCH_GRID_MODES = ("RGB", "L")
+
+def image_to_feature_array(image):
+    """Resize a PIL image to the feature size and return it as a 50x50x3 uint8 array"""
+    return np.asarray(image.resize(FEATURE_IMAGE_SIZE).convert('RGB'), dtype=np.uint8)
+
+def extract_features_batch(images):
+    """
+    Extract features for a stack of N x 50 x 50 x 3 uint8 RGB arrays in one pass.
+    The result is an N x 50 float64 matrix identical to calling
+    extract_features_from_image on each image.
+    """
+    images = np.ascontiguousarray(images, dtype=np.uint8)
+    if images.ndim == 3:
+        images = images[np.newaxis]
+    n = images.shape[0]
+    features = np.zeros((n, NUM_FEATURES))
+    if n == 0:
+        return features
+
+    pixels = FEATURE_IMAGE_SIZE[0] * FEATURE_IMAGE_SIZE[1]
+    gray = _to_gray(images)
+    gray_flat = gray.reshape(n, pixels)
+
+    # First 25 features: 5x5 bicubic downsample (horizontal pass, then vertical), then grayscale
+    planes = images.transpose(0, 3, 1, 2).astype(np.float64)
+    horizontal = _clip8(planes @ _GRID_COLS)
+    small = _clip8(horizontal.transpose(0, 1, 3, 2).astype(np.float64) @ _GRID_ROWS)
+    features[:, :25] = _to_gray(small.transpose(0, 3, 2, 1)).reshape(n, 25) / 255.0
+
+    # Per-channel statistics over contiguous rows so the reductions match the per-image path
+    channels = np.ascontiguousarray(images.transpose(0, 3, 1, 2)).reshape(n, 3, pixels)
+    channel_means = channels.mean(axis=2)
+    deviations = channels - channel_means[:, :, np.newaxis]
+    channel_stds = np.sqrt(np.multiply(deviations, deviations).sum(axis=2) / pixels)
+
+    # RGB channel means and standard deviations
+    features[:, 25:28] = channel_means / 255.0
+    features[:, 28:31] = channel_stds / 255.0
+
+    # RGB ratios
+    total = channel_means[:, 0] + channel_means[:, 1] + channel_means[:, 2]
+    has_total = total > 0
+    features[has_total, 31:34] = channel_means[has_total] / total[has_total, np.newaxis]
+
+    # Image statistics
+    gray_norm = gray_flat / 255.0
+    brightness = gray_norm.sum(axis=1) / pixels
+    gray_dev = gray_norm - brightness[:, np.newaxis]
+    features[:, 34] = brightness
+    features[:, 35] = np.sqrt(np.multiply(gray_dev, gray_dev).sum(axis=1) / pixels)
+    features[:, 36] = gray_norm.max(axis=1) - gray_norm.min(axis=1)
+
+    # Edge detection (simple gradient magnitude, with uint8 wraparound like np.diff on the image)
+    dx = np.diff(gray, axis=2)
+    dy = np.diff(gray, axis=1)
+    features[:, 37] = dx.reshape(n, -1).mean(axis=1) / 255.0
+    features[:, 38] = dy.reshape(n, -1).mean(axis=1) / 255.0
+
+    # Remaining features stay zero
+    return features
+
+def extract_features_from_images(images):
+    """Extract features for a list of PIL images with a single vectorized pass"""
+    if not images:
+        return np.zeros((0, NUM_FEATURES))
+    resized = [image.resize(FEATURE_IMAGE_SIZE) for image in images]
+    features = extract_features_batch(np.stack([np.asarray(image.convert('RGB'), dtype=np.uint8) for image in resized]))
+    for row, image in zip(features, resized):
+        if image.mode not in _BATCH_GRID_MODES:
+            row[:25] = np.asarray(image.resize(GRID_SIZE).convert('L')).flatten() / 255.0
+    return features
+
+def extract_features_from_image(image):
+    """
+    Extract features from an image for ML model prediction
+    This is a simplified version that converts an image to a feature vector
+    """
+    return extract_features_from_images([image])[0]
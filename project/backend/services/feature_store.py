@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import numpy as np
+from .feature_extraction import FEATURE_EXTRACTOR_VERSION, NUM_FEATURES
+from .image_preprocessing import PREPROCESSING_VERSION
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Feature vectors of training images: one memory-mapped (capacity, 50) float64 matrix plus an
+# index of which content key each row holds
+STORE_FORMAT_VERSION = 1
+FEATURES_FILE = "features.npy"
+INDEX_FILE = "index.json"
+INITIAL_CAPACITY = 1024
+
+def extractor_version():
+    """Version of the decode + feature pipeline; stored features from another version are discarded"""
+    return f"{FEATURE_EXTRACTOR_VERSION}+{PREPROCESSING_VERSION}"
+
+class FeatureStore:
+    """
+    Incremental on-disk cache of image feature vectors keyed by image content.
+
+    Rows are appended in the order features are added and never move, so a store built
+    once grows with new images only. The matrix is over-allocated and doubled when full.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.features_path = os.path.join(store_dir, FEATURES_FILE)
+        self.index_path = os.path.join(store_dir, INDEX_FILE)
+        os.makedirs(store_dir, exist_ok=True)
+        self.keys = []
+        self._features = None
+        self._load()
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+
+    def _load(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.features_path)):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("format_version") != STORE_FORMAT_VERSION or index.get("extractor_version") != extractor_version():
+                logger.info(f"Feature store {self.store_dir} was built by another extractor version, starting over")
+                return
+            features = np.load(self.features_path, mmap_mode='r+')
+            if features.shape[0] < len(index["keys"]) or features.shape[1:] != (NUM_FEATURES,):
+                raise ValueError(f"{FEATURES_FILE} has shape {features.shape} for {len(index['keys'])} rows")
+            self.keys = index["keys"]
+            self._features = features
+        except Exception as e:
+            logger.warning(f"Could not read feature store {self.store_dir} ({e}), starting over")
+            self.keys = []
+            self._features = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def missing(self, keys):
+        """Keys not in the store yet, in order and without duplicates"""
+        seen = set()
+        missing = []
+        for key in keys:
+            if key not in self.rows and key not in seen:
+                seen.add(key)
+                missing.append(key)
+        return missing
+
+    def _reserve(self, count):
+        """Make room for count rows, doubling the matrix into a new file when it is full"""
+        capacity = 0 if self._features is None else self._features.shape[0]
+        if count <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < count:
+            new_capacity *= 2
+        tmp_path = f"{self.features_path}.{os.getpid()}.tmp"
+        features = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(new_capacity, NUM_FEATURES))
+        if len(self.keys):
+            features[:len(self.keys)] = self._features[:len(self.keys)]
+        features.flush()
+        del features
+        self._features = None
+        os.replace(tmp_path, self.features_path)
+        self._features = np.load(self.features_path, mmap_mode='r+')
+
+    def add(self, keys, features):
+        """Append feature rows for new keys and persist them; keys already stored are skipped"""
+        new = [(key, row) for key, row in zip(keys, features) if key not in self.rows]
+        if not new:
+            return
+        start = len(self.keys)
+        self._reserve(start + len(new))
+        self._features[start:start + len(new)] = np.array([row for _, row in new])
+        self._features.flush()
+        for offset, (key, _) in enumerate(new):
+            self.rows[key] = start + offset
+            self.keys.append(key)
+        self._write_index()
+
+    def _write_index(self):
+        index = {
+            "format_version": STORE_FORMAT_VERSION,
+            "extractor_version": extractor_version(),
+            "keys": self.keys
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def matrix(self, keys):
+        """
+        Feature matrix for keys, which must all be stored. When the keys occupy consecutive
+        rows (e.g. a dataset stored in one pass) this is a view of the memmap, not a copy.
+        """
+        rows = np.array([self.rows[key] for key in keys], dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros((0, NUM_FEATURES))
+        if rows[-1] - rows[0] == len(rows) - 1 and np.all(np.diff(rows) == 1):
+            return self._features[rows[0]:rows[-1] + 1]
+        return self._features[rows]
@@ -0,0 +1,40 @@
+import logging
+import os
+from services.model_artifacts import ForestArtifactModel, check_parity, PARITY_TOLERANCE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Inference engine per model: "compiled" evaluates flat node arrays for all trees at once
+# (ForestArtifactModel), "sklearn" calls the fitted pipeline loaded from the pickle
+DISEASE_MODEL_ENGINE = os.getenv("DISEASE_MODEL_ENGINE", "compiled").lower()
+CROP_MODEL_ENGINE = os.getenv("CROP_MODEL_ENGINE", "compiled").lower()
+ENGINES = ("compiled", "sklearn")
+
+def select_engine(model, engine, name="model"):
+    """
+    Return the model that should serve predictions for the requested engine.
+
+    Artifact models are already flat-array forests, checked against their sklearn pipeline
+    when they were exported. A pipeline is compiled into the same arrays when engine is
+    "compiled" and they reproduce its probabilities; otherwise the pipeline is returned.
+    """
+    if engine not in ENGINES:
+        logger.warning(f"Unknown {name} engine '{engine}', using sklearn")
+        return model
+    if engine == "sklearn" or isinstance(model, ForestArtifactModel):
+        return model
+    try:
+        compiled = ForestArtifactModel.from_pipeline(model, version=getattr(model, "version", None))
+        difference = check_parity(model, compiled)
+        if difference > PARITY_TOLERANCE:
+            logger.warning(
+                f"Compiled {name} differs from its sklearn pipeline by {difference:.3g}, serving with sklearn instead"
+            )
+            return model
+        logger.info(f"Serving {name} with the compiled forest engine ({len(compiled.arrays['tree_roots'])} trees, depth {compiled.depth})")
+        return compiled
+    except Exception as e:
+        logger.warning(f"Could not compile {name} ({e}), serving with sklearn")
+        return model
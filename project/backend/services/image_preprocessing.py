@@ -0,0 +1,30 @@
+import io
+from PIL import Image
+
+# Bump when decoding changes in a way that can change predictions
+PREPROCESSING_VERSION = "reduced-decode-1"
+
+def load_image(source, min_size):
+    """
+    Decode an image as RGB at the smallest scale that is still at least min_size.
+    Args:
+        source: Raw image bytes, a file path or a file object
+        min_size: (width, height) the decoded image must not be smaller than
+    Returns:
+        PIL.Image: RGB image, usually far smaller than the original camera photo
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+
+    if image.format == 'JPEG':
+        # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while it decodes
+        image.draft('RGB', min_size)
+        return image.convert('RGB')
+
+    # Other formats decode fully, then shrink by an integer factor before any further work
+    image = image.convert('RGB')
+    factor = min(image.width // min_size[0], image.height // min_size[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+import traceback
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Image storage configuration
+DETECTIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/detections'))
+# Maximum number of uploads waiting to be written before saves fall back to writing in the calling thread
+IMAGE_WRITE_QUEUE_SIZE = int(os.getenv("IMAGE_WRITE_QUEUE_SIZE", "256"))
+
+def shard_relpath(image_id, extension="jpg"):
+    """Relative path of an image in the sharded layout, e.g. ab/cd/<id>.jpg"""
+    digest = hashlib.sha1(image_id.encode('utf-8')).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{image_id}.{extension}"
+
+class ImageStore:
+    """Detection images written by a background thread into a hash-prefix sharded tree."""
+
+    def __init__(self, root=DETECTIONS_DIR, queue_size=IMAGE_WRITE_QUEUE_SIZE, legacy_dirs=None):
+        self.root = root
+        self.legacy_dirs = []
+        for directory in legacy_dirs or []:
+            self.add_legacy_dir(directory)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._writer = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def add_legacy_dir(self, directory):
+        """Also look for flat <id>.jpg files in directory when serving images"""
+        directory = os.path.abspath(directory)
+        if directory != os.path.abspath(self.root) and directory not in self.legacy_dirs:
+            self.legacy_dirs.append(directory)
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._drain, name="image-writer", daemon=True)
+                self._writer.start()
+
+    def _write(self, relpath, image_data):
+        path = os.path.join(self.root, relpath)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image_data)
+            os.replace(tmp_path, path)
+            logger.info(f"Image saved to: {path}")
+        except Exception as e:
+            logger.error(f"Error saving image to disk: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            with self._lock:
+                self._pending.pop(relpath, None)
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def save(self, image_id, image_data):
+        """
+        Queue an upload for writing and return its relative path. When the queue is full the
+        image is written by the caller, so async code should call this through run_blocking.
+        """
+        relpath = shard_relpath(image_id)
+        with self._lock:
+            self._pending[relpath] = image_data
+        self._start_writer()
+        try:
+            self._queue.put_nowait((relpath, image_data))
+        except queue.Full:
+            logger.warning("Image write queue is full, writing inline")
+            self._write(relpath, image_data)
+        return relpath
+
+    def pending(self, relpath):
+        """Bytes of an image that is queued but not yet on disk, or None"""
+        with self._lock:
+            return self._pending.get(relpath)
+
+    def locate(self, relpath):
+        """Find an image on disk by relative path, accepting both flat and sharded URLs"""
+        filename = os.path.basename(relpath)
+        image_id, _, extension = filename.rpartition(".")
+        candidates = [os.path.join(self.root, shard_relpath(image_id, extension or "jpg"))]
+        candidates += [os.path.join(directory, filename) for directory in [self.root] + self.legacy_dirs]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def flush(self):
+        """Block until every queued image has been written"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def shutdown(self):
+        """Write out queued images and stop the writer thread"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+class DetectionStaticFiles(StaticFiles):
+    """Static files for /detections that also serve queued uploads and both directory layouts."""
+
+    def __init__(self, image_store, **kwargs):
+        super().__init__(directory=image_store.root, **kwargs)
+        self.image_store = image_store
+
+    async def get_response(self, path, scope):
+        response = None
+        try:
+            response = await super().get_response(path, scope)
+            if response.status_code != 404:
+                return response
+        except HTTPException as exc:
+            if exc.status_code != 404:
+                raise
+        relpath = path.replace(os.sep, "/").lstrip("/")
+        image_data = self.image_store.pending(relpath)
+        if image_data is not None:
+            return Response(image_data, media_type="image/jpeg")
+        located = self.image_store.locate(relpath)
+        if located is not None:
+            return FileResponse(located)
+        if response is not None:
+            return response
+        raise HTTPException(status_code=404)
@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Execution mode for CPU-bound inference: "process", "thread" or "inline" (run on the event loop)
+INFERENCE_EXECUTOR = os.getenv("DISEASE_INFERENCE_EXECUTOR", "thread").lower()
+INFERENCE_WORKERS = int(os.getenv("DISEASE_INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+# Maximum number of jobs waiting or running in the pool before new ones are rejected
+INFERENCE_QUEUE_SIZE = int(os.getenv("DISEASE_INFERENCE_QUEUE_SIZE", "64"))
+# Start method for process workers; "spawn" avoids forking a process that already runs threads
+INFERENCE_START_METHOD = os.getenv("DISEASE_INFERENCE_START_METHOD", "spawn")
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference pool already holds the maximum number of jobs."""
+
+def _ping():
+    """No-op job used to start pool workers ahead of the first request."""
+    return os.getpid()
+
+async def run_blocking(fn, *args):
+    """Run a blocking function (file or history I/O) on the default thread executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args))
+
+class InferencePool:
+    """Bounded executor that keeps CPU-bound inference off the asyncio event loop."""
+
+    def __init__(self, mode=INFERENCE_EXECUTOR, max_workers=INFERENCE_WORKERS,
+                 queue_size=INFERENCE_QUEUE_SIZE, initializer=None):
+        if mode not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown inference executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.queue_size = max(1, queue_size)
+        self.initializer = initializer
+        self._executor = None
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _create_executor(self):
+        if self.mode == "process":
+            executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(INFERENCE_START_METHOD),
+                initializer=self.initializer
+            )
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference",
+                initializer=self.initializer
+            )
+        logger.info(f"Started {self.mode} inference pool with {self.max_workers} workers")
+        return executor
+
+    def _get_executor(self):
+        """Create the underlying executor on first use."""
+        if self._executor is None:
+            self._executor = self._create_executor()
+        return self._executor
+
+    def _warm_up(self, executor):
+        futures = [executor.submit(_ping) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def start(self):
+        """Start all workers so the model is preloaded before traffic arrives."""
+        if self.mode == "inline":
+            return
+        self._warm_up(self._get_executor())
+
+    def recycle(self):
+        """
+        Replace process workers with fresh ones that load the current model files.
+        The new workers are warmed up before they take traffic; jobs already submitted
+        to the old workers finish there. Thread and inline pools share the process's
+        model and need no recycling.
+        """
+        if self.mode != "process" or self._executor is None:
+            return
+        executor = self._create_executor()
+        self._warm_up(executor)
+        previous, self._executor = self._executor, executor
+        previous.shutdown(wait=False)
+        logger.info("Recycled inference workers")
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool, rejecting the job if the queue is full."""
+        if self._pending >= self.queue_size:
+            raise InferenceQueueFull(f"Inference queue is full ({self.queue_size} jobs pending)")
+        self._pending += 1
+        try:
+            if self.mode == "inline":
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), functools.partial(fn, *args))
+        finally:
+            self._pending -= 1
+
+    def shutdown(self, wait=True):
+        """Stop the pool, letting in-flight jobs finish when wait is True."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            logger.info("Inference pool shut down")
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Knowledge base sources and the compiled snapshot built from them
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+SOURCE_FILES = {
+    "crops": "crops.csv",
+    "diseases": "disease_info.csv",
+    "supplements": "supplement_info.csv"
+}
+SNAPSHOT_PATH = os.getenv("KNOWLEDGE_BASE_PATH", os.path.join(DATA_DIR, 'knowledge_base.json'))
+SNAPSHOT_FORMAT_VERSION = 1
+
+REQUIRED_COLUMNS = {
+    "crops": ["name", "temperature_min", "temperature_max", "humidity_min", "humidity_max",
+              "water_requirement", "growing_season", "region", "soil_type", "days_to_harvest", "description"],
+    "diseases": ["disease_name", "description", "symptoms", "causes", "prevention", "treatment"],
+    "supplements": ["disease_name", "supplement_name", "description", "application_method", "precautions"]
+}
+NUMERIC_CROP_COLUMNS = ["temperature_min", "temperature_max", "humidity_min", "humidity_max"]
+
+class KnowledgeBaseError(Exception):
+    """Raised when the knowledge base sources are missing or invalid."""
+
+def source_hashes(data_dir=DATA_DIR):
+    """Content hash of each source CSV, used to tell whether a snapshot is stale"""
+    hashes = {}
+    for filename in SOURCE_FILES.values():
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            raise KnowledgeBaseError(f"Knowledge base source not found at: {path}")
+        with open(path, 'rb') as f:
+            hashes[filename] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+def _read_records(data_dir, kind):
+    """Parse one source CSV into JSON-ready records, with the same options the services used"""
+    import pandas as pd
+
+    path = os.path.join(data_dir, SOURCE_FILES[kind])
+    df = pd.read_csv(
+        path,
+        skipinitialspace=True,
+        skip_blank_lines=True,
+        encoding='utf-8',
+        on_bad_lines='skip'
+    )
+    missing = [column for column in REQUIRED_COLUMNS[kind] if column not in df.columns]
+    if missing:
+        raise KnowledgeBaseError(f"{path} is missing columns: {', '.join(missing)}")
+    df = df.dropna(how='all')
+    if kind == "crops":
+        numeric = df[NUMERIC_CROP_COLUMNS].apply(pd.to_numeric, errors='coerce')
+        invalid = numeric.isna().any(axis=1)
+        for name in df.loc[invalid, 'name']:
+            logger.warning(f"Skipping crop with invalid temperature or humidity range: {name}")
+        df = df[~invalid]
+    df = df.fillna('')
+    # to_json converts NumPy scalars to plain JSON numbers
+    return json.loads(df.to_json(orient='records'))
+
+def _unique_by(records, key, kind):
+    unique = {}
+    for record in records:
+        name = record[key]
+        if name in unique:
+            logger.warning(f"Duplicate {kind} entry ignored: {name}")
+            continue
+        unique[name] = record
+    return list(unique.values())
+
+def build_knowledge_base(data_dir=DATA_DIR):
+    """Parse and validate the source CSVs and resolve supplements onto their diseases"""
+    crops = _unique_by(_read_records(data_dir, "crops"), "name", "crop")
+    diseases = _unique_by(_read_records(data_dir, "diseases"), "disease_name", "disease")
+    supplements = _read_records(data_dir, "supplements")
+
+    by_disease = {disease["disease_name"]: disease for disease in diseases}
+    for disease in diseases:
+        disease["supplements"] = []
+    for supplement in supplements:
+        disease = by_disease.get(supplement["disease_name"])
+        if disease is None:
+            logger.warning(
+                f"Supplement {supplement['supplement_name']} refers to unknown disease: {supplement['disease_name']}"
+            )
+            continue
+        disease["supplements"].append(supplement)
+
+    return {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sources": source_hashes(data_dir),
+        "crops": crops,
+        "diseases": diseases
+    }
+
+def write_snapshot(knowledge_base, path=SNAPSHOT_PATH):
+    """Write the compiled knowledge base atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(knowledge_base, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    logger.info(f"Knowledge base snapshot written to {path}")
+
+def _read_snapshot(path, data_dir):
+    """Return the snapshot at path if it is current for the source CSVs, otherwise None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            knowledge_base = json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not read knowledge base snapshot {path}: {e}")
+        return None
+    if knowledge_base.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    if knowledge_base.get("sources") != source_hashes(data_dir):
+        logger.info("Knowledge base sources changed since the snapshot was built")
+        return None
+    return knowledge_base
+
+def load_knowledge_base(path=SNAPSHOT_PATH, data_dir=DATA_DIR):
+    """Load the compiled snapshot, rebuilding it from the CSVs when it is missing or stale"""
+    knowledge_base = _read_snapshot(path, data_dir)
+    if knowledge_base is not None:
+        return knowledge_base
+    knowledge_base = build_knowledge_base(data_dir)
+    try:
+        write_snapshot(knowledge_base, path)
+    except Exception as e:
+        # A read-only deployment still works from the freshly built copy
+        logger.warning(f"Could not write knowledge base snapshot to {path}: {e}")
+    return knowledge_base
+
+_knowledge_base = None
+_lock = threading.Lock()
+
+def get_knowledge_base():
+    """The knowledge base for this process, loaded on first use and shared by every service"""
+    global _knowledge_base
+    if _knowledge_base is None:
+        with _lock:
+            if _knowledge_base is None:
+                _knowledge_base = load_knowledge_base()
+                logger.info(
+                    f"Knowledge base loaded with {len(_knowledge_base['crops'])} crops "
+                    f"and {len(_knowledge_base['diseases'])} diseases"
+                )
+    return _knowledge_base
+
+def disease_info_entries(knowledge_base=None):
+    """Disease information keyed by disease name, in the shape used by detection results"""
+    knowledge_base = knowledge_base or get_knowledge_base()
+    return {
+        disease["disease_name"]: {
+            "description": disease["description"],
+            "symptoms": disease["symptoms"],
+            "causes": disease["causes"],
+            "prevention": disease["prevention"],
+            "treatment": disease["treatment"],
+            "supplements": [
+                {
+                    "name": supplement["supplement_name"],
+                    "description": supplement["description"],
+                    "application": supplement["application_method"],
+                    "precautions": supplement["precautions"]
+                }
+                for supplement in disease["supplements"]
+            ]
+        }
+        for disease in knowledge_base["diseases"]
+    }
+
+if __name__ == "__main__":
+    # Usage: python -m services.knowledge_base  (rebuilds data/knowledge_base.json)
+    try:
+        write_snapshot(build_knowledge_base())
+    except Exception as e:
+        logger.error(f"Error building knowledge base: {e}")
+        logger.error(traceback.format_exc())
+        sys.exit(1)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+from services.inference_pool import run_blocking
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Requests arriving within this many milliseconds of the first one share one model call;
+# 0 still groups requests that arrive in the same event loop iteration
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))
+# A batch is run as soon as it holds this many requests; 1 turns batching off
+INFERENCE_BATCH_MAX_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", "16"))
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item requests into one call of a batch function.
+
+    batch_fn(items) must return one output per item, in order. An output that is an
+    exception instance is raised in the request that submitted that item; an exception
+    raised by batch_fn itself is raised in every request of the batch. runner(fn, items)
+    is awaited to run the batch, e.g. InferencePool.run to keep it off the event loop.
+    """
+
+    def __init__(self, batch_fn, runner=run_blocking, max_batch_size=INFERENCE_BATCH_MAX_SIZE,
+                 window_ms=INFERENCE_BATCH_WINDOW_MS, name="inference"):
+        self.batch_fn = batch_fn
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.name = name
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    @property
+    def enabled(self):
+        return self.max_batch_size > 1
+
+    async def submit(self, item):
+        """Queue one item for the next batch and wait for its output"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference until the batch finishes so the task is not garbage collected
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            logger.info(f"Running {self.name} batch of {len(items)}")
+            outputs = await self.runner(self.batch_fn, items)
+            if len(outputs) != len(items):
+                raise RuntimeError(f"{self.name} batch returned {len(outputs)} outputs for {len(items)} items")
+        except Exception as e:
+            # Callers handle the error; it is only logged here once for the whole batch
+            logger.warning(f"{self.name} batch of {len(items)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            # Requests that were cancelled while waiting are skipped
+            if future.done():
+                continue
+            if isinstance(output, BaseException):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
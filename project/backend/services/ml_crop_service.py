@@ -1,5 +1,4 @@
 from typing import List, Dict
-import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
@@ -10,6 +9,11 @@ from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 import logging
 from models.weather import WeatherData
+from services.model_artifacts import artifact_path, prefer_artifact, export_or_discard, load_pipeline_artifact, model_file_version
+from services.model_manager import ModelManager
+from services.knowledge_base import get_knowledge_base, source_hashes, SOURCE_FILES
+from services.training_cache import training_fingerprint, is_up_to_date, record_training
+from services.forest_engine import select_engine, CROP_MODEL_ENGINE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,32 +24,60 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(BASE_DIR), 'data'))
 MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(BASE_DIR), '..', 'models'))
 CROP_MODEL_PATH = os.path.join(MODEL_DIR, 'crop_recommendation_model.pkl')
-CROPS_FILE = os.path.join(DATA_DIR, 'crops.csv')
+
+# Training inputs; a change to any of them (or to this module) retrains at the next startup
+SAMPLES_PER_CROP = 20
+CROP_FOREST_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 10,
+    'random_state': 42
+}
 
 # Create directories if they don't exist
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Load crop data
+# Season encoding: Kharif=0, Rabi=1, Zaid=2, Year-round=3
+SEASON_ENCODING = {
+    'Kharif': 0,
+    'Rabi': 1,
+    'Zaid': 2,
+    'Year-round': 3
+}
+
+# Region encoding: South=0, Central=1, North=2, All=3
+REGION_ENCODING = {
+    'South': 0,
+    'Central': 1,
+    'North': 2,
+    'All': 3
+}
+
+# Number of crops recommended per request
+TOP_K = 5
+
+def build_crop_details(crops):
+    """Response fields of each crop keyed by name, built once instead of per request"""
+    details = {}
+    for crop_info in crops:
+        details[crop_info['name']] = {
+            "description": str(crop_info['description']),
+            "optimalTemperature": {
+                "min": float(crop_info['temperature_min']),
+                "max": float(crop_info['temperature_max'])
+            },
+            "waterRequirements": str(crop_info['water_requirement']),
+            "growingSeason": str(crop_info['growing_season']),
+            "region": str(crop_info['region']),
+            "soilType": str(crop_info['soil_type']),
+            "daysToHarvest": str(crop_info['days_to_harvest'])
+        }
+    return details
+
+# Crop data from the compiled knowledge base
 try:
-    if not os.path.exists(CROPS_FILE):
-        raise FileNotFoundError(f"Crops data file not found at: {CROPS_FILE}")
-    
-    # Read CSV with more flexible parsing
-    crops_df = pd.read_csv(
-        CROPS_FILE,
-        skipinitialspace=True,
-        skip_blank_lines=True,
-        encoding='utf-8',
-        on_bad_lines='skip'
-    )
-    
-    # Clean up the data
-    crops_df = crops_df.dropna(how='all')
-    crops_df = crops_df.fillna('')
-    
-    logger.info(f"Successfully loaded crop data from: {CROPS_FILE}")
-    logger.info(f"Number of crops loaded: {len(crops_df)}")
-    
+    crops = get_knowledge_base()["crops"]
+    crop_details = build_crop_details(crops)
+    logger.info(f"Number of crops loaded: {len(crops)}")
 except Exception as e:
     logger.error(f"Error loading crop data: {str(e)}")
     raise Exception(f"Failed to load crop data: {str(e)}")
@@ -74,33 +106,48 @@ def get_region_from_coordinates(lat: float, lon: float) -> str:
     else:
         return "All"
 
-def train_crop_model():
-    """Train a machine learning model for crop recommendations"""
+def encode_regions(lat, lon):
+    """Region codes for arrays of coordinates, with the same boxes as get_region_from_coordinates"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return np.select(
+        [
+            (lat >= 11.5) & (lat <= 18.5) & (lon >= 74) & (lon <= 78.5),
+            (lat >= 15.5) & (lat <= 22.5) & (lon >= 72.5) & (lon <= 80.5),
+            (lat >= 29.5) & (lat <= 32.5) & (lon >= 73.5) & (lon <= 76.5)
+        ],
+        [REGION_ENCODING['South'], REGION_ENCODING['Central'], REGION_ENCODING['North']],
+        default=REGION_ENCODING['All']
+    )
+
+def crop_training_fingerprint():
+    """Fingerprint of the crop catalog, settings and code the crop model is trained from"""
+    crops_file = SOURCE_FILES["crops"]
+    hyperparameters = {
+        'samples_per_crop': SAMPLES_PER_CROP,
+        'forest': CROP_FOREST_PARAMS
+    }
+    return training_fingerprint({crops_file: source_hashes()[crops_file]}, hyperparameters, [os.path.abspath(__file__)])
+
+def train_crop_model(force=False):
+    """
+    Train a machine learning model for crop recommendations.
+    The saved model is reused when it was trained from the same inputs, unless force is set.
+    """
     try:
+        fingerprint, inputs = crop_training_fingerprint()
+        if not force and is_up_to_date(CROP_MODEL_PATH, fingerprint):
+            logger.info(f"Crop model at {CROP_MODEL_PATH} is up to date, skipping training")
+            return True
+        
         logger.info("Starting crop recommendation model training...")
         
         # Create synthetic training data based on crop information
         X = []  # Features: [temperature, humidity, season_encoded, region_encoded]
         y = []  # Target: crop name
         
-        # Season encoding: Kharif=0, Rabi=1, Zaid=2, Year-round=3
-        season_encoding = {
-            'Kharif': 0,
-            'Rabi': 1, 
-            'Zaid': 2,
-            'Year-round': 3
-        }
-        
-        # Region encoding: South=0, Central=1, North=2, All=3
-        region_encoding = {
-            'South': 0,
-            'Central': 1,
-            'North': 2,
-            'All': 3
-        }
-        
         # Generate training samples for each crop
-        for _, crop in crops_df.iterrows():
+        for crop in crops:
             crop_name = crop['name']
             temp_min = float(crop['temperature_min'])
             temp_max = float(crop['temperature_max'])
@@ -109,16 +156,16 @@ def train_crop_model():
             season = crop['growing_season']
             region = crop['region']
             
-            # Generate 20 samples per crop with variations
-            for _ in range(20):
+            # Generate samples per crop with variations
+            for _ in range(SAMPLES_PER_CROP):
                 # Random temperature within crop's range
                 temp = np.random.uniform(temp_min, temp_max)
                 # Random humidity within crop's range
                 humidity = np.random.uniform(humidity_min, humidity_max)
                 # Season encoding
-                season_code = season_encoding.get(season, 3)  # Default to Year-round
+                season_code = SEASON_ENCODING.get(season, 3)  # Default to Year-round
                 # Region encoding
-                region_code = region_encoding.get(region, 3)  # Default to All
+                region_code = REGION_ENCODING.get(region, 3)  # Default to All
                 
                 # Create feature vector
                 features = [temp, humidity, season_code, region_code]
@@ -137,11 +184,7 @@ def train_crop_model():
         # Create and train the model pipeline
         pipeline = Pipeline([
             ('scaler', StandardScaler()),
-            ('classifier', RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
-            ))
+            ('classifier', RandomForestClassifier(**CROP_FOREST_PARAMS))
         ])
         
         # Train the model
@@ -155,6 +198,10 @@ def train_crop_model():
         with open(CROP_MODEL_PATH, 'wb') as f:
             pickle.dump(pipeline, f)
         
+        # Export the memory-mappable artifact used for serving
+        export_or_discard(pipeline, artifact_path(CROP_MODEL_PATH))
+        record_training(CROP_MODEL_PATH, fingerprint, inputs, "train_crop_model")
+        
         logger.info(f"Model saved to {CROP_MODEL_PATH}")
         return True
     
@@ -167,6 +214,17 @@ def train_crop_model():
 def load_crop_model():
     """Load the trained crop recommendation model"""
     try:
+        # Prefer the memory-mapped artifact, which loads without unpickling;
+        # the sklearn engine serves the pickled pipeline instead
+        artifact_dir = prefer_artifact(CROP_MODEL_PATH) if CROP_MODEL_ENGINE == "compiled" else None
+        if artifact_dir:
+            try:
+                model = load_pipeline_artifact(artifact_dir)
+                logger.info(f"Crop recommendation model artifact {model.version} loaded successfully")
+                return model
+            except Exception as e:
+                logger.warning(f"Could not load crop model artifact from {artifact_dir}: {e}")
+        
         if os.path.exists(CROP_MODEL_PATH):
             with open(CROP_MODEL_PATH, 'rb') as f:
                 model = pickle.load(f)
@@ -182,12 +240,65 @@ def load_crop_model():
         logger.error(f"Error loading crop model: {e}")
         return None
 
-# Load or train the model
-crop_model = load_crop_model()
+def load_crop_model_version():
+    """Load the crop model for serving and return (model, version), raising if it is unavailable"""
+    model = load_crop_model()
+    if model is None:
+        raise Exception("Crop recommendation model not available")
+    version = getattr(model, "version", None) or model_file_version(CROP_MODEL_PATH)
+    # Serve from the compiled forest arrays when they reproduce the model's outputs
+    return select_engine(model, CROP_MODEL_ENGINE, "crop model"), version
+
+# Load or train the model; the manager swaps in new versions when the model files change
+try:
+    initial_crop_model = load_crop_model_version()
+except Exception as e:
+    logger.error(f"Error loading crop model: {e}")
+    initial_crop_model = (None, None)
+crop_models = ModelManager(
+    "crop model",
+    load_crop_model_version,
+    watch_paths=[CROP_MODEL_PATH, artifact_path(CROP_MODEL_PATH)],
+    initial=initial_crop_model
+)
+
+def top_k_indices(probabilities, k=TOP_K):
+    """
+    Indices of the k highest probabilities, highest first, in O(n) plus O(k log k).
+    Ties are ordered by index, the same as a stable descending sort of all crops.
+    """
+    probabilities = np.asarray(probabilities)
+    if k >= len(probabilities):
+        candidates = np.arange(len(probabilities))
+    else:
+        # Every probability tied with the k-th highest is a candidate, so ties resolve by index
+        kth = probabilities[np.argpartition(-probabilities, k - 1)[k - 1]]
+        candidates = np.flatnonzero(probabilities >= kth)
+    order = np.lexsort((candidates, -probabilities[candidates]))
+    return candidates[order[:k]]
+
+def build_recommendations(probabilities, crop_names, model_version, k=TOP_K):
+    """Recommendation dicts for the k most probable crops"""
+    recommendations = []
+    for index in top_k_indices(probabilities, k):
+        crop_name = crop_names[index]
+        details = crop_details.get(crop_name)
+        if details is None:
+            logger.warning(f"Crop model predicted a crop missing from the catalog: {crop_name}")
+            continue
+        recommendations.append({
+            "name": crop_name,
+            "score": round(probabilities[index] * 100, 2),
+            **details,
+            "modelVersion": model_version
+        })
+    return recommendations
 
 def get_ml_crop_recommendations(weather_data: WeatherData, lat: float, lon: float) -> List[Dict]:
     """Get crop recommendations using the ML model"""
     try:
+        # Use one model version for the whole request, even if a reload swaps it meanwhile
+        crop_model, model_version = crop_models.snapshot()
         if crop_model is None:
             logger.error("Crop model not available")
             raise Exception("Crop recommendation model not available")
@@ -196,64 +307,21 @@ def get_ml_crop_recommendations(weather_data: WeatherData, lat: float, lon: floa
         current_season = get_current_season()
         region = get_region_from_coordinates(lat, lon)
         
-        # Season encoding: Kharif=0, Rabi=1, Zaid=2, Year-round=3
-        season_encoding = {
-            'Kharif': 0,
-            'Rabi': 1, 
-            'Zaid': 2,
-            'Year-round': 3
-        }
-        
-        # Region encoding: South=0, Central=1, North=2, All=3
-        region_encoding = {
-            'South': 0,
-            'Central': 1,
-            'North': 2,
-            'All': 3
-        }
-        
         # Create feature vector for prediction
         features = np.array([
             [
                 weather_data.temperature,
                 weather_data.humidity,
-                season_encoding.get(current_season, 3),
-                region_encoding.get(region, 3)
+                SEASON_ENCODING.get(current_season, 3),
+                REGION_ENCODING.get(region, 3)
             ]
         ])
         
         # Get prediction probabilities for all crops
         probabilities = crop_model.predict_proba(features)[0]
         
-        # Get crop names from the model classes
-        crop_names = crop_model.classes_
-        
-        # Create list of (crop_name, probability) tuples and sort by probability
-        crop_probs = [(crop, prob) for crop, prob in zip(crop_names, probabilities)]
-        crop_probs.sort(key=lambda x: x[1], reverse=True)
-        
-        # Get top 5 recommendations
-        top_recommendations = []
-        for crop_name, probability in crop_probs[:5]:
-            # Get crop details from the dataframe
-            crop_info = crops_df[crops_df['name'] == crop_name].iloc[0]
-            
-            recommendation = {
-                "name": crop_name,
-                "score": round(probability * 100, 2),
-                "description": str(crop_info['description']),
-                "optimalTemperature": {
-                    "min": float(crop_info['temperature_min']),
-                    "max": float(crop_info['temperature_max'])
-                },
-                "waterRequirements": str(crop_info['water_requirement']),
-                "growingSeason": str(crop_info['growing_season']),
-                "region": str(crop_info['region']),
-                "soilType": str(crop_info['soil_type']),
-                "daysToHarvest": str(crop_info['days_to_harvest'])
-            }
-            
-            top_recommendations.append(recommendation)
+        # Get top recommendations
+        top_recommendations = build_recommendations(probabilities, crop_model.classes_, model_version)
         
         return top_recommendations
         
@@ -261,4 +329,34 @@ def get_ml_crop_recommendations(weather_data: WeatherData, lat: float, lon: floa
         logger.error(f"Error getting ML crop recommendations: {e}")
         import traceback
         logger.error(traceback.format_exc())
-        raise Exception(f"Failed to get crop recommendations: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to get crop recommendations: {str(e)}")
+
+def predict_bulk_crop_probabilities(farms):
+    """
+    Crop probabilities for many farms with one predict_proba call.
+    farms is a list of FarmWeather; returns (probabilities, crop names, model version).
+    """
+    crop_model, model_version = crop_models.snapshot()
+    if crop_model is None:
+        raise Exception("Crop recommendation model not available")
+    if not farms:
+        return np.zeros((0, len(crop_model.classes_))), crop_model.classes_, model_version
+    
+    # The season depends only on today's date, the region on each farm's coordinates
+    season_code = SEASON_ENCODING.get(get_current_season(), 3)
+    features = np.empty((len(farms), 4))
+    features[:, 0] = [farm.weather.temperature for farm in farms]
+    features[:, 1] = [farm.weather.humidity for farm in farms]
+    features[:, 2] = season_code
+    features[:, 3] = encode_regions([farm.lat for farm in farms], [farm.lon for farm in farms])
+    
+    return crop_model.predict_proba(features), crop_model.classes_, model_version
+
+def iter_bulk_crop_recommendations(farms, probabilities, crop_names, model_version):
+    """One result dict per farm, in request order"""
+    for index, (farm, farm_probabilities) in enumerate(zip(farms, probabilities)):
+        yield {
+            "index": index,
+            "id": farm.id,
+            "recommendations": build_recommendations(farm_probabilities, crop_names, model_version)
+        }
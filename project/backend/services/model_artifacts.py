@@ -0,0 +1,374 @@
+import hashlib
+import importlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+import warnings
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT = "cbc-model-artifact"
+ARTIFACT_FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+# Artifacts are a JSON manifest plus one raw .npy file per array. Arrays are opened with
+# np.load(mmap_mode='r'), so worker processes share the same read-only file pages
+# instead of each unpickling a private copy of the model.
+
+KIND_SKLEARN_FOREST = "sklearn-forest"
+KIND_TORCH_STATE_DICT = "torch-state-dict"
+
+# Largest absolute probability difference accepted between exported forest arrays and the pipeline
+PARITY_TOLERANCE = 1e-9
+PARITY_SAMPLES = 256
+
+class ArtifactError(Exception):
+    """Raised when an artifact cannot be written or read."""
+
+def model_file_version(path):
+    """Short content hash of a model file, used to tell model versions apart"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+def artifact_path(model_path):
+    """Artifact directory that sits next to a model file, e.g. models/disease_model.artifact"""
+    return os.path.splitext(model_path)[0] + ".artifact"
+
+def prefer_artifact(model_path):
+    """
+    Return the artifact directory for model_path if it exists and is at least as new as
+    the model file itself, otherwise None (an older artifact may no longer match the model).
+    """
+    path = artifact_path(model_path)
+    manifest_file = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_file):
+        return None
+    if os.path.exists(model_path) and os.path.getmtime(model_path) > os.path.getmtime(manifest_file):
+        logger.warning(f"Artifact at {path} is older than {model_path}, ignoring it")
+        return None
+    return path
+
+def _to_json(value):
+    """Convert NumPy scalars and arrays in metadata to plain JSON types"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+def write_artifact(path, kind, arrays, metadata=None):
+    """
+    Write arrays and metadata as an artifact directory, replacing any previous one.
+    Returns the manifest, whose "version" is a hash of the array contents and metadata.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        digest = hashlib.sha256()
+        entries = {}
+        for name in sorted(arrays):
+            array = np.ascontiguousarray(arrays[name])
+            filename = f"{name}.npy"
+            np.save(os.path.join(tmp_path, filename), array, allow_pickle=False)
+            digest.update(name.encode('utf-8'))
+            digest.update(array.tobytes())
+            entries[name] = {"file": filename, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+        metadata = _to_json(metadata or {})
+        digest.update(json.dumps(metadata, sort_keys=True).encode('utf-8'))
+        manifest = {
+            "format": ARTIFACT_FORMAT,
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "kind": kind,
+            "version": digest.hexdigest()[:12],
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "arrays": entries,
+            "metadata": metadata
+        }
+        with open(os.path.join(tmp_path, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Swap directories; readers that already mapped the old arrays keep their pages
+        old_path = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logger.info(f"Wrote {kind} artifact {manifest['version']} to {path}")
+        return manifest
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+def read_manifest(path):
+    """Read and validate an artifact manifest"""
+    manifest_file = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_file):
+        raise ArtifactError(f"No artifact manifest at: {manifest_file}")
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ArtifactError(f"Not a model artifact: {path}")
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(
+            f"Unsupported artifact format version {manifest.get('format_version')} at {path}"
+        )
+    return manifest
+
+def load_arrays(path, manifest=None, mmap=True):
+    """Open the arrays of an artifact, memory-mapped read-only by default"""
+    manifest = manifest or read_manifest(path)
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        array = np.load(os.path.join(path, entry["file"]), mmap_mode='r' if mmap else None, allow_pickle=False)
+        if array.dtype.str != entry["dtype"] or list(array.shape) != entry["shape"]:
+            raise ArtifactError(f"Array {name} in {path} does not match its manifest entry")
+        arrays[name] = array
+    return arrays
+
+def resolve_callable(reference):
+    """Import a 'module:attribute' reference stored in a manifest"""
+    if not reference:
+        return None
+    module_name, _, attribute = reference.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+def callable_reference(fn):
+    """Build the 'module:attribute' reference for a module-level function"""
+    if fn is None:
+        return None
+    return f"{fn.__module__}:{fn.__qualname__}"
+
+# scikit-learn forests
+
+def _split_pipeline(pipeline):
+    """Return (scaler, forest) for a Pipeline of an optional StandardScaler and a tree ensemble"""
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    steps = [step for _, step in pipeline.steps] if isinstance(pipeline, Pipeline) else [pipeline]
+    scaler = None
+    if len(steps) == 2 and isinstance(steps[0], StandardScaler):
+        scaler = steps[0]
+    elif len(steps) != 1:
+        raise ArtifactError("Only a StandardScaler followed by a tree classifier can be exported")
+    forest = steps[-1]
+    if not hasattr(forest, "estimators_") and not hasattr(forest, "tree_"):
+        raise ArtifactError(f"{type(forest).__name__} is not a fitted tree classifier")
+    return scaler, forest
+
+def forest_to_arrays(pipeline):
+    """
+    Flatten a fitted (scaler +) tree classifier into concatenated node arrays, laid out so
+    ForestArtifactModel can evaluate them as loaded: leaves use feature 0, compare against
+    +inf and list themselves as both children (children holds left/right pairs per node).
+    """
+    scaler, forest = _split_pipeline(pipeline)
+    trees = [est.tree_ for est in forest.estimators_] if hasattr(forest, "estimators_") else [forest.tree_]
+    n_features = forest.n_features_in_
+
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        roots.append(offset)
+        nodes = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+        pairs = np.empty((tree.node_count, 2), dtype=np.int64)
+        pairs[:, 0] = np.where(is_leaf, nodes, tree.children_left + offset)
+        pairs[:, 1] = np.where(is_leaf, nodes, tree.children_right + offset)
+        children.append(pairs.ravel())
+        # Normalize node counts/fractions to class probabilities, as predict_proba does per tree
+        value = tree.value[:, 0, :].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        values.append(value / totals)
+        offset += tree.node_count
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "children": np.concatenate(children),
+        "value": np.concatenate(values),
+        "tree_roots": np.array(roots, dtype=np.int64),
+        "scaler_mean": np.zeros(n_features) if scaler is None or scaler.mean_ is None else scaler.mean_.astype(np.float64),
+        "scaler_scale": np.ones(n_features) if scaler is None or scaler.scale_ is None else scaler.scale_.astype(np.float64)
+    }
+    metadata = {
+        "estimator": type(forest).__name__,
+        "estimator_classes": list(forest.classes_),
+        "n_features": int(n_features),
+        "n_trees": len(trees),
+        "depth": max(int(tree.max_depth) for tree in trees)
+    }
+    return arrays, metadata
+
+class ForestArtifactModel:
+    """
+    Stand-in for a fitted scaler + forest Pipeline, evaluated from flat node arrays.
+
+    Leaves point to themselves, so every tree advances one level per step for a fixed number
+    of steps (the deepest tree's depth). predict_proba therefore runs a handful of NumPy
+    operations over an (n_rows, n_trees) array of node indices instead of one Python call per
+    tree. The arrays are used as loaded, so memory-mapped pages stay shared between processes.
+    """
+
+    def __init__(self, arrays, manifest):
+        # Plain ndarray views of the memory maps: no copy, but none of np.memmap's per-index overhead
+        self.arrays = {name: np.asarray(array) for name, array in arrays.items()}
+        self.manifest = manifest
+        self.version = manifest.get("version")
+        self.classes_ = np.array(manifest["metadata"]["estimator_classes"])
+        self.n_features_in_ = manifest["metadata"]["n_features"]
+        self.depth = manifest["metadata"]["depth"]
+
+    @classmethod
+    def from_pipeline(cls, pipeline, version=None):
+        """Evaluate a fitted (scaler +) forest pipeline from in-memory node arrays"""
+        arrays, metadata = forest_to_arrays(pipeline)
+        return cls(arrays, {"version": version, "metadata": metadata})
+
+    def apply(self, X):
+        """Leaf index reached in every tree, as an (n_rows, n_trees) array"""
+        a = self.arrays
+        X = np.asarray(X, dtype=np.float64)
+        # Scale like StandardScaler, then compare in float32 like sklearn trees
+        X = ((X - a["scaler_mean"]) / a["scaler_scale"]).astype(np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(a["tree_roots"], (X.shape[0], len(a["tree_roots"])))
+        for _ in range(self.depth):
+            go_right = X[rows, a["feature"][node]] > a["threshold"][node]
+            node = a["children"][2 * node + go_right]
+        return node
+
+    def predict_proba(self, X):
+        return self.arrays["value"][self.apply(X)].sum(axis=1) / len(self.arrays["tree_roots"])
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def parity_samples(model, n_samples=PARITY_SAMPLES, seed=0):
+    """Deterministic inputs spread around the scaler statistics, plus rows exactly on split thresholds"""
+    a = model.arrays
+    rng = np.random.default_rng(seed)
+    X = a["scaler_mean"] + a["scaler_scale"] * rng.standard_normal((n_samples, model.n_features_in_))
+    # Put a few values exactly on thresholds, where float32 rounding would show up
+    internal = np.flatnonzero(np.isfinite(a["threshold"]))
+    if internal.size:
+        picks = rng.choice(internal, size=min(n_samples, internal.size), replace=False)
+        rows = np.arange(len(picks)) % n_samples
+        features = a["feature"][picks]
+        X[rows, features] = a["threshold"][picks] * a["scaler_scale"][features] + a["scaler_mean"][features]
+    return X
+
+def check_parity(reference, model, n_samples=PARITY_SAMPLES):
+    """Largest absolute difference between the reference pipeline's and model's predict_proba outputs"""
+    X = parity_samples(model, n_samples)
+    return float(np.max(np.abs(reference.predict_proba(X) - model.predict_proba(X))))
+
+def export_pipeline_artifact(pipeline, path, metadata=None):
+    """
+    Write a fitted (scaler +) forest pipeline as an artifact. The arrays are checked against
+    the pipeline first; an ArtifactError is raised if they do not reproduce its probabilities.
+    """
+    arrays, forest_metadata = forest_to_arrays(pipeline)
+    difference = check_parity(pipeline, ForestArtifactModel(arrays, {"metadata": forest_metadata}))
+    if difference > PARITY_TOLERANCE:
+        raise ArtifactError(f"Forest arrays differ from the fitted pipeline by {difference:.3g}")
+    forest_metadata.update(metadata or {})
+    return write_artifact(path, KIND_SKLEARN_FOREST, arrays, forest_metadata)
+
+def load_pipeline_artifact(path, mmap=True):
+    """Open a forest artifact as a ForestArtifactModel"""
+    manifest = read_manifest(path)
+    if manifest["kind"] != KIND_SKLEARN_FOREST:
+        raise ArtifactError(f"Expected a {KIND_SKLEARN_FOREST} artifact at {path}, found {manifest['kind']}")
+    return ForestArtifactModel(load_arrays(path, manifest, mmap=mmap), manifest)
+
+def export_or_discard(pipeline, path, metadata=None):
+    """
+    Export a pipeline artifact, or remove a stale one if this pipeline cannot be exported,
+    so loaders never prefer an artifact that no longer matches the pickled model.
+    """
+    try:
+        return export_pipeline_artifact(pipeline, path, metadata)
+    except Exception as e:
+        logger.warning(f"Model cannot be exported as an artifact ({e}); serving will use the pickle")
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+# PyTorch state dicts
+
+def export_state_dict_artifact(state_dict, path, metadata=None):
+    """Write a PyTorch state_dict as an artifact of raw arrays"""
+    arrays = {name: tensor.detach().cpu().numpy() for name, tensor in state_dict.items()}
+    return write_artifact(path, KIND_TORCH_STATE_DICT, arrays, metadata)
+
+def load_state_dict_artifact(path):
+    """Open a state_dict artifact as tensors backed by read-only memory maps"""
+    import torch
+
+    manifest = read_manifest(path)
+    if manifest["kind"] != KIND_TORCH_STATE_DICT:
+        raise ArtifactError(f"Expected a {KIND_TORCH_STATE_DICT} artifact at {path}, found {manifest['kind']}")
+    arrays = load_arrays(path, manifest)
+    with warnings.catch_warnings():
+        # The tensors are never written to during inference
+        warnings.filterwarnings("ignore", message="The given NumPy array is not writable")
+        state_dict = {name: torch.from_numpy(array) for name, array in arrays.items()}
+    return state_dict, manifest
+
+def attach_state_dict(model, state_dict):
+    """Point a model's parameters and buffers at the given tensors without copying them"""
+    import torch
+
+    expected = dict(model.named_parameters())
+    expected.update(dict(model.named_buffers()))
+    missing = set(expected) - set(state_dict)
+    unexpected = set(state_dict) - set(expected)
+    if missing or unexpected:
+        raise ArtifactError(f"State dict mismatch (missing: {sorted(missing)}, unexpected: {sorted(unexpected)})")
+    with torch.no_grad():
+        for name, tensor in state_dict.items():
+            target = expected[name]
+            if tuple(target.shape) != tuple(tensor.shape):
+                raise ArtifactError(f"Shape mismatch for {name}: {tuple(target.shape)} vs {tuple(tensor.shape)}")
+            target.data = tensor
+    return model
+
+# Command line conversion of existing pickles
+
+def convert_pickle(model_path):
+    """Export the artifact for an existing pickled model (disease model dict or bare crop pipeline)"""
+    import pickle
+
+    with open(model_path, 'rb') as f:
+        data = pickle.load(f)
+    if isinstance(data, dict):
+        metadata = {
+            "classes": list(data["classes"]),
+            "feature_extractor": callable_reference(data.get("feature_extractor"))
+        }
+        return export_pipeline_artifact(data["model"], artifact_path(model_path), metadata)
+    return export_pipeline_artifact(data, artifact_path(model_path))
+
+if __name__ == "__main__":
+    # Usage: python -m services.model_artifacts path/to/model.pkl [...]
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    for model_file in sys.argv[1:]:
+        manifest = convert_pickle(model_file)
+        print(f"{model_file} -> {artifact_path(model_file)} (version {manifest['version']})")
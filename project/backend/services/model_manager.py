@@ -0,0 +1,127 @@
+import logging
+import os
+import random
+import threading
+import traceback
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the watched model files; 0 disables watching (admin reloads still work)
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+# Each process waits a random delay up to this many seconds before reloading a changed model,
+# so several uvicorn workers do not all pay the load cost at the same moment
+MODEL_RELOAD_JITTER = float(os.getenv("MODEL_RELOAD_JITTER", "10"))
+
+def file_fingerprint(paths):
+    """(mtime, size) of each path, using the manifest for artifact directories"""
+    fingerprint = []
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, "manifest.json")
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+class ModelManager:
+    """
+    Holds the serving model and its version, and swaps in newly trained versions.
+
+    The model and version are replaced together as a single tuple, so a request that read
+    snapshot() keeps using the model it started with while a reload happens around it.
+    loader() must return (model, version) and raise if the new model is not usable;
+    on_swap(model, version) runs after a new model has been swapped in.
+    """
+
+    def __init__(self, name, loader, watch_paths=(), initial=None, on_swap=None,
+                 interval=MODEL_RELOAD_INTERVAL, jitter=MODEL_RELOAD_JITTER):
+        self.name = name
+        self.loader = loader
+        self.watch_paths = list(watch_paths)
+        self.on_swap = on_swap
+        self.interval = interval
+        self.jitter = jitter
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._fingerprint = file_fingerprint(self.watch_paths)
+        self._state = initial if initial is not None else loader()
+
+    def snapshot(self):
+        """Return (model, version) of the model currently serving"""
+        return self._state
+
+    @property
+    def model(self):
+        return self._state[0]
+
+    @property
+    def version(self):
+        return self._state[1]
+
+    def reload(self, force=False):
+        """
+        Load the model from disk and swap it in if its version changed.
+        Returns (version, swapped); a failed load leaves the current model serving.
+        """
+        with self._reload_lock:
+            fingerprint = file_fingerprint(self.watch_paths)
+            model, version = self.loader()
+            if version == self.version and not force:
+                self._fingerprint = fingerprint
+                logger.info(f"{self.name} is already at version {version}")
+                return version, False
+            previous = self.version
+            self._state = (model, version)
+            self._fingerprint = fingerprint
+            logger.info(f"Swapped {self.name} from version {previous} to {version}")
+        if self.on_swap is not None:
+            try:
+                self.on_swap(model, version)
+            except Exception as e:
+                logger.error(f"Error after swapping {self.name}: {e}")
+                logger.error(traceback.format_exc())
+        return version, True
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.interval):
+            fingerprint = file_fingerprint(self.watch_paths)
+            if fingerprint == self._fingerprint:
+                pending = None
+                continue
+            # Only reload once the files stopped changing, so a model being written is not read
+            if fingerprint != pending:
+                pending = fingerprint
+                continue
+            pending = None
+            if self._stop.wait(random.uniform(0, self.jitter)):
+                return
+            try:
+                logger.info(f"Model files for {self.name} changed, reloading")
+                self.reload()
+            except Exception as e:
+                # Keep serving the current model and wait for the files to change again
+                self._fingerprint = fingerprint
+                logger.error(f"Error reloading {self.name}: {e}")
+                logger.error(traceback.format_exc())
+
+    def start_watching(self):
+        """Poll the watched files in a background thread and reload when they change"""
+        if self.interval <= 0 or not self.watch_paths:
+            return
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name=f"{self.name}-watcher", daemon=True)
+            self._watcher.start()
+            logger.info(f"Watching {self.name} files every {self.interval:g}s")
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
@@ -0,0 +1,138 @@
+import logging
+import os
+import time
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from threadpoolctl import threadpool_limits
+from services.forest_engine import select_engine, DISEASE_MODEL_ENGINE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Candidates evaluated by select_model, comma separated
+MODEL_CANDIDATES = [name.strip() for name in os.getenv(
+    "MODEL_CANDIDATES", "random_forest,hist_gradient_boosting,svm").split(",") if name.strip()]
+MODEL_CV_FOLDS = int(os.getenv("MODEL_CV_FOLDS", "5"))
+# Single-image predict_proba latency a candidate must stay under to be selected
+MODEL_LATENCY_BUDGET_MS = float(os.getenv("MODEL_LATENCY_BUDGET_MS", "5"))
+# Parallel fits; -1 uses every core. Fits running in parallel are limited to one OpenMP/BLAS
+# thread each (HistGradientBoostingClassifier would otherwise use every core per fit)
+MODEL_SELECTION_JOBS = int(os.getenv("MODEL_SELECTION_JOBS", "-1"))
+LATENCY_REPEATS = 50
+
+def make_candidate(name, seed=42):
+    """Unfitted scaler + classifier pipeline for a candidate name"""
+    if name == "random_forest":
+        classifier = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=seed, n_jobs=1)
+    elif name == "hist_gradient_boosting":
+        classifier = HistGradientBoostingClassifier(random_state=seed)
+    elif name == "svm":
+        classifier = SVC(probability=True, random_state=seed)
+    else:
+        raise ValueError(f"Unknown model candidate '{name}'")
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('classifier', classifier)
+    ])
+
+def _fit_and_score(pipeline, X, y, train_idx, test_idx, threads):
+    """Worker job: fit one candidate on one fold and return its accuracy on the held-out part"""
+    with threadpool_limits(limits=threads):
+        pipeline.fit(X[train_idx], y[train_idx])
+        return accuracy_score(y[test_idx], pipeline.predict(X[test_idx]))
+
+def _fit(pipeline, X, y, threads):
+    start = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        pipeline.fit(X, y)
+    return pipeline, time.perf_counter() - start
+
+def make_splits(y, folds, seed=42):
+    """
+    Cross-validation splits for labels y. Folds are reduced to the smallest class size so
+    every fold is stratified; when a class has a single sample, unstratified folds are used.
+    """
+    smallest = int(np.unique(y, return_counts=True)[1].min())
+    if smallest >= 2:
+        if smallest < folds:
+            logger.warning(f"Smallest class has {smallest} samples, using {smallest} folds instead of {folds}")
+        return list(StratifiedKFold(n_splits=min(folds, smallest), shuffle=True, random_state=seed).split(y, y))
+    n_splits = max(2, min(folds, len(y)))
+    logger.warning(f"Some classes have a single sample, using {n_splits} unstratified folds")
+    return list(KFold(n_splits=n_splits, shuffle=True, random_state=seed).split(y))
+
+def measure_latency(model, X, repeats=LATENCY_REPEATS):
+    """Median single-row predict_proba latency in milliseconds, over rows of X"""
+    rows = X[:repeats]
+    model.predict_proba(rows[:1])
+    timings = []
+    for i in range(repeats):
+        row = rows[i % len(rows)][None, :]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+def select_model(X, y, candidates=None, folds=MODEL_CV_FOLDS, latency_budget_ms=MODEL_LATENCY_BUDGET_MS,
+                 n_jobs=MODEL_SELECTION_JOBS, seed=42):
+    """
+    Pick a model by k-fold cross-validated accuracy under a latency budget.
+
+    Every (candidate, fold) fit runs in parallel, then each candidate is refit on all of X
+    and its single-image latency is measured on the engine that would serve it. The most
+    accurate candidate within latency_budget_ms wins; if none fits the budget, the fastest.
+    Returns (name, fitted pipeline, results), with one results dict per candidate.
+    """
+    candidates = list(candidates or MODEL_CANDIDATES)
+    X = np.asarray(X)
+    y = np.asarray(y)
+    splits = make_splits(y, folds, seed)
+    folds = len(splits)
+    templates = {name: make_candidate(name, seed) for name in candidates}
+    # Parallel fits get one thread each so n_jobs workers do not oversubscribe the cores
+    threads = None if n_jobs == 1 else 1
+
+    parallel = Parallel(n_jobs=n_jobs)
+    scores = parallel(
+        delayed(_fit_and_score)(clone(templates[name]), X, y, train_idx, test_idx, threads)
+        for name in candidates for train_idx, test_idx in splits
+    )
+    fitted = parallel(delayed(_fit)(clone(templates[name]), X, y, threads) for name in candidates)
+
+    results = []
+    models = {}
+    for i, name in enumerate(candidates):
+        fold_scores = np.array(scores[i * folds:(i + 1) * folds])
+        pipeline, fit_seconds = fitted[i]
+        models[name] = pipeline
+        # Forests are served from the compiled engine, so their latency is measured on it
+        forest = hasattr(pipeline.steps[-1][1], "estimators_")
+        serving_model = select_engine(pipeline, DISEASE_MODEL_ENGINE, name) if forest else pipeline
+        results.append({
+            "name": name,
+            "cv_accuracy": float(fold_scores.mean()),
+            "cv_std": float(fold_scores.std()),
+            "latency_ms": measure_latency(serving_model, X),
+            "fit_seconds": fit_seconds
+        })
+        logger.info(
+            f"{name}: CV accuracy {results[-1]['cv_accuracy']:.4f} (+/- {results[-1]['cv_std']:.4f}), "
+            f"latency {results[-1]['latency_ms']:.2f} ms, fit {fit_seconds:.1f} s"
+        )
+
+    within_budget = [result for result in results if result["latency_ms"] <= latency_budget_ms]
+    if within_budget:
+        best = max(within_budget, key=lambda result: (result["cv_accuracy"], -result["latency_ms"]))
+    else:
+        best = min(results, key=lambda result: result["latency_ms"])
+        logger.warning(f"No candidate meets the {latency_budget_ms} ms latency budget, using the fastest")
+    logger.info(f"Selected {best['name']} (CV accuracy {best['cv_accuracy']:.4f}, latency {best['latency_ms']:.2f} ms)")
+    return best["name"], models[best["name"]], results
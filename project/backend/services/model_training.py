@@ -2,39 +2,54 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import DataLoader, Subset, random_split
 import os
+import random
+import numpy as np
 from pathlib import Path
+from .model_artifacts import artifact_path, export_state_dict_artifact
+from .tensor_store import build_tensor_store, TensorStoreDataset
+from .zip_dataset import ZipImageDataset, is_archive_path
+
+# Architectures selectable for training and serving: "dense" flattens the 128x28x28 feature
+# map into a ~51M-parameter Linear layer (224x224 input only); "gap" global-average-pools the
+# feature map into a small head, so the checkpoint is about 1 MB and any input size works
+DEFAULT_ARCH = "dense"
+DEFAULT_IMAGE_SIZE = 224
+
+def make_conv_layers():
+    """Convolutional feature extractor shared by both architectures"""
+    return nn.Sequential(
+        # conv1
+        nn.Conv2d(in_channels=3, out_channels=32, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.BatchNorm2d(32),
+        nn.Conv2d(in_channels=32, out_channels=32, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.BatchNorm2d(32),
+        nn.MaxPool2d(2),
+        # conv2
+        nn.Conv2d(in_channels=32, out_channels=64, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.BatchNorm2d(64),
+        nn.Conv2d(in_channels=64, out_channels=64, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.BatchNorm2d(64),
+        nn.MaxPool2d(2),
+        # conv3
+        nn.Conv2d(in_channels=64, out_channels=128, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.BatchNorm2d(128),
+        nn.Conv2d(in_channels=128, out_channels=128, kernel_size=3, padding=1),
+        nn.ReLU(),
+        nn.BatchNorm2d(128),
+        nn.MaxPool2d(2),
+    )
 
 class PlantDiseaseCNN(nn.Module):
     def __init__(self, num_classes):
         super(PlantDiseaseCNN, self).__init__()
-        self.conv_layers = nn.Sequential(
-            # conv1
-            nn.Conv2d(in_channels=3, out_channels=32, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.BatchNorm2d(32),
-            nn.Conv2d(in_channels=32, out_channels=32, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.BatchNorm2d(32),
-            nn.MaxPool2d(2),
-            # conv2
-            nn.Conv2d(in_channels=32, out_channels=64, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.BatchNorm2d(64),
-            nn.Conv2d(in_channels=64, out_channels=64, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.BatchNorm2d(64),
-            nn.MaxPool2d(2),
-            # conv3
-            nn.Conv2d(in_channels=64, out_channels=128, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.BatchNorm2d(128),
-            nn.Conv2d(in_channels=128, out_channels=128, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.BatchNorm2d(128),
-            nn.MaxPool2d(2),
-        )
+        self.conv_layers = make_conv_layers()
         
         self.fc_layers = nn.Sequential(
             nn.Linear(128 * 28 * 28, 512),
@@ -45,54 +60,230 @@ class PlantDiseaseCNN(nn.Module):
 
     def forward(self, x):
         x = self.conv_layers(x)
-        x = x.view(x.size(0), -1)
+        x = x.reshape(x.size(0), -1)
         x = self.fc_layers(x)
         return x
 
-def train_model(data_dir, model_save_path, num_epochs=10, batch_size=32, learning_rate=0.001):
-    # Data transformations
-    transform = transforms.Compose([
-        transforms.Resize(255),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-
-    # Load dataset
-    dataset = datasets.ImageFolder(data_dir, transform=transform)
+class PlantDiseaseGAPCNN(nn.Module):
+    """Same convolutions as PlantDiseaseCNN with a global-average-pooling classifier head."""
+
+    def __init__(self, num_classes):
+        super(PlantDiseaseGAPCNN, self).__init__()
+        self.conv_layers = make_conv_layers()
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        
+        self.fc_layers = nn.Sequential(
+            nn.Linear(128, 256),
+            nn.ReLU(),
+            nn.Dropout(0.4),
+            nn.Linear(256, num_classes)
+        )
+
+    def forward(self, x):
+        x = self.conv_layers(x)
+        x = self.pool(x).flatten(1)
+        x = self.fc_layers(x)
+        return x
+
+ARCHITECTURES = {
+    "dense": PlantDiseaseCNN,
+    "gap": PlantDiseaseGAPCNN
+}
+
+def build_model(arch, num_classes, image_size=DEFAULT_IMAGE_SIZE):
+    """Create an untrained model of the given architecture, checking the input size it supports"""
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture '{arch}', expected one of: {', '.join(ARCHITECTURES)}")
+    if arch == "dense" and image_size != 224:
+        raise ValueError("The dense architecture only supports 224x224 inputs; use arch='gap' for other sizes")
+    if image_size % 8 != 0:
+        raise ValueError(f"Input size must be a multiple of 8, got {image_size}")
+    return ARCHITECTURES[arch](num_classes=num_classes)
+
+def resize_size_for(image_size):
+    """Shorter-side resize before center cropping, keeping the 255/224 ratio used for 224 inputs"""
+    return round(image_size * 255 / 224)
+
+def architecture_report(num_classes=38, image_sizes=(224, 160, 128), batch_size=1, repeats=10):
+    """
+    Compare parameter count, checkpoint size and CPU latency of the architectures.
+    Returns one dict per (architecture, input size) combination that the architecture supports.
+    """
+    import io
+    import time
+
+    rows = []
+    for arch in ARCHITECTURES:
+        for image_size in image_sizes:
+            try:
+                model = build_model(arch, num_classes, image_size).eval()
+            except ValueError:
+                continue
+            buffer = io.BytesIO()
+            torch.save(model.state_dict(), buffer)
+            inputs = torch.randn(batch_size, 3, image_size, image_size)
+            with torch.no_grad():
+                model(inputs)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    model(inputs)
+                latency = (time.perf_counter() - start) / repeats
+            rows.append({
+                "arch": arch,
+                "image_size": image_size,
+                "parameters": sum(p.numel() for p in model.parameters()),
+                "checkpoint_mb": round(len(buffer.getvalue()) / 1e6, 2),
+                "latency_ms": round(latency * 1000, 1)
+            })
+    return rows
+
+def checkpoint_path_for(model_save_path):
+    """Training checkpoint stored next to the saved weights"""
+    return f"{model_save_path}.checkpoint"
+
+def capture_rng_state():
+    """RNG state of every generator that training draws from"""
+    state = {
+        "torch": torch.get_rng_state(),
+        "numpy": np.random.get_state(),
+        "python": random.getstate()
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+def restore_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+def save_checkpoint(checkpoint, path):
+    """Write a checkpoint atomically, so preemption mid-write keeps the previous one intact"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    # The checkpoint holds NumPy and Python RNG state besides tensors, so it is not weights_only
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+def train_model(data_dir, model_save_path, num_epochs=10, batch_size=32, learning_rate=0.001,
+                arch=DEFAULT_ARCH, image_size=DEFAULT_IMAGE_SIZE, tensor_store_dir=None,
+                num_workers=0, pin_memory=None, persistent_workers=True,
+                checkpoint_path=None, resume=False, patience=None, archive_root=""):
+    """
+    Train a PlantDiseaseCNN variant on an ImageFolder dataset.
+    data_dir may also be a zip archive with the same layout below archive_root; its images
+    are then read from the archive in the DataLoader workers without extracting it.
+    With tensor_store_dir set, images are decoded and cropped once into a uint8 memory-mapped
+    store (reused while the dataset is unchanged) instead of on every epoch. num_workers,
+    pin_memory (default: when training on CUDA) and persistent_workers configure the DataLoaders.
+
+    A full checkpoint (model, optimizer, epoch, RNG state and split indices) is written to
+    checkpoint_path (default: next to model_save_path) after every epoch; resume=True continues
+    from it with the same split and shuffling as an uninterrupted run. With patience set,
+    training stops after that many epochs without a validation accuracy improvement.
+    """
+    checkpoint_path = checkpoint_path or checkpoint_path_for(model_save_path)
+    checkpoint = None
+    if resume:
+        if os.path.exists(checkpoint_path):
+            checkpoint = load_checkpoint(checkpoint_path)
+            print(f"Resuming from {checkpoint_path} after epoch {checkpoint['epoch'] + 1}")
+        else:
+            print(f"No checkpoint at {checkpoint_path}, starting from scratch")
+
+    archive = is_archive_path(data_dir)
+    if archive and tensor_store_dir:
+        raise ValueError("tensor_store_dir needs an extracted dataset directory, not a zip archive")
+    
+    if tensor_store_dir:
+        # Decode and crop once; every epoch then only reads and normalizes uint8 tensors
+        build_tensor_store(data_dir, tensor_store_dir, image_size, resize_size_for(image_size),
+                           num_workers=max(1, num_workers))
+        dataset = TensorStoreDataset(tensor_store_dir)
+    else:
+        # Data transformations
+        transform = transforms.Compose([
+            transforms.Resize(resize_size_for(image_size)),
+            transforms.CenterCrop(image_size),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+
+        # Load dataset
+        if archive:
+            # Reduced-scale JPEG decoding, as the server does
+            dataset = ZipImageDataset(data_dir, archive_root, transform, decode_size=resize_size_for(image_size))
+        else:
+            dataset = datasets.ImageFolder(data_dir, transform=transform)
     
     # Split dataset
     train_size = int(0.7 * len(dataset))
     val_size = int(0.15 * len(dataset))
     test_size = len(dataset) - train_size - val_size
     
-    train_dataset, val_dataset, test_dataset = random_split(
-        dataset, [train_size, val_size, test_size]
-    )
+    if checkpoint is not None:
+        if checkpoint["dataset_size"] != len(dataset) or checkpoint["classes"] != dataset.classes:
+            raise ValueError(f"Dataset changed since checkpoint {checkpoint_path} was written; cannot resume")
+        if checkpoint["arch"] != arch or checkpoint["image_size"] != image_size:
+            raise ValueError(
+                f"Checkpoint {checkpoint_path} is for arch={checkpoint['arch']} image_size={checkpoint['image_size']}"
+            )
+        # Reuse the original split so no validation or test image leaks into training
+        train_dataset, val_dataset, test_dataset = (
+            Subset(dataset, indices) for indices in checkpoint["split_indices"]
+        )
+    else:
+        train_dataset, val_dataset, test_dataset = random_split(
+            dataset, [train_size, val_size, test_size]
+        )
+    split_indices = [list(subset.indices) for subset in (train_dataset, val_dataset, test_dataset)]
 
     # Create data loaders
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    loader_options = {
+        "batch_size": batch_size,
+        "num_workers": num_workers,
+        "pin_memory": device.type == "cuda" if pin_memory is None else pin_memory,
+        "persistent_workers": persistent_workers and num_workers > 0
+    }
+    train_loader = DataLoader(train_dataset, shuffle=True, **loader_options)
+    val_loader = DataLoader(val_dataset, **loader_options)
+    test_loader = DataLoader(test_dataset, **loader_options)
 
     # Initialize model
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = PlantDiseaseCNN(num_classes=len(dataset.classes)).to(device)
+    model = build_model(arch, len(dataset.classes), image_size).to(device)
     
     # Loss function and optimizer
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=learning_rate)
 
     # Training loop
+    start_epoch = 0
     best_val_acc = 0.0
-    for epoch in range(num_epochs):
+    epochs_without_improvement = 0
+    if checkpoint is not None:
+        model.load_state_dict(checkpoint["model_state"])
+        optimizer.load_state_dict(checkpoint["optimizer_state"])
+        start_epoch = checkpoint["epoch"] + 1
+        best_val_acc = checkpoint["best_val_acc"]
+        epochs_without_improvement = checkpoint["epochs_without_improvement"]
+        # Restored last so the next epoch shuffles exactly as it would have without the interruption
+        restore_rng_state(checkpoint["rng_state"])
+        if checkpoint.get("stopped_early"):
+            start_epoch = num_epochs
+
+    for epoch in range(start_epoch, num_epochs):
         model.train()
         running_loss = 0.0
         correct = 0
         total = 0
         
         for inputs, labels in train_loader:
-            inputs, labels = inputs.to(device), labels.to(device)
+            inputs, labels = inputs.to(device, non_blocking=True), labels.to(device, non_blocking=True)
             
             optimizer.zero_grad()
             outputs = model(inputs)
@@ -135,15 +326,55 @@ def train_model(data_dir, model_save_path, num_epochs=10, batch_size=32, learnin
         # Save best model
         if val_acc > best_val_acc:
             best_val_acc = val_acc
+            epochs_without_improvement = 0
             torch.save(model.state_dict(), model_save_path)
             print(f'Model saved with validation accuracy: {val_acc:.2f}%')
+        else:
+            epochs_without_improvement += 1
+
+        stop_early = patience is not None and epochs_without_improvement >= patience
+        save_checkpoint({
+            "epoch": epoch,
+            "model_state": model.state_dict(),
+            "optimizer_state": optimizer.state_dict(),
+            "best_val_acc": best_val_acc,
+            "epochs_without_improvement": epochs_without_improvement,
+            "stopped_early": stop_early,
+            "rng_state": capture_rng_state(),
+            "split_indices": split_indices,
+            "dataset_size": len(dataset),
+            "classes": dataset.classes,
+            "arch": arch,
+            "image_size": image_size
+        }, checkpoint_path)
+
+        if stop_early:
+            print(f'No validation accuracy improvement for {patience} epochs, stopping early')
+            break
+
+    # Export the best weights as a memory-mappable artifact for serving
+    if os.path.exists(model_save_path):
+        export_state_dict_artifact(
+            torch.load(model_save_path, map_location="cpu"),
+            artifact_path(model_save_path),
+            {"classes": dataset.classes, "best_val_acc": best_val_acc, "arch": arch, "image_size": image_size}
+        )
 
     return model
 
 if __name__ == "__main__":
+    import sys
+    
+    # python -m services.model_training --report prints size and latency of each architecture
+    if "--report" in sys.argv:
+        for row in architecture_report():
+            print(f"{row['arch']:>5} {row['image_size']:>4}px  {row['parameters']:>11,} params  "
+                  f"{row['checkpoint_mb']:>8.2f} MB  {row['latency_ms']:>7.1f} ms/image")
+        sys.exit(0)
+    
     # Set paths
     data_dir = "path/to/your/dataset"  # Update this path
     model_save_path = "path/to/save/model.pth"  # Update this path
     
-    # Train model
-    model = train_model(data_dir, model_save_path) 
\ No newline at end of file
+    # Train model; --resume continues an interrupted run from its last checkpoint
+    model = train_model(data_dir, model_save_path, resume="--resume" in sys.argv)
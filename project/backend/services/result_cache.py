@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import traceback
+from collections import OrderedDict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_DIR = os.getenv(
+    "DISEASE_CACHE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/inference_cache'))
+)
+# Memory budget for the in-process LRU tier, measured on the serialized results
+CACHE_MAX_BYTES = int(os.getenv("DISEASE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("DISEASE_CACHE_ENABLED", "1") not in ("0", "false", "False")
+# Disk budget for the on-disk tier. Past it, the least recently used files are deleted down to
+# DISK_PRUNE_TARGET of the budget; entries of superseded model versions are never read, so they go first
+CACHE_DISK_MAX_BYTES = int(os.getenv("DISEASE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+DISK_PRUNE_TARGET = 0.9
+
+class InferenceCache:
+    """
+    Detection results keyed by upload content and model version, in a memory LRU backed by disk.
+    The disk tier is an LRU by file modification time (reads touch the file), bounded by disk_max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, enabled=CACHE_ENABLED,
+                 disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Bytes on disk as of the last scan plus this process's writes since; None until scanned
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_data, model_version):
+        """Hash the raw upload bytes together with the model version"""
+        digest = hashlib.sha256()
+        digest.update(str(model_version).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(image_data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, payload):
+        """Insert a serialized result into the memory tier and evict least recently used entries"""
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = payload
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _discard(self, key):
+        """Drop an entry from both tiers"""
+        with self._lock:
+            payload = self._entries.pop(key, None)
+            if payload is not None:
+                self._bytes -= len(payload)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error removing inference cache entry {key}: {e}")
+
+    def get(self, key):
+        """Return the cached result for key, or None; unreadable or corrupt entries are dropped"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+        from_disk = payload is None
+        try:
+            if from_disk:
+                path = self._path(key)
+                if not os.path.exists(path):
+                    return None
+                with open(path, "r") as f:
+                    payload = f.read()
+            result = json.loads(payload)
+        except Exception as e:
+            logger.error(f"Error reading inference cache entry {key}, dropping it: {e}")
+            self._discard(key)
+            return None
+        if from_disk:
+            # Mark the file as recently used so pruning keeps it
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        # Only entries that parsed are kept in memory
+        if from_disk:
+            self._remember(key, payload)
+        return result
+
+    def put(self, key, result):
+        """Store a result in both tiers"""
+        if not self.enabled:
+            return
+        try:
+            payload = json.dumps(result)
+            self._remember(key, payload)
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            if self._add_disk_bytes(len(payload)):
+                self.prune_disk()
+        except Exception as e:
+            logger.error(f"Error writing inference cache entry {key}: {e}")
+            logger.error(traceback.format_exc())
+
+    def _add_disk_bytes(self, size):
+        """Account for a written entry; True when the disk tier should be scanned and pruned"""
+        with self._lock:
+            if self._disk_bytes is None:
+                return True
+            self._disk_bytes += size
+            return self._disk_bytes > self.disk_max_bytes
+
+    def _scan_disk(self):
+        """(mtime, size, path) of every entry file in the disk tier"""
+        files = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def prune_disk(self):
+        """Delete the least recently used disk entries once the disk tier is over its budget"""
+        with self._prune_lock:
+            files = self._scan_disk()
+            total = sum(size for _, size, _ in files)
+            if total > self.disk_max_bytes:
+                target = self.disk_max_bytes * DISK_PRUNE_TARGET
+                removed = 0
+                for _, size, path in sorted(files):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    removed += 1
+                logger.info(f"Pruned {removed} inference cache entries from disk, {total} bytes left")
+            with self._lock:
+                self._disk_bytes = total
+
+    def clear_memory(self):
+        """Drop the memory tier (disk entries are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
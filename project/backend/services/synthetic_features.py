@@ -0,0 +1,51 @@
+import zlib
+import numpy as np
+
+# Synthetic 50-float feature vectors used to bootstrap the disease forest before real images exist
+NUM_FEATURES = 50
+DEFAULT_SEED = 42
+
+# Mean of features 3-9 and 10-14 for disease names containing each keyword (first match wins)
+CLASS_PATTERNS = [
+    ("Healthy", 0.8, 0.2),
+    ("Blight", 0.3, 0.7),
+    ("Rot", 0.1, 0.9)
+]
+
+def class_color_seed(disease_name):
+    """Per-class base value from a CRC32 of the name; unlike hash(), the same in every process"""
+    return zlib.crc32(disease_name.encode('utf-8')) % 255
+
+def generate_synthetic_features(disease_classes, num_samples_per_class=100, seed=DEFAULT_SEED):
+    """
+    Generate num_samples_per_class synthetic feature vectors for each disease class.
+    Returns X of shape (classes * samples, 50) grouped by class, and y with the class indices.
+    The output depends only on the class names, the sample count and seed.
+    """
+    rng = np.random.default_rng(seed)
+    num_classes = len(disease_classes)
+    X = np.zeros((num_classes, num_samples_per_class, NUM_FEATURES))
+
+    # Base features - different for each disease class
+    color_seeds = np.array([class_color_seed(name) for name in disease_classes], dtype=np.int64)
+    X[:, :, 0:3] = ((color_seeds[:, None] * np.array([13, 17, 19])) % 100 / 100.0)[:, None, :]
+
+    # Feature patterns for healthy plants, blight and rot
+    means = np.full((num_classes, 2), np.nan)
+    for class_idx, disease_name in enumerate(disease_classes):
+        for keyword, high_mean, low_mean in CLASS_PATTERNS:
+            if keyword in disease_name:
+                means[class_idx] = (high_mean, low_mean)
+                break
+    patterned = ~np.isnan(means[:, 0])
+    count = int(patterned.sum())
+    X[patterned, :, 3:10] = rng.normal(means[patterned, 0, None, None], 0.1, (count, num_samples_per_class, 7))
+    X[patterned, :, 10:15] = rng.normal(means[patterned, 1, None, None], 0.1, (count, num_samples_per_class, 5))
+
+    # Randomness in the other features plus small noise to make each sample unique
+    X[:, :, 15:] = rng.normal(0.5, 0.3, (num_classes, num_samples_per_class, NUM_FEATURES - 15))
+    X += rng.normal(0, 0.05, X.shape)
+    np.clip(X, 0, 1, out=X)
+
+    y = np.repeat(np.arange(num_classes), num_samples_per_class)
+    return X.reshape(-1, NUM_FEATURES), y
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from torchvision import datasets, transforms
+from .image_preprocessing import load_image
+
+# Preprocessed training images: one uint8 array of shape (N, 3, size, size) plus labels,
+# written once and memory-mapped by every DataLoader worker
+STORE_FORMAT_VERSION = 1
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+MANIFEST_FILE = "manifest.json"
+
+NORMALIZE_MEAN = [0.485, 0.456, 0.406]
+NORMALIZE_STD = [0.229, 0.224, 0.225]
+
+def dataset_fingerprint(samples):
+    """Hash of every source path, size and mtime, so a changed dataset triggers a rebuild"""
+    digest = hashlib.sha256()
+    for path, label in samples:
+        stat = os.stat(path)
+        digest.update(f"{path}|{label}|{stat.st_size}|{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def _preprocess(path, resize_size, image_size):
+    """Decode one image and resize/crop it exactly as the training transform did, as uint8 CHW"""
+    image = load_image(path, (resize_size, resize_size))
+    image = transforms.CenterCrop(image_size)(transforms.Resize(resize_size)(image))
+    return np.asarray(image, dtype=np.uint8).transpose(2, 0, 1)
+
+def _fill_chunk(images_path, start, paths, resize_size, image_size):
+    """Worker job: preprocess a run of images and write them into the shared memmap"""
+    images = np.load(images_path, mmap_mode='r+')
+    for offset, path in enumerate(paths):
+        images[start + offset] = _preprocess(path, resize_size, image_size)
+    images.flush()
+    return len(paths)
+
+def read_store_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def build_tensor_store(data_dir, store_dir, image_size=224, resize_size=None, num_workers=None, chunk_size=64):
+    """
+    Decode, resize and crop an ImageFolder dataset once into a uint8 tensor store.
+    An existing store built from the same files at the same size is reused as is.
+    Returns the store manifest.
+    """
+    resize_size = resize_size or round(image_size * 255 / 224)
+    folder = datasets.ImageFolder(data_dir)
+    fingerprint = dataset_fingerprint(folder.samples)
+
+    manifest = read_store_manifest(store_dir)
+    if (manifest and manifest.get("format_version") == STORE_FORMAT_VERSION
+            and manifest.get("fingerprint") == fingerprint
+            and manifest.get("image_size") == image_size and manifest.get("resize_size") == resize_size):
+        print(f"Reusing preprocessed tensor store at {store_dir}")
+        return manifest
+
+    tmp_dir = f"{store_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        count = len(folder.samples)
+        images_path = os.path.join(tmp_dir, IMAGES_FILE)
+        np.lib.format.open_memmap(images_path, mode='w+', dtype=np.uint8, shape=(count, 3, image_size, image_size)).flush()
+        np.save(os.path.join(tmp_dir, LABELS_FILE), np.array([label for _, label in folder.samples], dtype=np.int64))
+
+        paths = [path for path, _ in folder.samples]
+        chunks = [(start, paths[start:start + chunk_size]) for start in range(0, count, chunk_size)]
+        num_workers = num_workers if num_workers is not None else (os.cpu_count() or 1)
+        print(f"Preprocessing {count} images into {store_dir} with {num_workers} workers")
+        if num_workers > 1:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                futures = [
+                    executor.submit(_fill_chunk, images_path, start, chunk, resize_size, image_size)
+                    for start, chunk in chunks
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for start, chunk in chunks:
+                _fill_chunk(images_path, start, chunk, resize_size, image_size)
+
+        manifest = {
+            "format_version": STORE_FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "classes": folder.classes,
+            "count": count,
+            "image_size": image_size,
+            "resize_size": resize_size
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.rename(tmp_dir, store_dir)
+        return manifest
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+class TensorStoreDataset(Dataset):
+    """Dataset over a preprocessed tensor store, returning normalized float tensors and labels."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.manifest = read_store_manifest(store_dir)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No tensor store at: {store_dir}")
+        self.classes = self.manifest["classes"]
+        self.labels = np.load(os.path.join(store_dir, LABELS_FILE))
+        self.mean = torch.tensor(NORMALIZE_MEAN).view(3, 1, 1)
+        self.std = torch.tensor(NORMALIZE_STD).view(3, 1, 1)
+        # Opened lazily so each DataLoader worker maps the file itself instead of receiving a copy
+        self._images = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def __getitem__(self, index):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.store_dir, IMAGES_FILE), mmap_mode='r')
+        image = torch.from_numpy(np.array(self._images[index])).float().div_(255)
+        return (image - self.mean) / self.std, int(self.labels[index])
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from services.model_artifacts import model_file_version
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Set to 1 to retrain at startup even when the saved model was trained from the same inputs
+FORCE_RETRAIN = os.getenv("FORCE_RETRAIN", "0") not in ("0", "false", "False")
+FINGERPRINT_FORMAT_VERSION = 1
+
+def fingerprint_path(model_path):
+    """Fingerprint record that sits next to a model file, e.g. models/disease_model.fingerprint.json"""
+    return os.path.splitext(model_path)[0] + ".fingerprint.json"
+
+def file_hashes(paths):
+    """Content hash of each file, keyed by file name"""
+    hashes = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            hashes[os.path.basename(path)] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+def training_fingerprint(data_hashes, hyperparameters, code_files):
+    """
+    Fingerprint of everything a trained model depends on: the training data, the
+    hyperparameters, the training code and the library versions that pickle the model.
+    """
+    import numpy
+    import sklearn
+
+    inputs = {
+        "format_version": FINGERPRINT_FORMAT_VERSION,
+        "data": data_hashes,
+        "hyperparameters": hyperparameters,
+        "code": file_hashes(code_files),
+        "python": "%d.%d" % sys.version_info[:2],
+        "numpy": numpy.__version__,
+        "sklearn": sklearn.__version__
+    }
+    encoded = json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest(), inputs
+
+def _read_record(model_path):
+    path = fingerprint_path(model_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not read training fingerprint {path}: {e}")
+        return None
+
+def is_up_to_date(model_path, fingerprint):
+    """
+    True when model_path holds the model trained from inputs with this fingerprint.
+    A model file replaced by other means (e.g. a manual training run) does not count.
+    """
+    if FORCE_RETRAIN or not os.path.exists(model_path):
+        return False
+    record = _read_record(model_path)
+    if not record or record.get("fingerprint") != fingerprint:
+        return False
+    return record.get("model_version") == model_file_version(model_path)
+
+def trained_by(model_path):
+    """Name of the trainer that produced the current model_path, or None when no record matches it"""
+    if not os.path.exists(model_path):
+        return None
+    record = _read_record(model_path)
+    if not record or record.get("model_version") != model_file_version(model_path):
+        return None
+    return record.get("trainer")
+
+def record_training(model_path, fingerprint, inputs, trainer):
+    """Write the fingerprint record for a freshly trained model, atomically"""
+    path = fingerprint_path(model_path)
+    record = {
+        "fingerprint": fingerprint,
+        "model_version": model_file_version(model_path),
+        "trainer": trainer,
+        "trained": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "inputs": inputs
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp_path, path)
@@ -0,0 +1,185 @@
+import hashlib
+import io
+import logging
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+from .image_preprocessing import load_image
+from .feature_extraction import extract_features_from_images, FEATURE_IMAGE_SIZE, NUM_FEATURES
+from .feature_store import FeatureStore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Image files read from an archive, as in torchvision's ImageFolder
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.ppm', '.bmp', '.pgm', '.tif', '.tiff', '.webp')
+# Archive members decoded per worker job when extracting forest features
+FEATURE_CHUNK_SIZE = 256
+
+class ZipDatasetError(Exception):
+    """Raised when a training archive is missing, not a zip file or holds no images."""
+
+def check_archive(zip_path):
+    """Raise ZipDatasetError with a useful message unless zip_path is a readable zip archive"""
+    if not os.path.exists(zip_path):
+        raise ZipDatasetError(f"Dataset archive not found at: {zip_path}")
+    if not zipfile.is_zipfile(zip_path):
+        with open(zip_path, 'rb') as f:
+            head = f.read(512).lstrip().lower()
+        hint = " (it is an HTML page; download the raw file instead)" if head.startswith((b'<!doctype html', b'<html')) else ""
+        raise ZipDatasetError(f"{zip_path} is not a zip archive{hint}")
+
+def scan_archive(zip_path, root=""):
+    """
+    List the images under root in an archive laid out like an ImageFolder (<root>/<class>/<image>).
+    Returns (classes, samples) with classes sorted and samples as (member name, class index)
+    in member-name order, like ImageFolder.
+    """
+    check_archive(zip_path)
+    root = root.strip("/")
+    prefix = f"{root}/" if root else ""
+    by_class = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.startswith(prefix) or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            parts = name[len(prefix):].split("/")
+            # Images must sit exactly one directory below root; the directory is the class
+            if len(parts) != 2 or parts[0].startswith((".", "__MACOSX")):
+                continue
+            by_class.setdefault(parts[0], []).append(name)
+    if not by_class:
+        raise ZipDatasetError(f"No class directories with images found under '{root or '/'}' in {zip_path}")
+    classes = sorted(by_class)
+    samples = [
+        (name, index)
+        for index, class_name in enumerate(classes)
+        for name in sorted(by_class[class_name])
+    ]
+    return classes, samples
+
+class ZipImageDataset(Dataset):
+    """
+    ImageFolder-style dataset read directly from a zip archive, without extracting it.
+    Each DataLoader worker opens its own handle on the archive, so members are decoded in
+    parallel across workers. decode_size, when set, lets JPEGs decode at a reduced scale
+    that is still at least that size.
+    """
+
+    def __init__(self, zip_path, root="", transform=None, decode_size=None):
+        self.zip_path = zip_path
+        self.root = root
+        self.transform = transform
+        self.decode_size = decode_size
+        self.classes, self.samples = scan_archive(zip_path, root)
+        self.class_to_idx = {name: index for index, name in enumerate(self.classes)}
+        self.targets = [label for _, label in self.samples]
+        # Opened lazily so each worker process gets its own file handle
+        self._archive = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_archive"] = None
+        return state
+
+    def read_member(self, name):
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.zip_path)
+        return self._archive.read(name)
+
+    def __getitem__(self, index):
+        name, label = self.samples[index]
+        data = self.read_member(name)
+        if self.decode_size:
+            image = load_image(data, (self.decode_size, self.decode_size))
+        else:
+            image = Image.open(io.BytesIO(data)).convert('RGB')
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, label
+
+def _extract_chunk(zip_path, names):
+    """Worker job: decode a run of members as the server does and return their feature rows"""
+    features = np.zeros((len(names), NUM_FEATURES))
+    ok = np.zeros(len(names), dtype=bool)
+    images, positions = [], []
+    with zipfile.ZipFile(zip_path) as archive:
+        for position, name in enumerate(names):
+            try:
+                images.append(load_image(archive.read(name), FEATURE_IMAGE_SIZE))
+                positions.append(position)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable image {name}: {e}")
+    if images:
+        features[positions] = extract_features_from_images(images)
+        ok[positions] = True
+    return features, ok
+
+def _hash_chunk(zip_path, names):
+    """Worker job: content hash of each member"""
+    with zipfile.ZipFile(zip_path) as archive:
+        return [hashlib.sha256(archive.read(name)).hexdigest() for name in names]
+
+def _map_chunks(fn, zip_path, names, num_workers, chunk_size):
+    """Run fn(zip_path, chunk) over chunks of names across a process pool, in order"""
+    chunks = [names[start:start + chunk_size] for start in range(0, len(names), chunk_size)]
+    if num_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            return list(executor.map(fn, [zip_path] * len(chunks), chunks))
+    return [fn(zip_path, chunk) for chunk in chunks]
+
+def _extract_features(zip_path, names, num_workers, chunk_size):
+    """Features and decodability of each named member"""
+    results = _map_chunks(_extract_chunk, zip_path, names, num_workers, chunk_size)
+    if not results:
+        return np.zeros((0, NUM_FEATURES)), np.zeros(0, dtype=bool)
+    return np.concatenate([features for features, _ in results]), np.concatenate([ok for _, ok in results])
+
+def extract_archive_features(zip_path, root="", num_workers=None, chunk_size=FEATURE_CHUNK_SIZE, store_dir=None):
+    """
+    Decode every image in an ImageFolder-style archive across a process pool and compute
+    the 50 forest features for each, exactly as the server does for an upload.
+    With store_dir, features are cached in a FeatureStore keyed by image content: only new
+    or changed images are decoded, and X is read from the store's memory map.
+    Returns (X, y, classes); unreadable images are left out.
+    """
+    classes, samples = scan_archive(zip_path, root)
+    names = [name for name, _ in samples]
+    labels = np.array([label for _, label in samples], dtype=np.int64)
+    num_workers = num_workers or os.cpu_count() or 1
+
+    if store_dir is None:
+        logger.info(f"Extracting features from {len(names)} images in {zip_path} with {num_workers} workers")
+        X, ok = _extract_features(zip_path, names, num_workers, chunk_size)
+        if not ok.all():
+            logger.warning(f"{int((~ok).sum())} of {len(names)} images could not be decoded")
+        return X[ok], labels[ok], classes
+
+    store = FeatureStore(store_dir)
+    keys = [key for chunk in _map_chunks(_hash_chunk, zip_path, names, num_workers, chunk_size) for key in chunk]
+    missing = store.missing(keys)
+    logger.info(
+        f"{len(names) - len(missing)} of {len(names)} images in {zip_path} have stored features; "
+        f"extracting {len(missing)} with {num_workers} workers"
+    )
+    if missing:
+        name_for_key = dict(zip(reversed(keys), reversed(names)))
+        features, ok = _extract_features(zip_path, [name_for_key[key] for key in missing], num_workers, chunk_size)
+        if not ok.all():
+            logger.warning(f"{int((~ok).sum())} of {len(missing)} new images could not be decoded")
+        store.add([key for key, decoded in zip(missing, ok) if decoded], features[ok])
+
+    present = np.array([key in store for key in keys], dtype=bool)
+    return store.matrix([key for key in keys if key in store]), labels[present], classes
+
+def is_archive_path(path):
+    """True for dataset paths that should be read as a zip archive rather than a directory"""
+    return str(path).lower().endswith(".zip") or (os.path.isfile(path) and zipfile.is_zipfile(path))
@@ -1,13 +1,18 @@
 import os
 import logging
 import sys
-import pandas as pd
 import numpy as np
 import pickle
 from typing import List, Dict
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
+# Shared with the serving code; pickled models reference it by this name
+from services.feature_extraction import extract_features_from_image
+from services.model_artifacts import artifact_path, callable_reference, export_or_discard
+from services.knowledge_base import load_knowledge_base, source_hashes
+from services.synthetic_features import generate_synthetic_features
+from services.training_cache import training_fingerprint, is_up_to_date, record_training, trained_by, FORCE_RETRAIN
 
 # Set up logging
 logging.basicConfig(
@@ -26,79 +31,31 @@ DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, 'data'))
 MODEL_PATH = os.path.join(MODEL_DIR, 'disease_model.pkl')
 DETECTIONS_DIR = os.path.abspath(os.path.join(BASE_DIR, '../data/detections'))
 
-def extract_features_from_image(image):
-    """
-    Extract features from an image for ML model prediction
-    This is a simplified version that converts an image to a feature vector
-    """
-    # Resize image to a standard size
-    img_resized = image.resize((50, 50))
-    
-    # Convert to grayscale
-    img_gray = img_resized.convert('L')
-    
-    # Convert to numpy array and flatten
-    img_array = np.array(img_gray).flatten()
-    
-    # Normalize to 0-1
-    img_array = img_array / 255.0
-    
-    # Extract some basic statistical features
-    features = np.zeros(50)
-    
-    # First 25 features: downsampled image pixels (5x5 grid)
-    img_small = img_resized.resize((5, 5)).convert('L')
-    img_small_array = np.array(img_small).flatten() / 255.0
-    features[:25] = img_small_array
-    
-    # Next features: color statistics from different channels
-    img_rgb = np.array(img_resized.convert('RGB'))
-    
-    # RGB channel means
-    features[25] = np.mean(img_rgb[:,:,0]) / 255.0  # R mean
-    features[26] = np.mean(img_rgb[:,:,1]) / 255.0  # G mean
-    features[27] = np.mean(img_rgb[:,:,2]) / 255.0  # B mean
-    
-    # RGB channel standard deviations
-    features[28] = np.std(img_rgb[:,:,0]) / 255.0   # R std
-    features[29] = np.std(img_rgb[:,:,1]) / 255.0   # G std
-    features[30] = np.std(img_rgb[:,:,2]) / 255.0   # B std
-    
-    # RGB ratios
-    r_mean = np.mean(img_rgb[:,:,0])
-    g_mean = np.mean(img_rgb[:,:,1])
-    b_mean = np.mean(img_rgb[:,:,2])
-    total = r_mean + g_mean + b_mean
-    if total > 0:
-        features[31] = r_mean / total
-        features[32] = g_mean / total
-        features[33] = b_mean / total
-    
-    # Image statistics
-    features[34] = np.mean(img_array)  # Mean brightness
-    features[35] = np.std(img_array)   # Contrast
-    features[36] = np.max(img_array) - np.min(img_array)  # Dynamic range
-    
-    # Edge detection (simple gradient magnitude)
-    dx = np.diff(np.array(img_gray), axis=1)
-    dy = np.diff(np.array(img_gray), axis=0)
-    features[37] = np.mean(np.abs(dx)) / 255.0
-    features[38] = np.mean(np.abs(dy)) / 255.0
-    
-    # Fill remaining features with zeros
-    
-    return features
+# Training inputs; a change to any of them (or to the code below) retrains at the next setup
+SAMPLES_PER_CLASS = 50
+FOREST_PARAMS = {
+    'n_estimators': 50,  # Smaller model for quick setup
+    'max_depth': 8,
+    'random_state': 42,
+    'n_jobs': -1
+}
+# Trainer name stored in the fingerprint record
+TRAINER = "setup_model"
+TRAINING_CODE = [
+    os.path.abspath(__file__),
+    os.path.join(BASE_DIR, 'services', 'synthetic_features.py'),
+    os.path.join(BASE_DIR, 'services', 'feature_extraction.py')
+]
 
 def load_disease_classes() -> List[str]:
-    """Load disease classes from disease_info.csv"""
+    """Load disease classes from the compiled knowledge base"""
     try:
-        # Path to disease info CSV
-        disease_info_path = os.path.join(DATA_DIR, 'disease_info.csv')
+        # Disease names from the compiled knowledge base
+        knowledge_base = load_knowledge_base()
         
-        if os.path.exists(disease_info_path):
-            df = pd.read_csv(disease_info_path)
+        if knowledge_base['diseases']:
             # Extract unique disease names and add healthy variants
-            disease_classes = df['disease_name'].unique().tolist()
+            disease_classes = [disease['disease_name'] for disease in knowledge_base['diseases']]
             
             # Add healthy variants for common plants
             plants = ["Tomato", "Apple", "Potato", "Pepper", "Corn"]
@@ -107,10 +64,10 @@ def load_disease_classes() -> List[str]:
                 if healthy_class not in disease_classes:
                     disease_classes.append(healthy_class)
             
-            logger.info(f"Loaded {len(disease_classes)} disease classes from CSV")
+            logger.info(f"Loaded {len(disease_classes)} disease classes from the knowledge base")
             return disease_classes
         else:
-            logger.warning(f"Disease info file not found at: {disease_info_path}")
+            logger.warning("No diseases found in the knowledge base")
             # Return default classes
             return [
                 "Tomato_Healthy",
@@ -132,81 +89,48 @@ def load_disease_classes() -> List[str]:
             "Apple_Scab"
         ]
 
-# Load disease classes
-DISEASE_CLASSES = load_disease_classes()
+def setup_fingerprint(disease_classes):
+    """Fingerprint of the knowledge base, settings and code the setup model is trained from"""
+    hyperparameters = {
+        'classes': disease_classes,
+        'samples_per_class': SAMPLES_PER_CLASS,
+        'forest': FOREST_PARAMS
+    }
+    return training_fingerprint(source_hashes(), hyperparameters, TRAINING_CODE)
 
-def generate_synthetic_features(disease_classes, num_samples_per_class=50):
-    """Generate synthetic features for each disease class"""
-    X = []
-    y = []
-    
-    for class_idx, disease_name in enumerate(disease_classes):
-        logger.info(f"Generating features for class {class_idx}: {disease_name}")
-        
-        for i in range(num_samples_per_class):
-            # Generate synthetic features based on disease characteristics
-            # We'll use 50 features for each sample
-            features = np.zeros(50)
-            
-            # Seed based on disease name for consistency
-            color_seed = hash(disease_name) % 255
-            
-            # Base features - different for each disease class
-            features[0] = (color_seed * 13) % 100 / 100.0  # Normalized between 0-1
-            features[1] = (color_seed * 17) % 100 / 100.0
-            features[2] = (color_seed * 19) % 100 / 100.0
-            
-            # Add some patterns based on disease name
-            if "Healthy" in disease_name:
-                # Healthy plants have different feature patterns
-                features[3:10] = np.random.normal(0.8, 0.1, 7)  # Higher values in these features
-                features[10:15] = np.random.normal(0.2, 0.1, 5)  # Lower values in these features
-            elif "Blight" in disease_name:
-                # Blight has specific feature patterns
-                features[3:10] = np.random.normal(0.3, 0.1, 7)
-                features[10:15] = np.random.normal(0.7, 0.1, 5)
-            elif "Rot" in disease_name:
-                # Rot has different feature patterns
-                features[3:10] = np.random.normal(0.1, 0.1, 7)
-                features[10:15] = np.random.normal(0.9, 0.1, 5)
-            
-            # Add some randomness to other features
-            features[15:] = np.random.normal(0.5, 0.3, 35)
-            
-            # Add small noise to make each sample unique
-            noise = np.random.normal(0, 0.05, 50)
-            features += noise
-            
-            # Ensure all features are between 0 and 1
-            features = np.clip(features, 0, 1)
-            
-            X.append(features)
-            y.append(class_idx)
-    
-    return np.array(X), np.array(y)
-
-def setup_model():
-    """Create a simple ML model for disease detection without fine-tuning."""
+def setup_model(force=False):
+    """
+    Create a simple ML model for disease detection without fine-tuning.
+    The saved model is reused when it was trained from the same inputs, unless force is set.
+    """
     try:
         # Create necessary directories
         logger.info("Creating necessary directories...")
         os.makedirs(MODEL_DIR, exist_ok=True)
         os.makedirs(DETECTIONS_DIR, exist_ok=True)
         
+        # Load disease classes here rather than at import: unpickling a model that references
+        # this module's feature extractor (e.g. in an inference worker) must stay cheap
+        disease_classes = load_disease_classes()
+        fingerprint, inputs = setup_fingerprint(disease_classes)
+        if not force and is_up_to_date(MODEL_PATH, fingerprint):
+            logger.info(f"Disease model at {MODEL_PATH} is up to date, skipping training")
+            return True
+        # A model from a full training run (python run.py --train) is never replaced by the setup model
+        trainer = trained_by(MODEL_PATH)
+        if not (force or FORCE_RETRAIN) and trainer and trainer != TRAINER:
+            logger.info(f"Disease model at {MODEL_PATH} was produced by {trainer}, keeping it (use --retrain to replace it)")
+            return True
+        
         # Create synthetic data for training a simple model
         logger.info("Generating synthetic data for model setup...")
-        X, y = generate_synthetic_features(DISEASE_CLASSES)
+        X, y = generate_synthetic_features(disease_classes, num_samples_per_class=SAMPLES_PER_CLASS)
         
         # Create a simple Random Forest model
         logger.info("Creating a Random Forest Classifier...")
         pipeline = Pipeline([
             ('scaler', StandardScaler()),
-            ('classifier', RandomForestClassifier(
-                n_estimators=50,  # Smaller model for quick setup
-                max_depth=8,
-                random_state=42,
-                n_jobs=-1
-            ))
+            ('classifier', RandomForestClassifier(**FOREST_PARAMS))
         ])
         
         # Train the model on synthetic data
@@ -217,13 +141,20 @@ def setup_model():
         logger.info(f"Saving model to {MODEL_PATH}")
         model_data = {
             'model': pipeline,
-            'classes': DISEASE_CLASSES,
+            'classes': disease_classes,
             'feature_extractor': extract_features_from_image
         }
         
         with open(MODEL_PATH, 'wb') as f:
             pickle.dump(model_data, f)
         
+        # Export the memory-mappable artifact the server loads
+        export_or_discard(pipeline, artifact_path(MODEL_PATH), {
+            'classes': disease_classes,
+            'feature_extractor': callable_reference(extract_features_from_image)
+        })
+        record_training(MODEL_PATH, fingerprint, inputs, TRAINER)
+        
         logger.info("Model setup completed successfully!")
         return True
     
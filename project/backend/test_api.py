@@ -79,7 +79,7 @@ def test_detection_history():
         response.raise_for_status()
         
         history = response.json()
-        logger.info(f"Retrieved {len(history)} detection records")
+        logger.info(f"Retrieved {len(history['items'])} detection records (next cursor: {history['next_cursor']})")
         return True
     except Exception as e:
         logger.error(f"Error testing detection history: {e}")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the backend packages (services, models) the same way run.py does
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from models.weather import FarmWeather, WeatherData
+from services import ml_crop_service
+from services.forest_engine import select_engine
+from services.model_artifacts import ForestArtifactModel
+from services.ml_crop_service import (
+    REGION_ENCODING, crop_models, encode_regions, get_ml_crop_recommendations, get_region_from_coordinates,
+    iter_bulk_crop_recommendations, predict_bulk_crop_probabilities
+)
+
+def _weather(temperature, humidity):
+    return WeatherData(
+        temperature=temperature, humidity=humidity, windSpeed=3.0,
+        description="clear", city="Pune", country="IN", timestamp="2024-01-01T00:00:00"
+    )
+
+def _farms(count=60, seed=0):
+    rng = np.random.default_rng(seed)
+    # Points inside, outside and on the edges of every region box
+    coordinates = [(15.0, 76.0), (20.0, 75.0), (30.0, 75.0), (0.0, 0.0), (11.5, 74.0), (18.5, 78.5),
+                   (22.5, 80.5), (29.5, 73.5), (32.5, 76.5), (16.0, 73.0)]
+    coordinates += [(rng.uniform(5, 35), rng.uniform(68, 90)) for _ in range(count - len(coordinates))]
+    return [
+        FarmWeather(lat=lat, lon=lon, weather=_weather(rng.uniform(5, 40), rng.uniform(20, 95)), id=f"farm-{i}")
+        for i, (lat, lon) in enumerate(coordinates)
+    ]
+
+def _fitted_crop_model(engine):
+    crop_names = sorted(ml_crop_service.crop_details)
+    rng = np.random.default_rng(1)
+    X = np.column_stack([
+        rng.uniform(5, 40, 400), rng.uniform(20, 95, 400), rng.integers(0, 4, 400), rng.integers(0, 4, 400)
+    ])
+    y = np.array(crop_names)[rng.integers(0, len(crop_names), 400)]
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('classifier', RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0))
+    ]).fit(X, y)
+    return select_engine(pipeline, engine, "crop model")
+
+def test_region_encoding_matches_single_lookup():
+    rng = np.random.default_rng(2)
+    lat = np.concatenate([rng.uniform(0, 40, 2000), [11.5, 18.5, 15.5, 22.5, 29.5, 32.5]])
+    lon = np.concatenate([rng.uniform(65, 95, 2000), [74.0, 78.5, 72.5, 80.5, 73.5, 76.5]])
+    expected = [REGION_ENCODING[get_region_from_coordinates(a, b)] for a, b in zip(lat, lon)]
+    assert encode_regions(lat, lon).tolist() == expected
+
+@pytest.mark.parametrize("engine", ["compiled", "sklearn"])
+def test_bulk_matches_single_requests(monkeypatch, engine):
+    if not ml_crop_service.crop_details:
+        pytest.skip("Crop catalog is empty")
+    model = _fitted_crop_model(engine)
+    assert isinstance(model, ForestArtifactModel) == (engine == "compiled")
+    monkeypatch.setattr(crop_models, "_state", (model, "test-version"))
+    farms = _farms()
+    
+    probabilities, crop_names, model_version = predict_bulk_crop_probabilities(farms)
+    results = list(iter_bulk_crop_recommendations(farms, probabilities, crop_names, model_version))
+    
+    assert [result["index"] for result in results] == list(range(len(farms)))
+    assert [result["id"] for result in results] == [farm.id for farm in farms]
+    for farm, result in zip(farms, results):
+        assert result["recommendations"] == get_ml_crop_recommendations(farm.weather, farm.lat, farm.lon)
+
+def test_empty_bulk_request(monkeypatch):
+    monkeypatch.setattr(crop_models, "_state", (_fitted_crop_model("sklearn"), "test-version"))
+    probabilities, crop_names, _ = predict_bulk_crop_probabilities([])
+    assert probabilities.shape == (0, len(crop_names))
@@ -0,0 +1,77 @@
+import json
+import threading
+import pytest
+
+from services.detection_history import DetectionHistoryStore, decode_cursor
+
+def _records(count, start=0):
+    # Several records share a timestamp, so paging must also order by insertion
+    return [
+        {"id": f"det-{i}", "timestamp": f"2024-01-01T00:00:{(i // 3):02d}", "disease": "Tomato_Healthy"}
+        for i in range(start, start + count)
+    ]
+
+def _all_pages(store, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        page = store.page(limit=limit, cursor=cursor)
+        items += page["items"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+@pytest.fixture
+def store(tmp_path):
+    return DetectionHistoryStore(db_path=str(tmp_path / "history.sqlite3"), legacy_path=None)
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 50])
+def test_pages_cover_every_record_once_newest_first(store, limit):
+    store.append(_records(50))
+    items, pages = _all_pages(store, limit)
+    assert [item["id"] for item in items] == [f"det-{i}" for i in reversed(range(50))]
+    assert pages == -(-50 // limit)
+
+def test_cursor_is_stable_while_records_are_appended(store):
+    store.append(_records(20))
+    first = store.page(limit=5)
+    # Newer detections arrive between requests
+    store.append(_records(10, start=20))
+    second = store.page(limit=5, cursor=first["next_cursor"])
+    assert [item["id"] for item in second["items"]] == [f"det-{i}" for i in range(14, 9, -1)]
+
+def test_duplicate_ids_are_ignored(store):
+    store.append(_records(5))
+    store.append(_records(5))
+    items, _ = _all_pages(store, 100)
+    assert len(items) == 5
+    assert store.get("det-3")["id"] == "det-3"
+    assert store.get("missing") is None
+
+def test_empty_history(store):
+    assert store.page() == {"items": [], "next_cursor": None}
+
+def test_invalid_cursor_is_rejected(store):
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        store.page(cursor="2024-01-01|abc")
+
+def test_legacy_history_is_imported_once(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps(_records(6)))
+    db_path = str(tmp_path / "history.sqlite3")
+    DetectionHistoryStore(db_path=db_path, legacy_path=str(legacy))
+    legacy.write_text(json.dumps(_records(6, start=6)))
+    store = DetectionHistoryStore(db_path=db_path, legacy_path=str(legacy))
+    items, _ = _all_pages(store, 100)
+    assert len(items) == 6
+
+def test_appends_from_threads(store):
+    threads = [threading.Thread(target=store.append, args=(_records(10, start=10 * i),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    items, _ = _all_pages(store, 13)
+    assert len(items) == 40
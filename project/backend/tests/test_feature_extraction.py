@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from services.feature_extraction import extract_features_from_image, extract_features_from_images
+
+def reference_features(image):
+    """The original per-image extractor from setup_model, kept here as the parity reference"""
+    img_resized = image.resize((50, 50))
+    img_gray = img_resized.convert('L')
+    img_array = np.array(img_gray).flatten()
+    img_array = img_array / 255.0
+    features = np.zeros(50)
+    
+    img_small = img_resized.resize((5, 5)).convert('L')
+    img_small_array = np.array(img_small).flatten() / 255.0
+    features[:25] = img_small_array
+    
+    img_rgb = np.array(img_resized.convert('RGB'))
+    features[25] = np.mean(img_rgb[:,:,0]) / 255.0
+    features[26] = np.mean(img_rgb[:,:,1]) / 255.0
+    features[27] = np.mean(img_rgb[:,:,2]) / 255.0
+    features[28] = np.std(img_rgb[:,:,0]) / 255.0
+    features[29] = np.std(img_rgb[:,:,1]) / 255.0
+    features[30] = np.std(img_rgb[:,:,2]) / 255.0
+    r_mean = np.mean(img_rgb[:,:,0])
+    g_mean = np.mean(img_rgb[:,:,1])
+    b_mean = np.mean(img_rgb[:,:,2])
+    total = r_mean + g_mean + b_mean
+    if total > 0:
+        features[31] = r_mean / total
+        features[32] = g_mean / total
+        features[33] = b_mean / total
+    
+    features[34] = np.mean(img_array)
+    features[35] = np.std(img_array)
+    features[36] = np.max(img_array) - np.min(img_array)
+    
+    dx = np.diff(np.array(img_gray), axis=1)
+    dy = np.diff(np.array(img_gray), axis=0)
+    features[37] = np.mean(np.abs(dx)) / 255.0
+    features[38] = np.mean(np.abs(dy)) / 255.0
+    return features
+
+def _random_images(seed=0):
+    rng = np.random.default_rng(seed)
+    images = []
+    for size in [(50, 50), (64, 48), (320, 240), (37, 91), (5, 5), (1024, 768)]:
+        noise = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        images.append(Image.fromarray(noise, 'RGB'))
+        # Smooth gradients exercise the resampling more than noise does
+        ramp = np.linspace(0, 255, size[0] * size[1]).reshape(size[1], size[0]).astype(np.uint8)
+        images.append(Image.fromarray(np.stack([ramp, ramp[::-1], 255 - ramp], axis=2), 'RGB'))
+    images.append(Image.new('RGB', (80, 60), (0, 0, 0)))
+    images.append(Image.new('RGB', (80, 60), (255, 255, 255)))
+    images.append(Image.fromarray(rng.integers(0, 256, (70, 90), dtype=np.uint8), 'L'))
+    images.append(Image.fromarray(rng.integers(0, 256, (60, 60, 4), dtype=np.uint8), 'RGBA'))
+    images.append(images[2].quantize(64))
+    images.append(images[3].convert('CMYK'))
+    return images
+
+@pytest.mark.parametrize("index", range(len(_random_images())))
+def test_single_image_matches_reference_bit_exact(index):
+    image = _random_images()[index]
+    features = extract_features_from_image(image)
+    assert features.dtype == np.float64
+    assert np.array_equal(features, reference_features(image))
+
+def test_batch_matches_reference_bit_exact():
+    images = _random_images(seed=1)
+    features = extract_features_from_images(images)
+    assert features.shape == (len(images), 50)
+    for row, image in zip(features, images):
+        assert np.array_equal(row, reference_features(image))
+
+def test_empty_batch():
+    assert extract_features_from_images([]).shape == (0, 50)
@@ -0,0 +1,72 @@
+import mmap
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from services import model_artifacts
+from services.model_artifacts import (
+    ArtifactError, ForestArtifactModel, export_pipeline_artifact, load_pipeline_artifact, parity_samples
+)
+from services.forest_engine import select_engine
+
+def _mapped(array):
+    """True when array is backed by a memory-mapped file rather than private memory"""
+    while array is not None:
+        if isinstance(array, mmap.mmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+def _fitted_pipeline(classifier, n_classes=4, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(3.0, 2.0, (300, 12))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 3.0).astype(int) + 2 * (X[:, 3] > 3.0)
+    pipeline = Pipeline([('scaler', StandardScaler()), ('classifier', classifier)])
+    return pipeline.fit(X, y % n_classes), X
+
+@pytest.mark.parametrize("classifier", [
+    RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0),
+    RandomForestClassifier(n_estimators=10, random_state=1),
+    DecisionTreeClassifier(max_depth=5, random_state=0)
+])
+def test_artifact_matches_sklearn(tmp_path, classifier):
+    pipeline, X = _fitted_pipeline(classifier)
+    export_pipeline_artifact(pipeline, str(tmp_path / "model.artifact"))
+    model = load_pipeline_artifact(str(tmp_path / "model.artifact"))
+
+    rows = np.vstack([X, np.random.default_rng(5).normal(3.0, 4.0, (200, 12)), parity_samples(model)])
+    np.testing.assert_allclose(model.predict_proba(rows), pipeline.predict_proba(rows), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(model.predict(rows), pipeline.predict(rows))
+    np.testing.assert_array_equal(model.classes_, pipeline.classes_)
+
+def test_artifact_arrays_are_evaluated_from_the_memory_map(tmp_path):
+    pipeline, X = _fitted_pipeline(RandomForestClassifier(n_estimators=5, random_state=0))
+    export_pipeline_artifact(pipeline, str(tmp_path / "model.artifact"))
+    model = load_pipeline_artifact(str(tmp_path / "model.artifact"))
+    assert select_engine(model, "compiled") is model
+    model.predict_proba(X[:10])
+    assert all(_mapped(array) for array in model.arrays.values())
+
+def test_export_rejects_arrays_that_differ_from_the_pipeline(tmp_path, monkeypatch):
+    pipeline, _ = _fitted_pipeline(RandomForestClassifier(n_estimators=5, random_state=0))
+    forest_to_arrays = model_artifacts.forest_to_arrays
+
+    def shifted_thresholds(pipeline):
+        arrays, metadata = forest_to_arrays(pipeline)
+        arrays["threshold"] = arrays["threshold"] + 0.25
+        return arrays, metadata
+
+    monkeypatch.setattr(model_artifacts, "forest_to_arrays", shifted_thresholds)
+    with pytest.raises(ArtifactError):
+        export_pipeline_artifact(pipeline, str(tmp_path / "model.artifact"))
+    assert not (tmp_path / "model.artifact").exists()
+
+def test_select_engine_compiles_pipelines():
+    pipeline, X = _fitted_pipeline(RandomForestClassifier(n_estimators=20, random_state=0))
+    compiled = select_engine(pipeline, "compiled")
+    assert isinstance(compiled, ForestArtifactModel)
+    np.testing.assert_allclose(compiled.predict_proba(X), pipeline.predict_proba(X), rtol=0, atol=1e-12)
+    assert select_engine(pipeline, "sklearn") is pipeline
@@ -0,0 +1,55 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+
+from services.image_preprocessing import load_image
+
+def _encode(image, format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+def _photo(size, seed=0):
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, size[0] * size[1]).reshape(size[1], size[0])
+    noise = rng.integers(0, 40, (size[1], size[0], 3))
+    pixels = np.clip(np.stack([ramp, ramp[::-1], 255 - ramp], axis=2) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, 'RGB')
+
+@pytest.mark.parametrize("size", [(1600, 1200), (800, 600), (401, 333), (120, 90), (50, 50)])
+def test_jpeg_is_drafted_to_the_smallest_scale_above_min_size(size):
+    data = _encode(_photo(size), 'JPEG', quality=90)
+    image = load_image(data, (50, 50))
+    assert image.mode == 'RGB'
+    assert image.width >= 50 and image.height >= 50
+    # The decoder scales by 1/2, 1/4 or 1/8 (rounding up), and one more halving would go below the minimum
+    scales = [scale for scale in (1, 2, 4, 8) if image.size == (-(-size[0] // scale), -(-size[1] // scale))]
+    assert len(scales) == 1
+    if scales[0] < 8:
+        assert -(-size[0] // (2 * scales[0])) < 50 or -(-size[1] // (2 * scales[0])) < 50
+
+@pytest.mark.parametrize("format", ['PNG', 'BMP'])
+@pytest.mark.parametrize("size", [(1000, 700), (160, 120), (99, 60), (50, 50)])
+def test_other_formats_are_reduced_by_an_integer_factor(format, size):
+    original = _photo(size)
+    image = load_image(_encode(original, format), (50, 50))
+    factor = min(size[0] // 50, size[1] // 50)
+    expected = original.reduce(factor) if factor >= 2 else original
+    assert image.mode == 'RGB'
+    assert image.size == expected.size
+    assert np.array_equal(np.asarray(image), np.asarray(expected))
+
+def test_non_rgb_input_is_converted(tmp_path):
+    path = tmp_path / "leaf.png"
+    _photo((300, 200)).convert('L').save(path)
+    image = load_image(str(path), (50, 50))
+    assert image.mode == 'RGB'
+    assert image.size == (75, 50)
+
+def test_drafted_features_stay_close_to_full_decode():
+    from services.feature_extraction import extract_features_from_image
+    data = _encode(_photo((1600, 1200), seed=3), 'JPEG', quality=90)
+    drafted = extract_features_from_image(load_image(data, (50, 50)))
+    full = extract_features_from_image(Image.open(io.BytesIO(data)).convert('RGB'))
+    assert np.abs(drafted - full).max() < 0.05
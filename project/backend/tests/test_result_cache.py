@@ -0,0 +1,44 @@
+import os
+import time
+from services.result_cache import InferenceCache
+
+def disk_usage(cache_dir):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(cache_dir) for name in names
+    )
+
+def test_disk_tier_stays_under_budget(tmp_path):
+    cache = InferenceCache(cache_dir=str(tmp_path), enabled=True, max_bytes=0, disk_max_bytes=4000)
+    for i in range(100):
+        cache.put(cache.make_key(str(i).encode(), "v1"), {"disease": "x" * 100, "index": i})
+    assert disk_usage(tmp_path) <= 4000
+    # The most recent entries survive pruning
+    assert cache.get(cache.make_key(b"99", "v1"))["index"] == 99
+
+def test_pruning_keeps_recently_read_entries(tmp_path):
+    cache = InferenceCache(cache_dir=str(tmp_path), enabled=True, max_bytes=0, disk_max_bytes=10**6)
+    old_keys = [cache.make_key(str(i).encode(), "v1") for i in range(20)]
+    for i, key in enumerate(old_keys):
+        cache.put(key, {"index": i})
+    # Age every file, then read one of them again
+    past = time.time() - 3600
+    for root, _, names in os.walk(tmp_path):
+        for name in names:
+            os.utime(os.path.join(root, name), (past, past))
+    assert cache.get(old_keys[0])["index"] == 0
+    
+    cache.disk_max_bytes = disk_usage(tmp_path) // 2
+    cache.prune_disk()
+    assert disk_usage(tmp_path) <= cache.disk_max_bytes
+    assert cache.get(old_keys[0])["index"] == 0
+    assert sum(cache.get(key) is not None for key in old_keys) < len(old_keys)
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    cache = InferenceCache(cache_dir=str(tmp_path), enabled=True, max_bytes=0)
+    key = cache.make_key(b"image", "v1")
+    cache.put(key, {"index": 1})
+    with open(cache._path(key), "w") as f:
+        f.write("{not json")
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
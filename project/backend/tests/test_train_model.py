@@ -0,0 +1,60 @@
+import functools
+import io
+import pickle
+import zipfile
+import numpy as np
+import pytest
+from PIL import Image
+
+import train_model
+from services.model_artifacts import artifact_path, read_manifest
+from services.model_selection import select_model
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _write_archive(path, counts):
+    """ImageFolder-style archive with counts[class_name] images per class"""
+    rng = np.random.default_rng(0)
+    with zipfile.ZipFile(path, 'w') as archive:
+        for class_index, (class_name, count) in enumerate(counts.items()):
+            for i in range(count):
+                color = tuple(int(c) for c in rng.integers(0, 40, 3) + 100 * class_index)
+                archive.writestr(f"{class_name}/{i:03d}.png", _png(color))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_split_keeps_single_sample_classes_in_training(seed):
+    y = np.array([0] * 6 + [1] + [2] * 6)
+    X = np.arange(len(y), dtype=np.float64)[:, None]
+    X_train, X_val, y_train, y_val = train_model.split_dataset(X, y, seed=seed)
+    assert set(y_train.tolist()) == {0, 1, 2}
+    assert len(y_train) + len(y_val) == len(y)
+    assert sorted(X_train[:, 0].tolist() + X_val[:, 0].tolist()) == X[:, 0].tolist()
+
+def test_split_is_stratified_when_possible():
+    y = np.repeat(np.arange(3), 10)
+    X = np.zeros((len(y), 1))
+    _, _, y_train, y_val = train_model.split_dataset(X, y)
+    assert np.bincount(y_val).tolist() == [2, 2, 2]
+    assert np.bincount(y_train).tolist() == [8, 8, 8]
+
+def test_one_image_class_gets_a_probability_column(tmp_path, monkeypatch):
+    archive = tmp_path / "images.zip"
+    _write_archive(archive, {"Apple_Scab": 6, "Corn_Rust": 1, "Tomato_Healthy": 6})
+    model_path = tmp_path / "models" / "disease_model.pkl"
+    monkeypatch.setattr(train_model, "MODEL_DIR", str(model_path.parent))
+    monkeypatch.setattr(train_model, "MODEL_PATH", str(model_path))
+    monkeypatch.setattr(train_model, "DETECTIONS_DIR", str(tmp_path / "detections"))
+    monkeypatch.setattr(train_model, "select_model",
+                        functools.partial(select_model, candidates=["random_forest"], n_jobs=1))
+
+    assert train_model.train_model(str(archive), feature_store_dir=None)
+
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    assert model_data['classes'] == ["Apple_Scab", "Corn_Rust", "Tomato_Healthy"]
+    assert model_data['model'].classes_.tolist() == [0, 1, 2]
+    manifest = read_manifest(artifact_path(str(model_path)))
+    assert manifest["metadata"]["estimator_classes"] == [0, 1, 2]
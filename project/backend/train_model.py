@@ -1,15 +1,18 @@
 import os
 import numpy as np
-import pandas as pd
 import logging
 import sys
 import pickle
 import joblib
 from PIL import Image
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.svm import SVC
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import Pipeline
+# Shared with the serving code; pickled models reference it by this name
+from services.feature_extraction import extract_features_from_image
+from services.model_artifacts import artifact_path, callable_reference, export_or_discard
+from services.knowledge_base import load_knowledge_base, disease_info_entries, source_hashes
+from services.training_cache import training_fingerprint, file_hashes, record_training
+from services.synthetic_features import generate_synthetic_features
+from services.model_selection import select_model
+from services.zip_dataset import extract_archive_features
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 import random
@@ -31,138 +34,31 @@ MODEL_DIR = os.path.abspath(os.path.join(BASE_DIR, '../models'))
 DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, 'data'))
 MODEL_PATH = os.path.join(MODEL_DIR, 'disease_model.pkl')
 DETECTIONS_DIR = os.path.abspath(os.path.join(BASE_DIR, '../data/detections'))
+IMAGES_ZIP = os.path.abspath(os.path.join(BASE_DIR, '../data/plant_diseases.zip'))
+FEATURE_STORE_DIR = os.path.abspath(os.path.join(BASE_DIR, '../data/feature_store'))
+
+# Trainer name stored in the fingerprint record; setup_model leaves models from this trainer alone
+TRAINER = "train_model"
+TRAINING_CODE = [
+    os.path.abspath(__file__),
+    os.path.join(BASE_DIR, 'services', 'model_selection.py'),
+    os.path.join(BASE_DIR, 'services', 'synthetic_features.py'),
+    os.path.join(BASE_DIR, 'services', 'feature_extraction.py'),
+    os.path.join(BASE_DIR, 'services', 'zip_dataset.py')
+]
 
 # Set random seed for reproducibility
 SEED = 42
 random.seed(SEED)
 np.random.seed(SEED)
 
-def generate_synthetic_features(disease_classes, num_samples_per_class=100):
-    """
-    Generate synthetic features for each disease class
-    """
-    X = []
-    y = []
-    
-    for class_idx, disease_name in enumerate(disease_classes):
-        logger.info(f"Generating features for class {class_idx}: {disease_name}")
-        
-        for i in range(num_samples_per_class):
-            # Generate synthetic features based on disease characteristics
-            # We'll use 50 features for each sample
-            features = np.zeros(50)
-            
-            # Seed based on disease name for consistency
-            color_seed = hash(disease_name) % 255
-            
-            # Base features - different for each disease class
-            features[0] = (color_seed * 13) % 100 / 100.0  # Normalized between 0-1
-            features[1] = (color_seed * 17) % 100 / 100.0
-            features[2] = (color_seed * 19) % 100 / 100.0
-            
-            # Add some patterns based on disease name
-            if "Healthy" in disease_name:
-                # Healthy plants have different feature patterns
-                features[3:10] = np.random.normal(0.8, 0.1, 7)  # Higher values in these features
-                features[10:15] = np.random.normal(0.2, 0.1, 5)  # Lower values in these features
-            elif "Blight" in disease_name:
-                # Blight has specific feature patterns
-                features[3:10] = np.random.normal(0.3, 0.1, 7)
-                features[10:15] = np.random.normal(0.7, 0.1, 5)
-            elif "Rot" in disease_name:
-                # Rot has different feature patterns
-                features[3:10] = np.random.normal(0.1, 0.1, 7)
-                features[10:15] = np.random.normal(0.9, 0.1, 5)
-            
-            # Add some randomness to other features
-            features[15:] = np.random.normal(0.5, 0.3, 35)
-            
-            # Add small noise to make each sample unique
-            noise = np.random.normal(0, 0.05, 50)
-            features += noise
-            
-            # Ensure all features are between 0 and 1
-            features = np.clip(features, 0, 1)
-            
-            X.append(features)
-            y.append(class_idx)
-    
-    return np.array(X), np.array(y)
-
-def extract_features_from_image(image):
-    """
-    Extract features from an image for ML model prediction
-    This is a simplified version that converts an image to a feature vector
-    """
-    # Resize image to a standard size
-    img_resized = image.resize((50, 50))
-    
-    # Convert to grayscale
-    img_gray = img_resized.convert('L')
-    
-    # Convert to numpy array and flatten
-    img_array = np.array(img_gray).flatten()
-    
-    # Normalize to 0-1
-    img_array = img_array / 255.0
-    
-    # Extract some basic statistical features
-    features = np.zeros(50)
-    
-    # First 25 features: downsampled image pixels (5x5 grid)
-    img_small = img_resized.resize((5, 5)).convert('L')
-    img_small_array = np.array(img_small).flatten() / 255.0
-    features[:25] = img_small_array
-    
-    # Next features: color statistics from different channels
-    img_rgb = np.array(img_resized.convert('RGB'))
-    
-    # RGB channel means
-    features[25] = np.mean(img_rgb[:,:,0]) / 255.0  # R mean
-    features[26] = np.mean(img_rgb[:,:,1]) / 255.0  # G mean
-    features[27] = np.mean(img_rgb[:,:,2]) / 255.0  # B mean
-    
-    # RGB channel standard deviations
-    features[28] = np.std(img_rgb[:,:,0]) / 255.0   # R std
-    features[29] = np.std(img_rgb[:,:,1]) / 255.0   # G std
-    features[30] = np.std(img_rgb[:,:,2]) / 255.0   # B std
-    
-    # RGB ratios
-    r_mean = np.mean(img_rgb[:,:,0])
-    g_mean = np.mean(img_rgb[:,:,1])
-    b_mean = np.mean(img_rgb[:,:,2])
-    total = r_mean + g_mean + b_mean
-    if total > 0:
-        features[31] = r_mean / total
-        features[32] = g_mean / total
-        features[33] = b_mean / total
-    
-    # Image statistics
-    features[34] = np.mean(img_array)  # Mean brightness
-    features[35] = np.std(img_array)   # Contrast
-    features[36] = np.max(img_array) - np.min(img_array)  # Dynamic range
-    
-    # Edge detection (simple gradient magnitude)
-    dx = np.diff(np.array(img_gray), axis=1)
-    dy = np.diff(np.array(img_gray), axis=0)
-    features[37] = np.mean(np.abs(dx)) / 255.0
-    features[38] = np.mean(np.abs(dy)) / 255.0
-    
-    # Fill remaining features with zeros
-    
-    return features
-
 def load_disease_info():
-    """Load disease information from CSV files"""
+    """Load disease information from the compiled knowledge base"""
     try:
-        disease_info_path = os.path.join(DATA_DIR, 'disease_info.csv')
-        supplement_info_path = os.path.join(DATA_DIR, 'supplement_info.csv')
-        
-        disease_info_df = pd.read_csv(disease_info_path)
-        supplement_info_df = pd.read_csv(supplement_info_path)
+        knowledge_base = load_knowledge_base()
         
         # Extract unique disease names
-        disease_classes = disease_info_df['disease_name'].unique().tolist()
+        disease_classes = [disease['disease_name'] for disease in knowledge_base['diseases']]
         
         # Add healthy variants for common plants
         plants = ["Tomato", "Apple", "Potato", "Pepper", "Corn"]
@@ -174,27 +70,7 @@ def load_disease_info():
         logger.info(f"Loaded {len(disease_classes)} disease classes")
         
         # Create disease info dictionary for later use
-        disease_info = {}
-        for _, row in disease_info_df.iterrows():
-            disease_name = row['disease_name']
-            supplements = supplement_info_df[supplement_info_df['disease_name'] == disease_name]
-            
-            disease_info[disease_name] = {
-                'description': row['description'],
-                'symptoms': row['symptoms'],
-                'causes': row['causes'],
-                'prevention': row['prevention'],
-                'treatment': row['treatment'],
-                'supplements': [
-                    {
-                        'name': sup['supplement_name'],
-                        'description': sup['description'],
-                        'application': sup['application_method'],
-                        'precautions': sup['precautions']
-                    }
-                    for _, sup in supplements.iterrows()
-                ]
-            }
+        disease_info = disease_info_entries(knowledge_base)
         
         return disease_classes, disease_info
     except Exception as e:
@@ -211,70 +87,75 @@ def load_disease_info():
         ]
         return default_classes, {}
 
-def train_model():
-    """Train a machine learning model using disease information"""
+def split_dataset(X, y, test_size=0.2, seed=SEED):
+    """
+    Split features and labels into training and validation sets.
+    The split is stratified when every class can appear in both sets. Otherwise it is random,
+    except that each class keeps one sample in training, so the trained model has a
+    probability column for every class it was given samples of.
+    Returns (X_train, X_val, y_train, y_val).
+    """
+    counts = np.unique(y, return_counts=True)[1]
+    if counts.min() >= 2 and int(test_size * len(y)) >= len(counts):
+        return train_test_split(X, y, test_size=test_size, random_state=seed, stratify=y)
+
+    order = np.random.default_rng(seed).permutation(len(y))
+    # The first sample of each class in shuffled order is reserved for training
+    reserved = order[np.unique(y[order], return_index=True)[1]]
+    available = np.ones(len(y), dtype=bool)
+    available[reserved] = False
+    rest = order[available[order]]
+    num_val = min(int(np.ceil(test_size * len(y))), len(rest))
+    train_idx = np.sort(np.concatenate([reserved, rest[num_val:]]))
+    val_idx = np.sort(rest[:num_val])
+    return X[train_idx], X[val_idx], y[train_idx], y[val_idx]
+
+def train_model(images_zip=None, archive_root="", feature_store_dir=FEATURE_STORE_DIR):
+    """
+    Train a machine learning model using disease information.
+    With images_zip, the model is trained on features of the images in that archive
+    (<archive_root>/<class>/<image>) instead of synthetic features. Those features are
+    cached in feature_store_dir (None disables it), so a retrain only extracts new images.
+    """
     try:
-        # Load disease information
-        disease_classes, disease_info = load_disease_info()
-        
         # Create necessary directories
         os.makedirs(MODEL_DIR, exist_ok=True)
         os.makedirs(DETECTIONS_DIR, exist_ok=True)
         
-        # Generate synthetic features for training
-        logger.info("Generating synthetic features for training...")
-        X, y = generate_synthetic_features(disease_classes, num_samples_per_class=200)
-        
-        logger.info(f"Generated dataset with {X.shape[0]} samples and {X.shape[1]} features")
-        
-        # Split dataset into train and validation
-        X_train, X_val, y_train, y_val = train_test_split(
-            X, y, test_size=0.2, random_state=SEED, stratify=y
-        )
+        if images_zip:
+            # Decode the archive members in worker processes, without extracting them
+            logger.info(f"Extracting features from images in {images_zip}...")
+            X, y, disease_classes = extract_archive_features(images_zip, archive_root, store_dir=feature_store_dir)
+        else:
+            # Load disease information
+            disease_classes, disease_info = load_disease_info()
+            
+            # Generate synthetic features for training
+            logger.info("Generating synthetic features for training...")
+            X, y = generate_synthetic_features(disease_classes, num_samples_per_class=200, seed=SEED)
         
-        # Create and train ML model
-        logger.info("Training Random Forest Classifier...")
+        logger.info(f"Training dataset has {X.shape[0]} samples and {X.shape[1]} features")
         
-        # Create a pipeline with scaling and Random Forest
-        pipeline = Pipeline([
-            ('scaler', StandardScaler()),
-            ('classifier', RandomForestClassifier(
-                n_estimators=100,
-                max_depth=10,
-                random_state=SEED,
-                n_jobs=-1
-            ))
-        ])
+        # Split dataset into train and validation; every class keeps a training sample
+        # (real archives may have tiny classes)
+        X_train, X_val, y_train, y_val = split_dataset(X, y)
         
-        # Train the model
-        pipeline.fit(X_train, y_train)
+        # Cross-validate the candidate models in parallel and pick one under the latency budget
+        logger.info("Selecting model by cross-validation...")
+        selected, pipeline, selection = select_model(X_train, y_train, seed=SEED)
         
-        # Evaluate the model
-        y_pred = pipeline.predict(X_val)
-        accuracy = accuracy_score(y_val, y_pred)
-        logger.info(f"Validation accuracy: {accuracy:.4f}")
+        # Classes without a single decodable image have no probability column
+        untrained = sorted(set(range(len(disease_classes))) - set(pipeline.classes_.tolist()))
+        if untrained:
+            logger.warning(f"No training samples for {[disease_classes[i] for i in untrained]}; they will never be predicted")
         
-        # Try SVM if accuracy is not good enough
-        if accuracy < 0.9:
-            logger.info("Training SVM Classifier for comparison...")
-            svm_pipeline = Pipeline([
-                ('scaler', StandardScaler()),
-                ('classifier', SVC(
-                    probability=True,
-                    random_state=SEED
-                ))
-            ])
-            
-            svm_pipeline.fit(X_train, y_train)
-            svm_y_pred = svm_pipeline.predict(X_val)
-            svm_accuracy = accuracy_score(y_val, svm_y_pred)
-            logger.info(f"SVM Validation accuracy: {svm_accuracy:.4f}")
-            
-            # Use the better model
-            if svm_accuracy > accuracy:
-                logger.info("Using SVM model as it performed better")
-                pipeline = svm_pipeline
-                accuracy = svm_accuracy
+        # Evaluate the selected model on the held-out split
+        if len(y_val):
+            accuracy = accuracy_score(y_val, pipeline.predict(X_val))
+            logger.info(f"Validation accuracy of {selected}: {accuracy:.4f}")
+        else:
+            accuracy = None
+            logger.warning("Every class has a single sample, so no validation split was held out")
         
         # Save the model and class mapping
         logger.info(f"Saving model to {MODEL_PATH}")
@@ -284,12 +165,29 @@ def train_model():
             'model': pipeline,
             'classes': disease_classes,
             'accuracy': accuracy,
+            'estimator': selected,
+            'selection': selection,
             'feature_extractor': extract_features_from_image
         }
         
         with open(MODEL_PATH, 'wb') as f:
             pickle.dump(model_data, f)
         
+        # Export the memory-mappable artifact the server loads
+        export_or_discard(pipeline, artifact_path(MODEL_PATH), {
+            'classes': disease_classes,
+            'feature_extractor': callable_reference(extract_features_from_image)
+        })
+        
+        # Record what produced this model, so server startup keeps it instead of running setup_model
+        data_hashes = file_hashes([images_zip]) if images_zip else source_hashes()
+        fingerprint, inputs = training_fingerprint(
+            data_hashes,
+            {'archive_root': archive_root if images_zip else None, 'estimator': selected, 'seed': SEED},
+            TRAINING_CODE
+        )
+        record_training(MODEL_PATH, fingerprint, inputs, TRAINER)
+        
         logger.info("Training completed successfully!")
         return True
     
@@ -299,4 +197,13 @@ def train_model():
         return False
 
 if __name__ == "__main__":
-    train_model() 
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Train the disease detection model')
+    parser.add_argument('--images', nargs='?', const=IMAGES_ZIP, default=None,
+                        help=f'Train on the images in a zip archive (default archive: {IMAGES_ZIP})')
+    parser.add_argument('--archive-root', default="", help='Directory inside the archive that holds the class folders')
+    parser.add_argument('--feature-store', default=FEATURE_STORE_DIR, help='Directory caching the features of training images')
+    parser.add_argument('--no-feature-store', action='store_true', help='Extract the features of every image again')
+    args = parser.parse_args()
+    if not train_model(args.images, args.archive_root, None if args.no_feature_store else args.feature_store):
+        sys.exit(1) 
\ No newline at end of file